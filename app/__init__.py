@@ -40,6 +40,10 @@ def create_app(config_class=Config):
     from app.api.routes import bp as api_bp
     app.register_blueprint(api_bp)
 
+    # 异步检测任务（独立的有界执行器，按 bulk 优先级推理）
+    from app.yolo_detection.jobs import job_manager
+    job_manager.configure(app.config)
+
     # 设置根路由重定向到YOLO检测页面
     @app.route('/')
     def index():
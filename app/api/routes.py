@@ -1,6 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app
 from app.yolo_detection.detection import detection
+from app.yolo_detection.batch import detect_batches, iter_archive, iter_limited, BatchLimitError
+from app.yolo_detection.jobs import job_manager, decode_inline_images
+from app.yolo_detection import encoding
 import base64
+import binascii
+import io
+import json
+import queue
+import time
+import zipfile
 import numpy as np
 import cv2
 
@@ -18,21 +27,33 @@ def extension_detect():
         return response
 
     try:
+        # 检测结果编码格式（Accept 头或 format 参数协商）
+        fmt = encoding.negotiate(request)
+        if fmt is None:
+            response = jsonify({'error': 'Unsupported format'})
+            response.headers.add('Access-Control-Allow-Origin', '*')
+            return response, 406
+
         # 获取图像数据
         data = request.get_json()
         if not data or 'image' not in data:
             print("请求中缺少图像数据")
             return jsonify({'error': 'No image data provided'}), 400
 
-        # 进行检测
-        success, results = detection.extension_detect_image(data['image'])
+        # 进行检测（可选 variant 指定模型变体，如 INT8 量化版本）
+        try:
+            variant = data.get('variant')
+            detection.resolve_variant(variant)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        success, results = detection.extension_detect_image(data['image'], variant)
         
         if not success:
             print(f"检测失败: {results}")
             return jsonify({'error': results}), 500
 
         print(f"浏览器插件检测成功，返回 {len(results['detections'])} 个结果")
-        response = jsonify(results)
+        response = encoding.make_response(results, fmt)
         response.headers.add('Access-Control-Allow-Origin', '*')
         return response
 
@@ -46,6 +67,10 @@ def extension_detect():
 def web_detect():
     """网页应用使用的检测接口"""
     try:
+        fmt = encoding.negotiate(request)
+        if fmt is None:
+            return jsonify({'error': 'Unsupported format'}), 406
+
         # 获取图像数据
         if 'image' not in request.files:
             print("请求中缺少图像文件")
@@ -56,20 +81,178 @@ def web_detect():
             print("图像文件为空")
             return jsonify({'error': 'Empty image file'}), 400
 
+        try:
+            variant = request.form.get('variant')
+            detection.resolve_variant(variant)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         # 读取图像数据
         image_bytes = image_file.read()
         print(f"网页应用检测请求 - 图像大小: {len(image_bytes)} 字节")
 
         # 进行检测
-        success, results = detection.detect_image(image_bytes)
+        success, results = detection.detect_image(image_bytes, variant)
         
         if not success:
             print(f"检测失败: {results}")
             return jsonify({'error': results}), 500
 
         print(f"网页应用检测成功，返回 {len(results['detections'])} 个结果")
-        return jsonify(results)
+        return encoding.make_response(results, fmt)
 
     except Exception as e:
         print(f"API错误: {str(e)}")
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/batch-detect', methods=['POST'])
+def batch_detect():
+    """批量检测接口
+
+    上传方式：多个 images 文件字段，或一个 archive 字段（zip 压缩包），可带 variant 表单字段指定模型变体。
+    每张图像检测完成后立即返回一行 JSON（NDJSON），最后一行为汇总（done: true）。
+    协商为紧凑格式时每行的 detections 为紧凑信封；msgpack 格式为连续的 msgpack 对象流。
+    """
+    max_bytes = current_app.config.get('BATCH_MAX_BYTES', 64 * 1024 * 1024)
+    max_images = current_app.config.get('BATCH_MAX_IMAGES', 256)
+    batch_size = current_app.config.get('BATCH_SIZE', 8)
+
+    if request.content_length is None or request.content_length > max_bytes:
+        return jsonify({'error': f'Request body must be at most {max_bytes} bytes'}), 413
+    fmt = encoding.negotiate(request)
+    if fmt is None:
+        return jsonify({'error': 'Unsupported format'}), 406
+    try:
+        variant = request.form.get('variant')
+        detection.resolve_variant(variant)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 上传文件在视图返回后即被关闭，先读入内存（总大小已受 max_bytes 限制），解码和推理仍在流式响应中进行
+    if 'archive' in request.files:
+        try:
+            items = iter_archive(io.BytesIO(request.files['archive'].read()), max_bytes, max_images)
+        except BatchLimitError as e:
+            return jsonify({'error': str(e)}), 413
+        except zipfile.BadZipFile as e:
+            return jsonify({'error': str(e)}), 400
+    elif request.files.getlist('images'):
+        files = request.files.getlist('images')
+        if len(files) > max_images:
+            return jsonify({'error': f'At most {max_images} images per request'}), 413
+        items = [(f.filename, f.read()) for f in files]
+    else:
+        return jsonify({'error': 'No images or archive provided'}), 400
+
+    def generate():
+        started = time.perf_counter()
+        count = failed = 0
+        error = None
+        try:
+            for item in detect_batches(iter_limited(items, max_images), batch_size, variant=variant):
+                count += 1
+                failed += 0 if item['success'] else 1
+                yield _dump_line(item, fmt)
+        except BatchLimitError as e:
+            error = str(e)
+        summary = {'done': True, 'count': count, 'failed': failed,
+                   'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)}
+        if error:
+            summary['error'] = error
+        yield _dump_line(summary, fmt)
+
+    mimetype = encoding.MIMETYPES['msgpack'] if fmt == 'msgpack' else 'application/x-ndjson'
+    response = Response(generate(), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def _dump_line(item, fmt):
+    """批量检测的一行结果：NDJSON 行，msgpack 格式时为单个 msgpack 对象"""
+    if fmt == 'msgpack':
+        return encoding.dumps(item, fmt)
+    return encoding.dumps(item, fmt) + '\n'
+
+@bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交异步检测任务，立即返回任务ID
+
+    JSON 请求体：
+        {"type": "images", "images": ["<base64>", {"name": "a.jpg", "data": "<base64>"}]}
+        {"type": "paths", "paths": ["/data/images"]}
+        {"type": "video", "path": "/data/video.mp4", "stride": 5}
+    均可带 "variant" 指定模型变体。或 multipart 上传 video 文件字段（可带 stride 表单字段）。
+    """
+    max_bytes = current_app.config.get('JOB_MAX_UPLOAD_BYTES', 512 * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': f'Request body must be at most {max_bytes} bytes'}), 413
+
+    try:
+        if 'video' in request.files:
+            # 与 JSON 请求一致，只传入实际提供的字段
+            options = {'stride': request.form.get('stride', type=int), 'variant': request.form.get('variant')}
+            job = job_manager.submit('video', {key: value for key, value in options.items() if value is not None},
+                                     upload=request.files['video'])
+        else:
+            data = request.get_json(silent=True) or {}
+            kind = data.get('type', 'images')
+            options = {key: data[key] for key in ('paths', 'path', 'stride', 'variant') if key in data}
+            inputs = decode_inline_images(data.get('images') or []) if kind == 'images' else None
+            job = job_manager.submit(kind, options, inputs=inputs)
+    except (ValueError, TypeError, binascii.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    except (PermissionError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 403
+    except queue.Full:
+        return jsonify({'error': 'Job queue is full, try again later'}), 503
+    return jsonify(job.to_dict()), 202
+
+@bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """任务列表及执行器统计"""
+    return jsonify({'data': job_manager.list_jobs(), 'stats': job_manager.stats()})
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态和进度"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消进行中的任务，或删除已结束任务的结果"""
+    if not job_manager.cancel(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True})
+
+@bp.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """以 SSE 推送任务进度，任务结束后关闭连接"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        processed, state = None, None
+        while True:
+            if (job.processed, job.state) != (processed, state):
+                processed, state = job.processed, job.state
+                yield f"event: progress\ndata: {json.dumps(job.to_dict())}\n\n"
+                if job.finished:
+                    break
+            else:
+                yield ": keepalive\n\n"
+            job.wait_change(processed, state, timeout=15)
+
+    return Response(generate(), mimetype='text/event-stream')
+
+@bp.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    """以 NDJSON 返回任务结果，支持 offset/limit 分页；运行中的任务返回已完成的部分"""
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    return Response(job_manager.iter_results(job_id, offset, limit), mimetype='application/x-ndjson')
+
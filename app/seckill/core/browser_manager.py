@@ -4,6 +4,7 @@
 优化版本：支持页面状态缓存和智能复用
 """
 
+import base64
 import threading
 import time
 from typing import Dict, Optional, Tuple, List
@@ -38,6 +39,7 @@ class BrowserManager:
     def __init__(self):
         self.browsers: Dict[str, ChromiumPage] = {}
         self.browser_locks: Dict[str, threading.Lock] = {}
+        self.capture_locks: Dict[str, threading.Lock] = {}  # 截图专用锁，与任务操作锁互不影响
         self.page_states: Dict[str, PageState] = {}  # 页面状态缓存
         self.max_browsers = 5  # 最大浏览器实例数
         self.page_cache_timeout = 300  # 页面缓存超时时间（秒）
@@ -82,10 +84,14 @@ class BrowserManager:
         """释放浏览器实例"""
         if task_id in self.browsers:
             try:
+                from .screencast import screencast_hub
+                screencast_hub.stop_task(task_id)
+
                 browser = self.browsers[task_id]
                 browser.quit()
                 del self.browsers[task_id]
                 del self.browser_locks[task_id]
+                self.capture_locks.pop(task_id, None)
                 
                 # 清理页面状态缓存
                 if task_id in self.page_states:
@@ -401,6 +407,45 @@ class BrowserManager:
                 self.logger.error(f"等待元素失败: {str(e)}")
                 return False, str(e)
                 
+    def capture_screenshot(self, task_id: str, max_width: int = None, quality: int = 70) -> Tuple[bool, str, Optional[bytes]]:
+        """
+        通过 CDP 截取任务标签页画面（后台/无头标签页同样可用）
+        
+        只使用已存在的浏览器实例，不会为截图新建浏览器。截图不持有任务操作锁
+        （CDP 截图可以与点击、输入并发执行），点击和输入不会因截图而等待；
+        同一标签页上一次截图尚未返回时跳过本次截图。
+        
+        Args:
+            task_id: 任务ID
+            max_width: 输出最大宽度（像素），超过时按比例缩小
+            quality: JPEG 质量 (1-100)
+            
+        Returns:
+            (是否成功, 消息, JPEG 字节)
+        """
+        browser = self.browsers.get(task_id)
+        if not browser:
+            return False, "浏览器实例不存在", None
+            
+        lock = self.capture_locks.setdefault(task_id, threading.Lock())
+        if not lock.acquire(blocking=False):
+            return False, "上一次截图尚未完成", None
+            
+        try:
+            params = {'format': 'jpeg', 'quality': int(quality), 'fromSurface': True}
+            if max_width:
+                width, height = browser.run_js('return [window.innerWidth, window.innerHeight]')
+                if width and width > max_width:
+                    params['clip'] = {'x': 0, 'y': 0, 'width': width, 'height': height,
+                                      'scale': max_width / width}
+            result = browser.run_cdp('Page.captureScreenshot', **params)
+            return True, "截图成功", base64.b64decode(result['data'])
+        except Exception as e:
+            self.logger.debug(f"标签页截图失败 {task_id}: {str(e)}")
+            return False, str(e), None
+        finally:
+            lock.release()
+            
     def close_all(self):
         """关闭所有浏览器实例"""
         for task_id in list(self.browsers.keys()):
@@ -1,14 +1,30 @@
 """
 任务调度器
 负责管理秒杀任务的执行、暂停、恢复等操作
+
+预热、提醒、执行三类定时事件放在按触发时间（monotonic 时钟）排序的小顶堆中，
+调度线程精确休眠到最近的事件，任务新增、修改、停止或删除时通过 reschedule 重新计算该任务的事件，
+旧事件按任务版本号在出堆时丢弃，每次变更为 O(log n)。
 """
 
+import heapq
+import itertools
 import threading
 import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Callable
 from flask import current_app
 import logging
+from .time_sync import time_sync
+
+EVENT_PRELOAD = 'preload'
+EVENT_REMIND = 'remind'
+EVENT_EXECUTE = 'execute'
+
+REMIND_BEFORE = timedelta(minutes=2)  # 提前提醒时间
+EXECUTE_LEAD = timedelta(seconds=1)   # 首次执行提前启动任务线程，由任务精确等待到执行时间
+CLOCK_CHECK_SECONDS = 30              # 最长休眠时间，醒来检查系统时间是否被调整
+CLOCK_JUMP_SECONDS = 0.05             # 同步时间与 monotonic 时钟的偏移变化超过此值时重建事件堆
 
 class SeckillScheduler:
     """秒杀任务调度器"""
@@ -21,6 +37,20 @@ class SeckillScheduler:
         self.scheduler_thread = None
         self.is_running = False
         self.logger = logging.getLogger(__name__)
+
+        # 定时事件堆：(触发时间(monotonic), 序号, 任务ID, 事件类型, 任务版本)
+        self.events = []
+        self.task_versions: Dict[str, int] = {}
+        self.versions = itertools.count(1)  # 全局递增的版本号，删除后重新添加的任务不会复用旧版本
+        self.reminded: Dict[str, datetime] = {}  # 任务ID -> 已提醒的执行时间
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+        self.clock_offset = self._clock_offset()
+
+        # 统计信息
+        self.events_fired = 0
+        self.lateness_ms_total = 0.0
+        self.max_lateness_ms = 0.0
         
     def start(self):
         """启动调度器"""
@@ -28,13 +58,16 @@ class SeckillScheduler:
             return
             
         self.is_running = True
+        self._rebuild()
         self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
         self.scheduler_thread.start()
         self.logger.info("秒杀调度器已启动")
         
     def stop(self):
         """停止调度器"""
-        self.is_running = False
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
         # 停止所有运行中的任务
         for task_id in list(self.running_tasks.keys()):
             self.stop_task(task_id)
@@ -48,6 +81,7 @@ class SeckillScheduler:
         try:
             self.tasks[task.task_id] = task
             self.task_callbacks[task.task_id] = []
+            self.reschedule(task.task_id)
             self.logger.info(f"添加任务成功: {task.name} (ID: {task.task_id})")
             return True
         except Exception as e:
@@ -71,6 +105,7 @@ class SeckillScheduler:
                 self.logger.info(f"任务 '{task_name}' 已从调度器移除。")
             if task_id in self.task_callbacks:
                 del self.task_callbacks[task_id]
+            self.reschedule(task_id)
                 
             return True
         except Exception as e:
@@ -119,6 +154,7 @@ class SeckillScheduler:
             thread.join(timeout=5)
             
             del self.running_tasks[task_id]
+            self.reschedule(task_id)
             self.logger.info(f"停止任务成功: {task_id}")
             return True
         except Exception as e:
@@ -142,6 +178,7 @@ class SeckillScheduler:
             'attempts': task.attempts,
             'max_attempts': task.max_attempts,
             'success_count': task.success_count,
+            'fire_error_ms': task.fire_error_ms,
             'created_at': task.created_at.isoformat()
         }
         
@@ -155,45 +192,136 @@ class SeckillScheduler:
             self.task_callbacks[task_id] = []
         self.task_callbacks[task_id].append(callback)
         
+    def reschedule(self, task_id: str):
+        """任务新增、修改、停止或删除后重新计算它的定时事件"""
+        with self.condition:
+            version = next(self.versions)
+            task = self.tasks.get(task_id)
+            if task is None:
+                # 堆中残留的事件版本号不会再被分配，出堆时丢弃
+                self.task_versions.pop(task_id, None)
+                self.reminded.pop(task_id, None)
+            else:
+                self.task_versions[task_id] = version
+                for fire_at, kind in self._task_events(task):
+                    heapq.heappush(self.events, (fire_at, next(self.sequence), task_id, kind, version))
+            self._compact()
+            self.condition.notify()
+
+    def _task_events(self, task) -> List[tuple]:
+        """任务当前状态下待触发的事件 [(触发时间(monotonic), 事件类型)]，已过期的事件立即触发"""
+        if task.is_stopped:
+            return []
+        # 与任务精确等待使用同一同步时钟（缓存的偏移量，不触发网络同步）
+        now = time_sync.now()
+        mono = time.monotonic()
+
+        def at(when: datetime) -> float:
+            return max(mono, mono + (when - now).total_seconds())
+
+        events = []
+        if now < task.execution_time:
+            if task.preload_seconds > 0 and not task.is_preloaded:
+                events.append((at(task.execution_time - timedelta(seconds=task.preload_seconds)), EVENT_PRELOAD))
+            if self.reminded.get(task.task_id) != task.execution_time:
+                events.append((at(task.execution_time - REMIND_BEFORE), EVENT_REMIND))
+        if task.attempts < task.max_attempts and task.next_execution:
+            lead = EXECUTE_LEAD if task.attempts == 0 else timedelta(0)
+            events.append((at(task.next_execution - lead), EVENT_EXECUTE))
+        return events
+
+    def _is_stale(self, entry) -> bool:
+        return self.task_versions.get(entry[2]) != entry[4]
+
+    def _compact(self):
+        """过期事件过多时重建堆（调用方持有锁）"""
+        if len(self.events) > 3 * len(self.tasks) + 64:
+            self.events = [entry for entry in self.events if not self._is_stale(entry)]
+            heapq.heapify(self.events)
+
+    def _rebuild(self):
+        """按当前系统时间重新计算所有任务的事件"""
+        with self.condition:
+            self.clock_offset = self._clock_offset()
+            self.events = []
+            for task_id in list(self.tasks.keys()):
+                self.reschedule(task_id)
+
+    @staticmethod
+    def _clock_offset() -> float:
+        """同步时间与 monotonic 时钟的偏移（秒）"""
+        return time_sync.now().timestamp() - time.monotonic()
+
+    def _next_due(self) -> Optional[tuple]:
+        """休眠到最近的事件到期并将其出堆，调度器停止时返回 None"""
+        with self.condition:
+            while self.is_running:
+                # 事件时间由同步时间换算而来，系统时间被调整或时间同步更新偏移量后重新换算
+                if abs(self._clock_offset() - self.clock_offset) > CLOCK_JUMP_SECONDS:
+                    self.logger.info("检测到系统时间调整或时间同步偏移变化，重建调度事件")
+                    self._rebuild()
+                while self.events and self._is_stale(self.events[0]):
+                    heapq.heappop(self.events)
+                if not self.events:
+                    self.condition.wait(CLOCK_CHECK_SECONDS)
+                    continue
+                wait = self.events[0][0] - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(min(wait, CLOCK_CHECK_SECONDS))
+                    continue
+                fire_at, _, task_id, kind, _ = heapq.heappop(self.events)
+                return fire_at, task_id, kind
+        return None
+
     def _scheduler_loop(self):
         """调度器主循环"""
         while self.is_running:
             try:
-                current_time = datetime.now()
-                
-                # 创建任务列表的副本以安全迭代
-                tasks_copy = list(self.tasks.items())
-
-                # 检查需要预热的任务
-                for task_id, task in tasks_copy:
-                    if task.should_preload(current_time) and task_id not in self.preloading_tasks:
-                        self.preloading_tasks.add(task_id)
-                        preload_thread = threading.Thread(
-                            target=self._preload_task_browser, 
-                            args=(task_id,), 
-                            daemon=True
-                        )
-                        preload_thread.start()
-
-                # 检查需要执行的任务
-                for task_id, task in tasks_copy:
-                    if task_id in self.running_tasks:
-                        continue
-                        
-                    # 检查是否到达执行时间
-                    if task.should_execute(current_time):
-                        self.start_task(task_id)
-                        
-                # 检查提醒时间
-                for task_id, task in tasks_copy:
-                    if task.should_remind(current_time):
-                        self._send_reminder(task_id)
-                        
-                time.sleep(1)  # 每秒检查一次
-                
+                due = self._next_due()
+                if due is not None:
+                    self._dispatch(*due)
             except Exception as e:
                 self.logger.error(f"调度器循环错误: {str(e)}")
                 time.sleep(5)
+
+    def _dispatch(self, fire_at: float, task_id: str, kind: str):
+        """处理到期事件"""
+        lateness_ms = (time.monotonic() - fire_at) * 1000
+        self.events_fired += 1
+        self.lateness_ms_total += lateness_ms
+        self.max_lateness_ms = max(self.max_lateness_ms, lateness_ms)
+
+        task = self.tasks.get(task_id)
+        if task is None or task.is_stopped:
+            return
+
+        if kind == EVENT_PRELOAD:
+            if task_id not in self.preloading_tasks and not task.is_preloaded:
+                self.preloading_tasks.add(task_id)
+                preload_thread = threading.Thread(
+                    target=self._preload_task_browser,
+                    args=(task_id,),
+                    daemon=True
+                )
+                preload_thread.start()
+        elif kind == EVENT_REMIND:
+            self.reminded[task_id] = task.execution_time
+            self._send_reminder(task_id)
+        elif kind == EVENT_EXECUTE:
+            # 执行中的任务结束后会重新计算下一次执行事件
+            if task_id not in self.running_tasks and task.attempts < task.max_attempts:
+                self.start_task(task_id)
+
+    def stats(self) -> Dict:
+        """定时事件统计"""
+        with self.condition:
+            pending = sum(1 for entry in self.events if not self._is_stale(entry))
+        return {
+            'pending_events': pending,
+            'events_fired': self.events_fired,
+            'avg_lateness_ms': round(self.lateness_ms_total / self.events_fired, 3) if self.events_fired else 0.0,
+            'max_lateness_ms': round(self.max_lateness_ms, 3)
+        }
                 
     def _preload_task_browser(self, task_id: str):
         """执行浏览器预热"""
@@ -261,6 +389,8 @@ class SeckillScheduler:
             if task.task_id in self.running_tasks:
                 del self.running_tasks[task.task_id]
             self.logger.debug(f"Task {task.task_id} removed from running tasks.")
+            # 失败后按 frequency 重试，成功或达到最大次数则不再有执行事件
+            self.reschedule(task.task_id)
 
     def _send_reminder(self, task_id: str):
         """发送提醒"""
@@ -0,0 +1,195 @@
+"""
+标签页实时预览
+通过 CDP Page.startScreencast 获取任务浏览器的缩小画面，每个任务只开启一路录屏，
+多个观看者共享同一路帧；利用 screencastFrameAck 的流控延迟确认，限制 Chromium 的推帧速率
+"""
+
+import base64
+import threading
+import time
+from typing import Dict, Optional
+import logging
+
+
+class ScreencastViewer:
+    """单个观看者，只保留最新一帧，慢速观看者不会积压"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.closed = False
+
+    def push(self, frame: bytes, seq: int):
+        with self.cond:
+            self.frame = frame
+            self.seq = seq
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def wait_frame(self, last_seq: int, timeout: float):
+        """等待比 last_seq 更新的帧，返回 (帧, 序号)；超时返回 (None, last_seq)"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > last_seq or self.closed, timeout=timeout)
+            if self.seq > last_seq:
+                return self.frame, self.seq
+            return None, last_seq
+
+
+class ScreencastSession:
+    """单个任务的录屏会话"""
+
+    def __init__(self, task_id: str, browser, max_width: int, max_height: int,
+                 quality: int, max_fps: float):
+        self.task_id = task_id
+        self.browser = browser
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0
+        self.viewers = set()
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.last_ack_time = 0.0
+        self.running = False
+        self.started_at = None
+        self.frames_received = 0
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        self.browser.driver.set_callback('Page.screencastFrame', self._on_frame)
+        self.browser.run_cdp('Page.startScreencast', format='jpeg', quality=self.quality,
+                             maxWidth=self.max_width, maxHeight=self.max_height)
+        self.running = True
+        self.started_at = time.time()
+        self.logger.info(f"标签页录屏已开启: {self.task_id}")
+
+    def stop(self):
+        self.running = False
+        try:
+            self.browser.run_cdp('Page.stopScreencast')
+            self.browser.driver.set_callback('Page.screencastFrame', None)
+        except Exception as e:
+            self.logger.debug(f"停止录屏失败 {self.task_id}: {str(e)}")
+        for viewer in list(self.viewers):
+            viewer.close()
+        self.logger.info(f"标签页录屏已关闭: {self.task_id}")
+
+    def _on_frame(self, **params):
+        """CDP 帧事件回调：解码一次后分发给所有观看者，再按最小间隔延迟确认"""
+        if not self.running:
+            return
+        frame = base64.b64decode(params['data'])
+        self.frames_received += 1
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+            viewers = list(self.viewers)
+        for viewer in viewers:
+            viewer.push(frame, seq)
+
+        # Chromium 在收到确认前不会推送下一帧，延迟确认即可限速
+        delay = self.last_ack_time + self.min_interval - time.monotonic()
+        session_id = params.get('sessionId')
+        if delay > 0:
+            timer = threading.Timer(delay, self._ack, args=(session_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._ack(session_id)
+
+    def _ack(self, session_id):
+        if not self.running:
+            return
+        self.last_ack_time = time.monotonic()
+        try:
+            self.browser.run_cdp('Page.screencastFrameAck', sessionId=session_id)
+        except Exception as e:
+            self.logger.debug(f"录屏帧确认失败 {self.task_id}: {str(e)}")
+
+    def to_dict(self) -> dict:
+        return {
+            'task_id': self.task_id,
+            'viewers': len(self.viewers),
+            'max_width': self.max_width,
+            'max_height': self.max_height,
+            'quality': self.quality,
+            'max_fps': round(1.0 / self.min_interval, 2) if self.min_interval else None,
+            'frames_received': self.frames_received,
+            'started_at': self.started_at
+        }
+
+
+class ScreencastHub:
+    """管理所有任务的录屏会话"""
+
+    def __init__(self):
+        self.sessions: Dict[str, ScreencastSession] = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def subscribe(self, task_id: str, max_width: int = 800, max_height: int = 600,
+                  quality: int = 60, max_fps: float = 5) -> Optional[ScreencastViewer]:
+        """订阅任务画面，首个观看者开启录屏，参数以首个观看者为准"""
+        from .browser_manager import browser_manager
+
+        with self.lock:
+            session = self.sessions.get(task_id)
+            if session is None:
+                # 只使用已有的浏览器实例，预览不应创建浏览器
+                browser = browser_manager.browsers.get(task_id)
+                if browser is None:
+                    return None
+                session = ScreencastSession(task_id, browser, max_width, max_height, quality, max_fps)
+                session.start()
+                self.sessions[task_id] = session
+            viewer = ScreencastViewer()
+            with session.lock:
+                session.viewers.add(viewer)
+            return viewer
+
+    def unsubscribe(self, task_id: str, viewer: ScreencastViewer):
+        """取消订阅，最后一个观看者离开时关闭录屏"""
+        with self.lock:
+            session = self.sessions.get(task_id)
+            if session is None:
+                return
+            with session.lock:
+                session.viewers.discard(viewer)
+                empty = not session.viewers
+            if empty:
+                del self.sessions[task_id]
+                session.stop()
+
+    def stop_task(self, task_id: str):
+        """强制关闭任务的录屏（例如浏览器被释放时）"""
+        with self.lock:
+            session = self.sessions.pop(task_id, None)
+        if session:
+            session.stop()
+
+    def generate_mjpeg(self, task_id: str, viewer: ScreencastViewer, timeout: float = 10.0):
+        """生成 multipart/x-mixed-replace 的 MJPEG 流"""
+        last_seq = 0
+        try:
+            while not viewer.closed:
+                frame, last_seq = viewer.wait_frame(last_seq, timeout)
+                if frame is None:
+                    # 页面静止时 Chromium 不推帧，继续等待
+                    continue
+                yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                       + str(len(frame)).encode() + b'\r\n\r\n' + frame + b'\r\n')
+        finally:
+            self.unsubscribe(task_id, viewer)
+
+    def get_status(self) -> list:
+        with self.lock:
+            return [session.to_dict() for session in self.sessions.values()]
+
+
+# 全局录屏管理实例
+screencast_hub = ScreencastHub()
@@ -3,6 +3,8 @@
 确保秒杀时间的精确性，支持北京时间同步和本地时间校准
 """
 
+import math
+import sys
 import time
 import socket
 import threading
@@ -11,6 +13,11 @@ from typing import Optional, Tuple
 import logging
 import requests
 
+# 平台 time.sleep 的唤醒精度（毫秒），自旋保护区间不能小于它：
+# Windows 默认计时器约 15.6 毫秒；其他平台为 1 毫秒级，但调度抖动的长尾可达数毫秒
+TIMER_RESOLUTION_MS = 16.0 if sys.platform == 'win32' else 5.0
+MAX_GUARD_MS = 1000.0  # 自旋保护区间上限（毫秒），避免长时间占满一个 CPU 核
+
 class TimeSync:
     """时间同步器"""
     
@@ -26,6 +33,7 @@ class TimeSync:
             'pool.ntp.org'
         ]
         self.is_syncing = False
+        self.spin_guard_ms = TIMER_RESOLUTION_MS  # 精确等待时，截止时间前改为自旋的保护区间（毫秒）
         
     def sync_time(self) -> bool:
         """同步时间"""
@@ -170,6 +178,10 @@ class TimeSync:
             (datetime.now() - self.last_sync_time).total_seconds() > self.sync_interval):
             self.sync_time()
             
+        return self.now()
+
+    def now(self) -> datetime:
+        """按当前偏移量换算的同步时间（不触发网络同步）"""
         return datetime.now() + timedelta(milliseconds=self.time_offset)
         
     def get_beijing_time(self) -> datetime:
@@ -225,6 +237,51 @@ class TimeSync:
             self.logger.error(f"等待时间异常: {str(e)}")
             return False
             
+    def validate_guard_ms(self, guard_ms) -> float:
+        """校验自旋保护区间（毫秒），None 表示默认值，小于平台计时器精度时按计时器精度处理
+
+        Raises:
+            ValueError: 不是数字、为负数或超过 MAX_GUARD_MS
+        """
+        if guard_ms is None:
+            return self.spin_guard_ms
+        if isinstance(guard_ms, bool):
+            raise ValueError(f"fire_guard_ms 必须是数字: {guard_ms!r}")
+        try:
+            value = float(guard_ms)
+        except (TypeError, ValueError):
+            raise ValueError(f"fire_guard_ms 必须是数字: {guard_ms!r}")
+        if not math.isfinite(value) or value < 0 or value > MAX_GUARD_MS:
+            raise ValueError(f"fire_guard_ms 必须在 0 到 {MAX_GUARD_MS:g} 毫秒之间: {guard_ms!r}")
+        return max(value, TIMER_RESOLUTION_MS)
+
+    def precise_wait(self, target_time: datetime, guard_ms: float = None) -> float:
+        """精确等待到指定的同步时间（先休眠后自旋）
+
+        time.sleep 的唤醒抖动可达数毫秒：在距离截止时间 guard_ms 之前分段休眠
+        （每段结束后按最新的时间偏移量重新换算截止时间），最后 guard_ms 内在 perf_counter 上自旋。
+        等待期间只读取缓存的时间偏移量，不触发网络同步，避免同步超时拖慢触发。
+
+        Args:
+            target_time: 目标时间（同步时间）
+            guard_ms: 自旋保护区间（毫秒），默认 spin_guard_ms，不小于平台计时器精度
+
+        Returns:
+            float: 实际触发误差（毫秒），正数表示晚于目标时间
+        """
+        guard = self.validate_guard_ms(guard_ms) / 1000
+        while True:
+            # 同步时间与 perf_counter 相邻读取，换算出 perf_counter 上的截止时间
+            remaining = (target_time - self.now()).total_seconds()
+            deadline = time.perf_counter() + remaining
+            if remaining <= guard:
+                break
+            time.sleep(min(remaining - guard, 1.0))
+
+        while time.perf_counter() < deadline:
+            pass
+        return (time.perf_counter() - deadline) * 1000
+
     def get_countdown(self, target_time: datetime) -> str:
         """获取倒计时字符串"""
         current_time = self.get_synced_time()
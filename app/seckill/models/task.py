@@ -53,6 +53,7 @@ class SeckillTask:
             countdown_threshold: 倒计时阈值（秒）
             preload_seconds: 浏览器预热时间（秒），即任务执行前提前打开页面的秒数
             countdown_end_flags: 倒计时结束标志（列表）
+            fire_guard_ms: 精确等待执行时间时的自旋保护区间（毫秒），通过 kwargs 传入，默认及下限为平台计时器精度
         """
         self.task_id = task_id or str(uuid.uuid4())
         self.name = name
@@ -81,17 +82,31 @@ class SeckillTask:
         self.last_execution = None
         self.next_execution = execution_time
         self.is_preloaded = False # 浏览器是否已预热
+        self.fire_error_ms = None # 首次执行的实际触发误差（毫秒），正数表示晚于执行时间
         
         # 点击成功验证
         self.success_check_type = kwargs.get('success_check_type', 'none') # none, url_contains, element_exists, url_not_contains
         self.success_check_value = kwargs.get('success_check_value')
         self.success_check_selector_type = kwargs.get('success_check_selector_type', 'css')
 
+        # 精确触发：截止时间前 fire_guard_ms 毫秒内自旋等待
+        self.fire_guard_ms = kwargs.get('fire_guard_ms')
+
         # 额外配置
         self.config = kwargs
         
         self.logger = logging.getLogger(__name__)
         
+    @property
+    def fire_guard_ms(self) -> float:
+        """精确等待执行时间时的自旋保护区间（毫秒）"""
+        return self._fire_guard_ms
+
+    @fire_guard_ms.setter
+    def fire_guard_ms(self, value):
+        from ..core.time_sync import time_sync
+        self._fire_guard_ms = time_sync.validate_guard_ms(value)
+
     def should_execute(self, current_time: datetime) -> bool:
         """检查是否应该执行任务"""
         if self.is_stopped:
@@ -132,6 +147,13 @@ class SeckillTask:
         else:
             return self.execution_time
             
+    def refresh_next_execution(self):
+        """执行时间或频率修改后重新计算下次执行时间"""
+        if self.last_execution is None or self.execution_time > self.last_execution:
+            self.next_execution = self.execution_time
+        else:
+            self.next_execution = self.last_execution + timedelta(seconds=self.frequency)
+
     def execute(self) -> bool:
         """执行任务"""
         if self.is_stopped:
@@ -141,9 +163,11 @@ class SeckillTask:
             self.logger.info(f"任务 {self.name} 已达到最大尝试次数")
             return False
             
+        from ..core.time_sync import time_sync
         self.is_running = True
         self.attempts += 1
-        self.last_execution = datetime.now()
+        # 与调度器换算执行事件使用同一同步时钟
+        self.last_execution = time_sync.now()
         # 为下一次可能的重试更新下一次执行时间
         self.next_execution = self.last_execution + timedelta(seconds=self.frequency)
         
@@ -188,6 +212,7 @@ class SeckillTask:
         self.last_execution = None
         self.next_execution = self.execution_time
         self.is_preloaded = False
+        self.fire_error_ms = None
         self.logger.info(f"任务已重置: {self.name}")
         
     def should_preload(self, current_time: datetime) -> bool:
@@ -207,13 +232,15 @@ class SeckillTask:
             import time
             self.logger.info(f"开始执行秒杀逻辑: {self.name}")
 
-            # 1. 精确等待到执行时间
-            now = time_sync.get_synced_time()
-            if now < self.execution_time:
+            # 1. 精确等待到执行时间（先休眠后自旋），记录首次执行的触发误差
+            # 任务线程在执行时间前 1 秒才启动，这里只读缓存的偏移量，不触发网络同步
+            now = time_sync.now()
+            if now < self.execution_time or self.attempts == 1:
                 wait_seconds = (self.execution_time - now).total_seconds()
                 if wait_seconds > 0:
                     self.logger.info(f"精确等待 {wait_seconds:.3f} 秒")
-                    time.sleep(wait_seconds)
+                self.fire_error_ms = time_sync.precise_wait(self.execution_time, self.fire_guard_ms)
+                self.logger.info(f"到达执行时间，触发误差 {self.fire_error_ms:+.3f} 毫秒")
 
             # 2. 确保页面已加载（如果未预热成功，会在此处加载）
             success, message = browser_manager.load_url(self.task_id, self.url, force_reload=False)
@@ -353,6 +380,8 @@ class SeckillTask:
             'success_check_type': self.success_check_type,
             'success_check_value': self.success_check_value,
             'success_check_selector_type': self.success_check_selector_type,
+            'fire_guard_ms': self.fire_guard_ms,
+            'fire_error_ms': self.fire_error_ms,
         }
         return data
         
@@ -364,6 +393,11 @@ class SeckillTask:
         created_at = datetime.fromisoformat(data['created_at'])
         last_execution = datetime.fromisoformat(data['last_execution']) if data.get('last_execution') else None
         
+        # fire_guard_ms 可能在创建后被修改，以顶层字段为准
+        config = dict(data.get('config', {}))
+        if data.get('fire_guard_ms') is not None:
+            config['fire_guard_ms'] = data['fire_guard_ms']
+
         # 创建任务实例
         task = cls(
             task_id=data['task_id'],
@@ -383,7 +417,7 @@ class SeckillTask:
             countdown_threshold=data.get('countdown_threshold', 0),
             preload_seconds=data.get('preload_seconds', 30),
             countdown_end_flags=data.get('countdown_end_flags', []),
-            **data.get('config', {})
+            **config
         )
         
         # 设置状态
@@ -393,6 +427,8 @@ class SeckillTask:
         task.is_stopped = data.get('is_stopped', False)
         task.created_at = created_at
         task.last_execution = last_execution
+        task.refresh_next_execution()
+        task.fire_error_ms = data.get('fire_error_ms')
         
         return task
         
@@ -416,5 +452,6 @@ class SeckillTask:
             'success_rate': f"{self.success_count}/{self.attempts}" if self.attempts > 0 else "0/0",
             'next_execution': self.get_next_execution().isoformat() if self.get_next_execution() else None,
             'click_mode': self.click_mode,
-            'click_count': self.click_count
+            'click_count': self.click_count,
+            'fire_error_ms': self.fire_error_ms
         } 
\ No newline at end of file
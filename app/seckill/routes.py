@@ -3,12 +3,13 @@
 提供任务管理、元素选择、时间同步等API接口
 """
 
-from flask import request, jsonify, render_template, current_app
+from flask import request, jsonify, render_template, current_app, Response
 from . import bp
 from .core.scheduler import scheduler
 from .core.time_sync import time_sync
 from .core.browser_manager import browser_manager
 from .core.element_selector import element_selector
+from .core.screencast import screencast_hub
 from .models.task import SeckillTask
 from datetime import datetime
 import logging
@@ -68,7 +69,13 @@ def create_task():
         data['execution_time'] = execution_time
 
         # 使用**data将所有参数传递给构造函数
-        task = SeckillTask(**data)
+        try:
+            task = SeckillTask(**data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
         # 添加到调度器
         if scheduler.add_task(task):
@@ -137,6 +144,16 @@ def update_task(task_id):
             }), 404
         
         task = scheduler.tasks[task_id]
+
+        # 先校验再修改，避免任务只更新了一部分字段
+        if 'fire_guard_ms' in data:
+            try:
+                time_sync.validate_guard_ms(data['fire_guard_ms'])
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
         
         # 更新任务配置
         if 'execution_time' in data:
@@ -147,11 +164,14 @@ def update_task(task_id):
                         'countdown_selector', 'countdown_type', 'frequency', 
                         'max_attempts', 'timezone', 'click_mode', 'click_count',
                         'click_interval', 'countdown_threshold', 'preload_seconds',
-                        'remark', 'success_check_type', 'success_check_value', 'success_check_selector_type']
+                        'remark', 'success_check_type', 'success_check_value', 'success_check_selector_type',
+                        'fire_guard_ms']
         
         for field in update_fields:
             if field in data:
                 setattr(task, field, data[field])
+        task.refresh_next_execution()
+        scheduler.reschedule(task_id)
         
         return jsonify({
             'success': True,
@@ -236,6 +256,7 @@ def reset_task(task_id):
         if task_id in scheduler.tasks:
             task = scheduler.tasks[task_id]
             task.reset()
+            scheduler.reschedule(task_id)
             return jsonify({
                 'success': True,
                 'message': '任务重置成功'
@@ -385,6 +406,39 @@ def get_page_info():
             'message': str(e)
         }), 500
 
+@bp.route('/api/tasks/<task_id>/screencast')
+def task_screencast(task_id):
+    """任务浏览器实时预览（MJPEG 流，多个观看者共享同一路录屏）"""
+    try:
+        viewer = screencast_hub.subscribe(
+            task_id,
+            max_width=request.args.get('max_width', 800, type=int),
+            max_height=request.args.get('max_height', 600, type=int),
+            quality=min(max(request.args.get('quality', 60, type=int), 1), 100),
+            max_fps=min(max(request.args.get('fps', 5, type=float), 0.5), 30)
+        )
+        if viewer is None:
+            return jsonify({
+                'success': False,
+                'message': '任务没有正在运行的浏览器'
+            }), 404
+        return Response(screencast_hub.generate_mjpeg(task_id, viewer),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    except Exception as e:
+        logger.error(f"开启实时预览失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@bp.route('/api/screencast/status', methods=['GET'])
+def get_screencast_status():
+    """获取实时预览会话状态"""
+    return jsonify({
+        'success': True,
+        'data': screencast_hub.get_status()
+    })
+
 @bp.route('/api/time/sync', methods=['POST'])
 def sync_time():
     """同步时间"""
@@ -515,7 +569,8 @@ def get_scheduler_status():
             'data': {
                 'is_running': scheduler.is_running,
                 'total_tasks': len(scheduler.tasks),
-                'running_tasks': len(scheduler.running_tasks)
+                'running_tasks': len(scheduler.running_tasks),
+                'timer': scheduler.stats()
             }
         })
     except Exception as e:
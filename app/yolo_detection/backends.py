@@ -0,0 +1,349 @@
+"""
+推理后端
+检测流程只通过后端接口调用模型：predict 处理原始 BGR 图像列表，predict_prepared 处理
+已完成 letterbox 和归一化的 1x3xHxW 输入，二者都返回每张图像的 (xyxy, conf, cls) numpy 数组。
+- ultralytics：真实的 YOLO 模型（延迟导入 ultralytics/torch）
+- onnx：onnxruntime 执行导出的 ONNX 模型（包括 INT8 量化版本，见 quantize.py），不依赖 torch
+- fake：不依赖模型文件和 torch，按输入内容生成确定性的检测框，可配置模拟延迟，
+  用于在任意机器上压测接口、推流和缓存层，以及把流水线开销与模型耗时分离
+"""
+
+import ast
+import os
+import time
+import zlib
+import cv2
+import numpy as np
+from .model_cache import model_cache
+from .preprocess import LetterboxPreprocessor
+
+
+def _empty_boxes():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+
+class InferenceBackend:
+    """推理后端接口（实例不要求线程安全，由推理调度器按模型串行调用）"""
+
+    name = 'base'
+    imgsz = 640             # 默认输入尺寸
+    dynamic_imgsz = True    # 是否支持按次指定输入尺寸（固定尺寸的导出模型为 False）
+
+    def __init__(self, model_path: str, **options):
+        self.model_path = model_path
+        self.options = options
+        self.names = {}
+
+    def load(self):
+        """加载模型"""
+        raise NotImplementedError
+
+    def warmup(self, imgsz: int = 640):
+        """首次推理预热"""
+        self.predict([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)])
+
+    def predict(self, images: list, imgsz: int = None) -> list:
+        """检测 BGR 图像列表，返回每张图像的 (xyxy, conf, cls)；imgsz 为空时使用默认输入尺寸"""
+        raise NotImplementedError
+
+    def effective_imgsz(self, imgsz: int = None) -> int:
+        """实际使用的输入尺寸"""
+        return imgsz if imgsz and self.dynamic_imgsz else self.imgsz
+
+    def predict_prepared(self, inputs: np.ndarray) -> tuple:
+        """检测单张已预处理的输入（1x3xHxW float32，RGB，0-1），返回模型输入坐标系下的 (xyxy, conf, cls)"""
+        raise NotImplementedError
+
+    def info(self) -> dict:
+        return {'backend': self.name, 'model_path': self.model_path}
+
+
+class UltralyticsBackend(InferenceBackend):
+    """Ultralytics YOLO 后端
+
+    启用模型缓存时按输入尺寸缓存已融合的 TorchScript：TorchScript 只能以导出尺寸推理，
+    因此 imgsz 和 requested_sizes（自适应分辨率、监控预处理、ROI 裁剪、监控区域）中的每个尺寸各导出一份。
+    全部命中时每个尺寸加载一个缓存模型，按请求的尺寸选择；任一未命中时加载原始权重，
+    预热完成后在后台导出缺少的尺寸供下次启动使用
+    """
+
+    name = 'ultralytics'
+
+    def __init__(self, model_path: str, imgsz: int = 640, requested_sizes=(), **options):
+        super().__init__(model_path, **options)
+        self.model = None
+        self.imgsz = imgsz
+        self.sizes = sorted(set(requested_sizes) | {imgsz})  # 推理时会按次请求的输入尺寸
+        self.cached_models = {}     # 输入尺寸 -> 命中缓存加载的 TorchScript 模型
+        self.cache_paths = {}       # 输入尺寸 -> 命中的缓存文件
+        self.cache_parts = {}       # 输入尺寸 -> 未命中时待生成的缓存键
+        self.warmup_shapes = {}     # 输入尺寸 -> 预热输入尺寸 [(height, width)]，随缓存保存
+
+    def load(self):
+        from ultralytics import YOLO
+
+        # 设置资源目录
+        resource_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'yolo')
+        os.makedirs(resource_dir, exist_ok=True)
+
+        lookups = {}
+        if self.model_path.endswith('.pt'):
+            lookups = {size: model_cache.lookup(self.model_path, 'torchscript', size, '.torchscript')
+                       for size in self.sizes}
+        if lookups and all(cached for _, cached, _ in lookups.values()):
+            for size, (_, cached, meta) in lookups.items():
+                model = YOLO(cached, task='detect')
+                model.source = resource_dir
+                self.cached_models[size] = model
+                self.cache_paths[size] = cached
+                self.warmup_shapes[size] = [tuple(shape) for shape in meta.get('warmup_shapes', [])]
+            self.model = self.cached_models[self.imgsz]
+        else:
+            self.model = YOLO(self.model_path)
+            self.model.source = resource_dir
+            self.cache_parts = {size: parts for size, (parts, cached, _) in lookups.items()
+                                if parts is not None and not cached}
+        self.names = self.model.names
+
+    def effective_imgsz(self, imgsz: int = None) -> int:
+        # 使用缓存时只有已导出的尺寸可用
+        if self.cached_models:
+            return imgsz if imgsz in self.cached_models else self.imgsz
+        return super().effective_imgsz(imgsz)
+
+    def _model_for(self, imgsz: int):
+        return self.cached_models.get(imgsz, self.model)
+
+    def warmup(self, imgsz: int = None):
+        if self.cached_models:
+            # TorchScript 的前两次推理会做剖析和图优化
+            for size, model in self.cached_models.items():
+                for height, width in self.warmup_shapes.get(size) or [(size, size)]:
+                    for _ in range(2):
+                        model(np.zeros((height, width, 3), dtype=np.uint8), imgsz=size, verbose=False)
+            return
+
+        size = imgsz or self.imgsz
+        self.predict([np.zeros((size, size, 3), dtype=np.uint8)], size)
+        for size, parts in self.cache_parts.items():
+            model_cache.build_async(self.model_path, parts, '.torchscript',
+                                    lambda work_dir, weights_path, size=size: self._export(work_dir, weights_path, size),
+                                    {'warmup_shapes': [[size, size]]})
+        self.cache_parts = {}
+
+    @staticmethod
+    def _export(work_dir: str, weights_path: str, imgsz: int) -> str:
+        """导出指定输入尺寸的融合 TorchScript（在独立的模型实例上进行，不影响正在服务的模型）"""
+        from ultralytics import YOLO
+        return YOLO(weights_path).export(format='torchscript', imgsz=imgsz)
+
+    @staticmethod
+    def _boxes(result):
+        boxes = result.boxes
+        return boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy()
+
+    def predict(self, images, imgsz=None):
+        imgsz = self.effective_imgsz(imgsz)
+        return [self._boxes(r) for r in self._model_for(imgsz)(images, imgsz=imgsz, verbose=False)]
+
+    def predict_prepared(self, inputs):
+        import torch
+        # from_numpy 与预处理缓冲区共享内存，不复制；输入尺寸决定使用哪个缓存模型
+        model = self._model_for(inputs.shape[2])
+        return self._boxes(model(torch.from_numpy(inputs), verbose=False)[0])
+
+    def info(self) -> dict:
+        info = super().info()
+        info.update({'imgsz': self.imgsz, 'sizes': self.sizes,
+                     'cache_paths': {str(size): path for size, path in self.cache_paths.items()}})
+        return info
+
+
+class OnnxBackend(InferenceBackend):
+    """onnxruntime 后端（CPU），输入为固定尺寸 letterbox，输出按 YOLO 检测头格式解码并做 NMS"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path: str, conf: float = 0.25, iou: float = 0.7, max_det: int = 300,
+                 threads: int = None, **options):
+        super().__init__(model_path, **options)
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.threads = threads
+        self.session = None
+        self.input_name = None
+        self.imgsz = 640
+        self.preprocessor = None
+        self.cache_path = None
+
+    def load(self):
+        import onnxruntime as ort
+        from .preprocess import LetterboxPreprocessor
+
+        session_options = ort.SessionOptions()
+        if self.threads:
+            session_options.intra_op_num_threads = int(self.threads)
+
+        # 模型缓存保存图优化后的模型，之后的启动跳过优化
+        parts, cached, meta = model_cache.lookup(self.model_path, 'ort', 0, '.ort.onnx')
+        optimized_path = None
+        if cached:
+            self.cache_path = cached
+        elif parts is not None:
+            os.makedirs(model_cache.directory, exist_ok=True)
+            optimized_path = os.path.join(model_cache.directory, f"build-{parts['key']}-{os.getpid()}.onnx")
+            # 扩展级别的优化与硬件无关，保存的模型可在其他机器上使用
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+            session_options.optimized_model_filepath = optimized_path
+
+        self.session = ort.InferenceSession(self.cache_path or self.model_path, session_options,
+                                            providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        if isinstance(model_input.shape[2], int):
+            self.imgsz = model_input.shape[2]
+        # Ultralytics 导出时把类别名称写入元数据（优化后的模型不保证保留，随缓存元数据另存一份）
+        names = self.session.get_modelmeta().custom_metadata_map.get('names') or (meta or {}).get('names')
+        self.names = ast.literal_eval(names) if names else {}
+        self.preprocessor = LetterboxPreprocessor(self.imgsz)
+
+        if optimized_path is not None:
+            try:
+                self.cache_path = model_cache.commit(self.model_path, parts, '.ort.onnx', optimized_path,
+                                                     {'names': names})
+            except OSError as e:
+                print(f"模型缓存保存失败: {str(e)}")
+
+    dynamic_imgsz = False
+
+    def warmup(self, imgsz: int = None):
+        super().warmup(imgsz or self.imgsz)
+
+    def _postprocess(self, pred: np.ndarray):
+        """解码检测头输出 (4 + 类别数, 候选数)：cx, cy, w, h 和各类别分数"""
+        pred = pred.T
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf >= self.conf
+        if not keep.any():
+            return _empty_boxes()
+        pred, cls, conf = pred[keep], cls[keep], conf[keep]
+        xywh = pred[:, :4].copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2
+
+        # 按类别偏移后统一 NMS，不同类别的框互不抑制
+        offset = cls[:, None].astype(np.float32) * (self.imgsz * 2)
+        nms_boxes = np.hstack([xywh[:, :2] + offset, xywh[:, 2:]])
+        indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), conf.tolist(), self.conf, self.iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:self.max_det]
+        xywh = xywh[indices]
+        xyxy = np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1).astype(np.float32)
+        return xyxy, conf[indices].astype(np.float32), cls[indices].astype(np.float32)
+
+    def predict(self, images, imgsz=None):
+        results = []
+        for img in images:
+            xyxy, conf, cls = self.predict_prepared(self.preprocessor.prepare(img))
+            results.append((self.preprocessor.scale_boxes(xyxy), conf, cls))
+        return results
+
+    def predict_prepared(self, inputs):
+        return self._postprocess(self.session.run(None, {self.input_name: inputs})[0][0])
+
+    def info(self) -> dict:
+        info = super().info()
+        info.update({'imgsz': self.imgsz, 'conf': self.conf, 'iou': self.iou, 'cache_path': self.cache_path})
+        return info
+
+
+class FakeBackend(InferenceBackend):
+    """确定性的假后端
+
+    检测框由 letterbox 后模型输入的尺寸和内容校验和决定（同一输入总是得到相同结果）：
+    predict 先按 imgsz 做与监控流水线相同的 letterbox，在输入坐标系生成检测框后映射回原图，
+    因此与 预处理 + predict_prepared + scale_boxes 的结果一致。
+    耗时为 latency_ms + per_image_ms x 图像数，指定 imgsz 时按输入面积相对 640 缩放。
+    """
+
+    name = 'fake'
+    DEFAULT_NAMES = {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'bus', 5: 'truck'}
+
+    def __init__(self, model_path: str = None, latency_ms: float = 20.0, per_image_ms: float = 0.0,
+                 max_boxes: int = 3, names: dict = None, **options):
+        super().__init__(model_path, **options)
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self.max_boxes = max_boxes
+        self.names = dict(names or self.DEFAULT_NAMES)
+        self.preprocessors = {}     # imgsz -> letterbox 预处理器
+
+    def load(self):
+        """假后端不需要模型文件"""
+
+    def _simulate(self, count: int, imgsz: int = None):
+        # 模拟耗时与输入面积成正比
+        scale = (imgsz / self.imgsz) ** 2 if imgsz else 1.0
+        delay = (self.latency_ms + self.per_image_ms * count) * scale / 1000
+        if delay > 0:
+            time.sleep(delay)
+
+    def _generate(self, height: int, width: int, sample: np.ndarray):
+        """按尺寸和内容采样的校验和生成检测框"""
+        seed = zlib.crc32(np.ascontiguousarray(sample).tobytes()) ^ (height << 16) ^ width
+        rng = np.random.default_rng(seed)
+        count = int(rng.integers(0, self.max_boxes + 1))
+        if count == 0:
+            return _empty_boxes()
+        x1 = rng.uniform(0, width * 0.7, count)
+        y1 = rng.uniform(0, height * 0.7, count)
+        w = rng.uniform(0.1, 0.3, count) * width
+        h = rng.uniform(0.1, 0.3, count) * height
+        xyxy = np.stack([x1, y1, np.minimum(x1 + w, width), np.minimum(y1 + h, height)], axis=1).astype(np.float32)
+        conf = rng.uniform(0.3, 0.95, count).astype(np.float32)
+        cls = rng.integers(0, len(self.names), count).astype(np.float32)
+        return xyxy, conf, cls
+
+    def _from_inputs(self, inputs: np.ndarray):
+        """在模型输入坐标系生成检测框（只对稀疏采样的像素求校验和，避免整图哈希的开销）"""
+        height, width = inputs.shape[2:]
+        return self._generate(height, width, inputs[0, :, ::64, ::64])
+
+    def predict(self, images, imgsz=None):
+        self._simulate(len(images), imgsz)
+        imgsz = imgsz or self.imgsz
+        preprocessor = self.preprocessors.get(imgsz)
+        if preprocessor is None:
+            preprocessor = self.preprocessors[imgsz] = LetterboxPreprocessor(imgsz)
+        results = []
+        for img in images:
+            xyxy, conf, cls = self._from_inputs(preprocessor.prepare(img))
+            results.append((preprocessor.scale_boxes(xyxy), conf, cls))
+        return results
+
+    def predict_prepared(self, inputs):
+        self._simulate(1, max(inputs.shape[2:]))
+        return self._from_inputs(inputs)
+
+    def info(self) -> dict:
+        info = super().info()
+        info.update({'latency_ms': self.latency_ms, 'per_image_ms': self.per_image_ms})
+        return info
+
+
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxBackend.name: OnnxBackend,
+    FakeBackend.name: FakeBackend
+}
+
+
+def create_backend(name: str, model_path: str, **options) -> InferenceBackend:
+    """按名称创建推理后端，配置为 ultralytics 时 .onnx 权重自动使用 onnx 后端"""
+    if name == UltralyticsBackend.name and model_path and model_path.endswith('.onnx'):
+        name = OnnxBackend.name
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f'未知的推理后端: {name}')
+    return backend_class(model_path, **options)
@@ -0,0 +1,123 @@
+"""
+批量检测
+把多张图像按批次送入推理调度器（bulk 优先级，不抢占插件和网页的交互请求），
+下一批的解码与上一批的推理重叠进行，每张图像的结果一出来就交给调用方（用于 NDJSON 流式返回）
+"""
+
+import zipfile
+import cv2
+import numpy as np
+from .detection import detection
+from .inference_scheduler import PRIORITY_BULK
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class BatchLimitError(ValueError):
+    """超过批量请求的大小或数量限制"""
+
+
+def iter_archive(file_obj, max_bytes: int, max_images: int):
+    """打开 zip 压缩包并校验限制，返回逐个读取图像的生成器
+
+    Args:
+        file_obj: 可随机访问的文件对象
+        max_bytes: 解压后的总大小上限（防止压缩炸弹）
+        max_images: 图像数量上限
+
+    Returns:
+        产出 (文件名, 图像字节) 的生成器
+
+    Raises:
+        BatchLimitError: 超过数量或大小限制
+        zipfile.BadZipFile: 不是有效的 zip 文件
+    """
+    archive = zipfile.ZipFile(file_obj)
+    members = [info for info in archive.infolist()
+               if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)]
+    if len(members) > max_images:
+        archive.close()
+        raise BatchLimitError(f'图像数量 {len(members)} 超过上限 {max_images}')
+    total = sum(info.file_size for info in members)
+    if total > max_bytes:
+        archive.close()
+        raise BatchLimitError(f'解压后大小 {total} 字节超过上限 {max_bytes}')
+
+    def generate():
+        with archive:
+            for info in members:
+                yield info.filename, archive.read(info)
+
+    return generate()
+
+
+def _decode(data):
+    """解码图像字节，已是数组时直接返回"""
+    if isinstance(data, np.ndarray):
+        return data
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _collect(chunk, future):
+    """等待一批推理完成，按输入顺序产出每张图像的结果"""
+    try:
+        batch_results, imgsz = future.result() if future is not None else ([], None)
+        error = None
+    except Exception as e:
+        batch_results, imgsz, error = [], None, str(e)
+    results = iter(batch_results)
+    for index, name, shape, decode_error in chunk:
+        item = {'index': index, 'name': name}
+        if decode_error or error:
+            item.update({'success': False, 'error': decode_error or error})
+        else:
+            item.update({'success': True, 'width': shape[1], 'height': shape[0], 'imgsz': imgsz,
+                         'detections': next(results)})
+        yield item
+
+
+def detect_batches(items, batch_size: int = 8, priority: str = PRIORITY_BULK, variant: str = None):
+    """批量检测
+
+    Args:
+        items: 可迭代的 (名称, 图像字节或 BGR 数组)
+        batch_size: 每次推理的图像数
+        priority: 推理调度优先级
+        variant: 模型变体名称，默认使用默认模型
+
+    Yields:
+        每张图像的结果字典（index/name/success/width/height/imgsz/detections 或 error），顺序与输入一致
+    """
+    pending = None
+    chunk, images = [], []
+    for index, (name, data) in enumerate(items):
+        img = _decode(data)
+        if img is None:
+            chunk.append((index, name, None, '无法解码图像数据'))
+        else:
+            chunk.append((index, name, img.shape, None))
+            images.append(img)
+        if len(chunk) < batch_size:
+            continue
+
+        # 提交本批后再产出上一批的结果，解码与推理重叠
+        future = detection.submit_batch(images, priority, variant) if images else None
+        if pending is not None:
+            yield from _collect(*pending)
+        pending = (chunk, future)
+        chunk, images = [], []
+
+    future = detection.submit_batch(images, priority, variant) if images else None
+    if pending is not None:
+        yield from _collect(*pending)
+    if chunk:
+        yield from _collect(chunk, future)
+
+
+def iter_limited(items, max_images: int):
+    """限制图像数量，超出时抛出 BatchLimitError"""
+    for count, item in enumerate(items, start=1):
+        if count > max_images:
+            raise BatchLimitError(f'图像数量超过上限 {max_images}')
+        yield item
+
@@ -1,6 +1,5 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from PIL import Image, ImageGrab
 import base64
 import threading
@@ -8,145 +7,479 @@ import time
 from queue import Queue
 from collections import Counter
 from flask import current_app
-import json
 import os
 import queue
+from .history import DetectionHistory
+from .rules import rule_engine
+from .snapshot import snapshot_writer, draw_detections
+from .recorder import clip_recorder
+from .monitors import MonitorPipeline, TabPipeline, list_monitors
+from .rate_controller import RateController
+from .resolution import ResolutionController
+from .execution import execution_layout
+from .model_manager import ModelManager
+from .backends import create_backend
+from .model_cache import model_cache
+from .preprocess import LetterboxPreprocessor
+from .roi import RoiTracker
+from .zones import zone_manager
+from . import encoding
+from .inference_scheduler import InferenceScheduler, PRIORITY_INTERACTIVE, PRIORITY_MONITOR, PRIORITY_BULK
+
+
+def _to_detections(boxes, names) -> list:
+    """将推理后端返回的 (xyxy, conf, cls) 转换为检测结果列表"""
+    xyxy, confs, classes = boxes
+    return [{
+        'class': names[int(cls)],
+        'confidence': float(conf),
+        'x': int(x1),
+        'y': int(y1),
+        'width': int(x2 - x1),
+        'height': int(y2 - y1)
+    } for (x1, y1, x2, y2), conf, cls in zip(xyxy, confs, classes)]
+
 
 class YOLODetection:
     def __init__(self):
         """初始化检测器"""
-        self.model = None
+        self.models = ModelManager(self._load_model)  # 按名称管理的模型，支持热重载
+        self.backend_name = 'ultralytics'  # 推理后端（ultralytics / onnx / fake）
+        self.backend_options = {}
+        self.variants = {}  # 与默认模型并行服务的模型变体：名称 -> 权重路径（如 INT8 量化版本）
+        self.reload_roots = []  # 热重载允许加载权重的目录（规范化路径）
+        self.inference = InferenceScheduler(self.models)  # 所有推理经由调度器执行
+        self.resolution = ResolutionController(self.inference)  # 按负载切换推理分辨率
         self.monitoring = False
         self.processing = False
-        self.processing_complete = threading.Event()
-        self.frame_queue = queue.Queue(maxsize=5)  # 增加队列大小以存储更多帧
+        self.model_path = None
+        self.pipelines = []  # 每个显示器一条 捕获+检测 流水线
+        self.tab_pipelines = {}  # 任务ID -> 秒杀标签页流水线
         self.detection_queue = queue.Queue(maxsize=2)  # 检测结果队列保持较小
         self.display_fps = 30  # 显示帧率
         self.detect_fps = 5    # 检测帧率
         self.app = None
         self.last_frame_time = 0
-        self.last_detect_time = 0
         self.frame_interval = 1.0 / self.display_fps
-        self.detect_interval = 1.0 / self.detect_fps
-        self.processing_thread = None
-        self.capture_thread = None
-        self.current_frame = None
-        self.frame_lock = threading.Lock()
+        self.detection_listeners = []  # 检测结果订阅者
+        self.history = None         # 检测历史存储
+        self.rate_controller = RateController(self)  # 自适应帧率控制器
 
     def initialize(self, app):
         """初始化检测器，设置队列大小"""
         self.app = app
         with app.app_context():
-            self.frame_queue = Queue(maxsize=app.config['FRAME_QUEUE_SIZE'])
             self.detection_queue = Queue(maxsize=app.config['DETECTION_QUEUE_SIZE'])
             self.display_fps = app.config['DETECTION_FPS']
             self.detect_fps = app.config['DETECTION_FPS']
+            self.frame_interval = 1.0 / self.display_fps
+
+            # 推理后端（fake 后端不需要模型文件和 torch，用于压测和流水线开销分析）
+            self.backend_name = app.config.get('INFERENCE_BACKEND', self.backend_name)
+            self.backend_options = app.config.get('INFERENCE_BACKEND_OPTIONS', {})
+            self.variants = dict(app.config.get('MODEL_VARIANTS', {}))
+            reload_roots = app.config.get('MODEL_RELOAD_ROOTS') or [os.path.dirname(app.config['YOLO_MODEL_PATH'])]
+            self.reload_roots = [os.path.realpath(root) for root in reload_roots]
+            model_cache.configure(app.config)
+
+            # 执行布局（推理线程数需在模型首次推理前设置）
+            execution_layout.configure(app.config)
+            execution_layout.apply_global()
+            self.inference.configure(app.config)
+            self.resolution.configure(app.config)
+
+            # 自适应帧率控制器，初始目标为配置帧率（受上下限约束）
+            self.rate_controller.configure(app.config)
+            if self.rate_controller.enabled:
+                self.apply_rates(self.rate_controller.detect_fps, self.rate_controller.stream_fps)
+
+            if app.config.get('HISTORY_ENABLED', True):
+                self.history = DetectionHistory(app.config['HISTORY_DIR'],
+                                                app.config['HISTORY_SEGMENT_ROWS'])
+                self.add_detection_listener(
+                    lambda event: self.history.append(event['timestamp'], event['detections']))
+
+            # 监控区域（有区域覆盖的显示器只检测区域裁剪）
+            zone_manager.configure(app.config)
+
+            # 规则引擎订阅检测结果
+            rule_engine.configure(app.config)
+            self.add_detection_listener(rule_engine.process)
+
+            # 自动快照（条件评估在检测线程，写盘在后台线程池）
+            snapshot_writer.configure(app.config)
+            self.add_detection_listener(snapshot_writer.on_detection)
+
+            # 事件片段录制（规则动作 {"type": "callback", "name": "record_clip"} 触发）
+            clip_recorder.configure(app.config)
+            rule_engine.register_callback('record_clip', clip_recorder.on_rule)
+
+    def apply_rates(self, detect_fps, stream_fps):
+        """更新检测帧率和推流帧率（由自适应控制器调用）"""
+        self.detect_fps = detect_fps
+        self.display_fps = stream_fps
+        self.frame_interval = 1.0 / stream_fps
+        for pipeline in self.pipelines:
+            pipeline.set_rates(detect_fps, stream_fps)
+
+    def add_detection_listener(self, listener):
+        """订阅检测结果
+
+        Args:
+            listener: 回调函数，参数为检测事件字典
+                (timestamp, detections, frame)，frame 为帧总线中的原始帧视图，仅在回调期间有效
+        """
+        self.detection_listeners.append(listener)
+
+    def remove_detection_listener(self, listener):
+        """取消订阅检测结果"""
+        if listener in self.detection_listeners:
+            self.detection_listeners.remove(listener)
+
+    def _notify_listeners(self, event):
+        """通知所有订阅者，单个订阅者出错不影响检测循环"""
+        for listener in list(self.detection_listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"检测订阅者错误: {str(e)}")
+
+    @property
+    def model(self):
+        """当前默认模型（仅用于读取元数据，推理请通过 self.inference 调度）"""
+        return self.models.current('default')
+
+    def _load_model(self, model_path):
+        """通过配置的推理后端加载并预热模型"""
+        options = dict(self.backend_options)
+        if self.backend_name == 'ultralytics':
+            options.setdefault('requested_sizes', self._requested_imgsz())
+        backend = create_backend(self.backend_name, model_path, **options)
+        backend.load()
+        
+        # 测试模型是否正常工作
+        backend.warmup()
+        return backend
+
+    def _requested_imgsz(self) -> list:
+        """推理时会按次请求的输入尺寸（自适应分辨率、监控预处理、ROI 裁剪、监控区域）"""
+        config = self.app.config if self.app else {}
+        sizes = set()
+        if self.resolution.enabled:
+            sizes.update(self.resolution.sizes)
+        if config.get('MONITOR_PREPROCESS_ENABLED', True):
+            sizes.add(config.get('MONITOR_IMGSZ', 640))
+        if config.get('ROI_TRACKING_ENABLED', False):
+            sizes.add(config.get('ROI_IMGSZ', 320))
+        if config.get('WATCH_ZONES'):
+            sizes.add(zone_manager.imgsz)
+        return sorted(sizes)
 
     def initialize_model(self, model_path):
         """初始化YOLO模型"""
         try:
-            # 设置资源目录
-            resource_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'yolo')
-            os.makedirs(resource_dir, exist_ok=True)
-            
-            # 初始化模型
-            self.model = YOLO(model_path)
-            
-            # 设置资源目录
-            self.model.source = resource_dir
-            
-            # 测试模型是否正常工作
-            test_image = np.zeros((640, 640, 3), dtype=np.uint8)
-            _ = self.model(test_image)
-            
-            return True, None
+            self.models.load('default', model_path)
+            self.model_path = model_path
         except Exception as e:
             print(f"模型初始化错误: {str(e)}")
             return False, str(e)
 
+        # 模型变体加载失败不影响默认模型
+        for name, path in self.variants.items():
+            try:
+                self.models.load(f'variant:{name}', path)
+                print(f"模型变体已加载: {name} ({path})")
+            except Exception as e:
+                print(f"模型变体加载失败 ({name}): {str(e)}")
+        return True, None
+
+    def resolve_variant(self, variant=None):
+        """把请求中的变体名称转换为模型名称，未指定时使用默认模型
+
+        Raises:
+            ValueError: 变体未配置或未加载
+        """
+        if not variant or variant == 'default':
+            return 'default'
+        name = f'variant:{variant}'
+        if not self.models.has(name):
+            raise ValueError(f'模型变体不可用: {variant}')
+        return name
+
+    def reload_model(self, model_path):
+        """后台加载并预热新权重，完成后原子替换默认模型及使用默认权重的流水线模型
+
+        进行中的检测继续使用旧模型完成，旧模型在空闲后释放；监控和其他模块无需重启。
+
+        Raises:
+            PermissionError / FileNotFoundError: 见 check_reload_path
+        """
+        model_path = self.check_reload_path(model_path)
+        old_path = self.model_path
+        targets = ['default'] + [name for name, slot in self.models.slots.items()
+                                 if name.startswith('monitor:') and slot.path == old_path]
+        if not self.models.reload_async(model_path, targets,
+                                        on_success=lambda path: self._on_model_reloaded(old_path, path)):
+            return False, "已有模型重载任务在进行"
+        return True, "模型重载已开始"
+
+    def check_reload_path(self, model_path):
+        """校验热重载的权重路径在允许的目录内（权重加载会反序列化文件），返回规范化路径
+
+        Raises:
+            PermissionError: 路径不在 MODEL_RELOAD_ROOTS 内
+            FileNotFoundError: 文件不存在
+        """
+        real = os.path.realpath(model_path)
+        if not any(os.path.commonpath([real, root]) == root for root in self.reload_roots):
+            raise PermissionError(f'模型路径不在允许的目录内: {model_path}')
+        if not os.path.isfile(real):
+            raise FileNotFoundError(f'模型文件不存在: {model_path}')
+        return real
+
+    def _on_model_reloaded(self, old_path, model_path):
+        """重载成功后记录新权重路径：之后新建的流水线使用新权重，已有的默认权重流水线不会被换回旧权重"""
+        self.model_path = model_path
+        for pipeline in self.pipelines + list(self.tab_pipelines.values()):
+            if pipeline.model_path == old_path:
+                pipeline.model_path = model_path
+
+    def _build_pipelines(self):
+        """根据配置为每个显示器创建流水线"""
+        config = self.app.config if self.app else {}
+        if config.get('MULTI_MONITOR_ENABLED', True):
+            monitors = list_monitors()
+        else:
+            monitors = [{'index': 0, 'left': 0, 'top': 0, 'width': 0, 'height': 0}]
+
+        profiles = config.get('MONITOR_PROFILES', {})
+        budget_mb = config.get('FRAME_BUFFER_MB', 128) / max(1, len(monitors))
+        pipelines = []
+        for monitor in monitors:
+            profile = profiles.get(monitor['index'], {})
+            pipeline = MonitorPipeline(
+                monitor,
+                detect_fps=profile.get('detect_fps', self.detect_fps),
+                model_path=profile.get('model_path', self.model_path),
+                buffer_mb=budget_mb,
+                fixed_fps='detect_fps' in profile
+            )
+            if self.rate_controller.enabled:
+                pipeline.set_rates(self.detect_fps, self.display_fps)
+            if config.get('MONITOR_PREPROCESS_ENABLED', True):
+                pipeline.preprocessor = LetterboxPreprocessor(config.get('MONITOR_IMGSZ', 640))
+            if config.get('ROI_TRACKING_ENABLED', False):
+                pipeline.roi_tracker = RoiTracker(config)
+            self._ensure_pipeline_model(pipeline)
+            pipelines.append(pipeline)
+        return pipelines
+
+    def _ensure_pipeline_model(self, pipeline):
+        """确保流水线有独立的模型实例（Ultralytics 模型对象不是线程安全的），按显示器缓存复用"""
+        if self.models.get_path(pipeline.model_key) != pipeline.model_path:
+            self.models.load(pipeline.model_key, pipeline.model_path)
+
     def start_monitoring(self):
         """开始监控"""
         if self.monitoring:
             return True, "监控已经在运行"
         
         try:
+            self.pipelines = self._build_pipelines()
             self.monitoring = True
             self.processing = True
-            self.processing_complete.clear()
+            rule_engine.reset_state()
+            snapshot_writer.reset_state()
             
-            # 启动捕获线程
-            self.capture_thread = threading.Thread(target=self._capture_frames)
-            self.capture_thread.daemon = True
-            self.capture_thread.start()
+            for pipeline in self.pipelines:
+                self._start_pipeline(pipeline)
             
-            # 启动处理线程
-            self.processing_thread = threading.Thread(target=self._process_frames)
-            self.processing_thread.daemon = True
-            self.processing_thread.start()
-            
-            return True, "监控已启动"
+            self.rate_controller.start()
+            return True, f"监控已启动（{len(self.pipelines)} 个显示器）"
         except Exception as e:
             self.monitoring = False
             self.processing = False
             return False, str(e)
 
-    def _capture_frames(self):
-        """捕获屏幕帧的线程函数"""
-        while self.monitoring:
-            try:
-                # 捕获屏幕
-                screen = np.array(ImageGrab.grab())
-                frame = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
-                
-                # 更新当前帧
-                with self.frame_lock:
-                    self.current_frame = frame.copy()
-                
-                # 将原始帧放入队列
-                if self.frame_queue.full():
-                    self.frame_queue.get()
-                self.frame_queue.put(frame)
-                
-                time.sleep(0.1)  # 短暂休眠以减少CPU使用
-            except Exception as e:
-                print(f"捕获错误: {str(e)}")
-                break
+    def _start_pipeline(self, pipeline):
+        """启动流水线的捕获线程和处理线程"""
+        pipeline.active = True
+        pipeline.processing_complete.clear()
 
-    def _process_frames(self):
+        # 启动捕获线程
+        pipeline.capture_thread = threading.Thread(target=self._capture_frames, args=(pipeline,))
+        pipeline.capture_thread.daemon = True
+        pipeline.capture_thread.start()
+        
+        # 启动处理线程
+        pipeline.processing_thread = threading.Thread(target=self._process_frames, args=(pipeline,))
+        pipeline.processing_thread.daemon = True
+        pipeline.processing_thread.start()
+
+        # 启动片段录制线程（帧总线的独立消费者，编码不阻塞捕获和检测）
+        if clip_recorder.enabled:
+            pipeline.recorder_thread = threading.Thread(target=clip_recorder.record, args=(pipeline,))
+            pipeline.recorder_thread.daemon = True
+            pipeline.recorder_thread.start()
+        self._update_monitor_limit()
+
+    def _update_monitor_limit(self):
+        """monitor 类别的推理并发随运行中的流水线数量调整，各显示器的推理不再互相排队"""
+        count = sum(1 for pipeline in self.pipelines + list(self.tab_pipelines.values()) if pipeline.active)
+        self.inference.set_monitor_sources(count)
+
+    def _stop_pipeline(self, pipeline):
+        """停止流水线并释放缓冲区"""
+        pipeline.active = False
+        pipeline.processing_complete.wait(timeout=2.0)
+        if pipeline.capture_thread:
+            pipeline.capture_thread.join(timeout=2.0)
+        if pipeline.recorder_thread:
+            pipeline.recorder_thread.join(timeout=2.0)
+        pipeline.release()
+        self._update_monitor_limit()
+
+    def start_tab_source(self, task_id, fps=2.0, max_width=1280, quality=70):
+        """以秒杀任务的浏览器标签页作为检测来源（CDP 截图），结果带 task_id 标签进入同一检测流
+
+        Args:
+            task_id: 秒杀任务ID（需已有浏览器实例）
+            fps: 截图及检测帧率
+            max_width: 截图最大宽度
+            quality: 截图 JPEG 质量
+        """
+        if task_id in self.tab_pipelines:
+            return True, "标签页检测已在运行"
+        from app.seckill.core.browser_manager import browser_manager
+        if task_id not in browser_manager.browsers:
+            return False, "任务没有正在运行的浏览器实例"
+        try:
+            config = self.app.config if self.app else {}
+            pipeline = TabPipeline(task_id, float(fps), self.model_path,
+                                   config.get('TAB_SOURCE_BUFFER_MB', 16), int(max_width), int(quality))
+            if config.get('MONITOR_PREPROCESS_ENABLED', True):
+                pipeline.preprocessor = LetterboxPreprocessor(config.get('MONITOR_IMGSZ', 640))
+            if config.get('ROI_TRACKING_ENABLED', False):
+                pipeline.roi_tracker = RoiTracker(config)
+            self._ensure_pipeline_model(pipeline)
+            self.tab_pipelines[task_id] = pipeline
+            self._start_pipeline(pipeline)
+            return True, "标签页检测已启动"
+        except Exception as e:
+            self.tab_pipelines.pop(task_id, None)
+            return False, str(e)
+
+    def stop_tab_source(self, task_id):
+        """停止标签页检测来源"""
+        pipeline = self.tab_pipelines.pop(task_id, None)
+        if pipeline is None:
+            return False, "标签页检测未在运行"
+        self._stop_pipeline(pipeline)
+        return True, "标签页检测已停止"
+
+    def _capture_frames(self, pipeline):
+        """捕获帧的线程函数（显示器截屏或标签页截图）"""
+        execution_layout.enter_stage('capture')
+        grabber = pipeline.create_grabber()
+        try:
+            while pipeline.active:
+                try:
+                    with execution_layout.measure('capture'):
+                        # 直接截屏到帧总线的空闲槽位，首帧或尺寸变化时由总线复制并重新分配
+                        slot = pipeline.frame_bus.reserve()
+                        frame = grabber.grab(dst=slot)
+                        if frame is not None:
+                            pipeline.frame_bus.commit(frame)
+                    
+                    time.sleep(pipeline.capture_interval)  # 按捕获间隔休眠以减少CPU使用
+                except Exception as e:
+                    print(f"捕获错误 (来源 {pipeline.name}): {str(e)}")
+                    break
+        finally:
+            grabber.close()
+
+    def _process_frames(self, pipeline):
         """处理帧的线程函数"""
         if not self.app:
             print("Error: Application context not initialized")
             return
 
+        # 推理在调度器工作线程中执行（已绑定 inference 阶段），处理线程不绑定 CPU
         with self.app.app_context():
-            while self.monitoring:
+            while pipeline.active:
                 try:
                     current_time = time.time()
-                    if current_time - self.last_detect_time < self.detect_interval:
+
+                    # 有监控区域覆盖的显示器只按各区域的帧率检测区域裁剪
+                    if not isinstance(pipeline, TabPipeline):
+                        wait = zone_manager.next_due_in(pipeline.name, pipeline.monitor)
+                        if wait is not None:
+                            if wait > 0 or not self._detect_zones(pipeline, current_time):
+                                time.sleep(min(max(wait, 0.01), 0.05))
+                            continue
+
+                    if current_time - pipeline.last_detect_time < pipeline.detect_interval:
                         time.sleep(0.01)
                         continue
 
-                    # 获取当前帧
-                    with self.frame_lock:
-                        if self.current_frame is None:
-                            continue
-                        frame = self.current_frame.copy()
-                    
-                    # 使用YOLO进行检测
-                    results = self.model(frame)
-                    
-                    # 处理检测结果
-                    detections = []
-                    
-                    # 处理检测结果
-                    for result in results:
-                        boxes = result.boxes
-                        for box in boxes:
-                            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                            conf = float(box.conf[0].cpu().numpy())
-                            cls = int(box.cls[0].cpu().numpy())
-                            cls_name = self.model.names[cls]
-                            
+                    # 租用最新一帧（零拷贝），检测期间写入方跳过该槽位
+                    lease = pipeline.frame_bus.lease_latest('detect')
+                    if lease is None:
+                        time.sleep(0.01)
+                        continue
+
+                    with lease:
+                        frame = lease.frame
+
+                        # 按负载选择推理分辨率（每 N 帧强制全分辨率），模型只支持部分尺寸时换成其可用尺寸
+                        imgsz = self.resolution.choose(pipeline.frames_detected)
+                        model_info = self.models.current(pipeline.model_key)
+                        if model_info is not None and (imgsz is not None or not model_info.dynamic_imgsz):
+                            imgsz = model_info.effective_imgsz(imgsz)
+
+                        # 跟踪模式下，关键帧之间只在跟踪目标周围的裁剪区域推理
+                        tracker = pipeline.roi_tracker
+                        regions = tracker.plan(frame.shape) if tracker is not None else None
+                        preprocessor = None
+                        if regions is not None:
+                            crops = tracker.crop(frame, regions)
+                            used_imgsz = (model_info.effective_imgsz(tracker.imgsz)
+                                          if model_info is not None else tracker.imgsz)
+                            # 所有裁剪一批推理
+                            predict = lambda model: (model.predict(crops, used_imgsz), model.names)
+                        else:
+                            # 使用YOLO进行检测（固定尺寸的监控帧走预分配缓冲区的预处理）
+                            preprocessor = pipeline.get_preprocessor(imgsz)
+                            if preprocessor is not None:
+                                inputs = preprocessor.prepare(frame)
+                                used_imgsz = preprocessor.imgsz
+                                predict = lambda model: (
+                                    self._observed(used_imgsz, lambda: model.predict_prepared(inputs)), model.names)
+                            else:
+                                used_imgsz = model_info.effective_imgsz(imgsz) if model_info is not None else imgsz
+                                predict = lambda model: (
+                                    self._observed(used_imgsz, lambda: model.predict([frame], used_imgsz)[0]),
+                                    model.names)
+                        inference_start = time.perf_counter()
+                        result, names = self.inference.run(pipeline.model_key, PRIORITY_MONITOR, predict)
+                        pipeline.record_inference((time.perf_counter() - inference_start) * 1000)
+                        pipeline.last_imgsz = used_imgsz
+
+                        if regions is not None:
+                            xyxy, confs, classes = tracker.merge_results(regions, result, frame.shape)
+                        else:
+                            xyxy, confs, classes = result
+                            if preprocessor is not None:
+                                xyxy = preprocessor.scale_boxes(xyxy)
+                        if tracker is not None:
+                            tracker.update(xyxy, confs, classes, keyframe=regions is None, regions=regions)
+
+                        # 处理检测结果
+                        detections = []
+                        for (x1, y1, x2, y2), conf, cls in zip(xyxy, confs, classes):
+                            cls_name = names[int(cls)]
+                            conf = float(conf)
+
                             # 添加到检测结果列表
                             detections.append({
                                 'class': cls_name,
@@ -154,34 +487,130 @@ class YOLODetection:
                                 'x': int(x1),
                                 'y': int(y1),
                                 'width': int(x2 - x1),
-                                'height': int(y2 - y1)
+                                'height': int(y2 - y1),
+                                'imgsz': used_imgsz,
+                                **pipeline.tags
                             })
-                            
-                            # 绘制边界框和标签
-                            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                            label = f'{cls_name} {conf:.2f}'
-                            cv2.putText(frame, label, (int(x1), int(y1) - 10), 
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
                     
-                    # 更新检测信息队列
-                    if self.detection_queue.full():
-                        self.detection_queue.get()
-                    self.detection_queue.put(json.dumps(detections))
+                        pipeline.last_detections = detections
+
+                        # 更新检测信息队列（所有显示器汇总到同一队列）
+                        if self.detection_queue.full():
+                            self.detection_queue.get()
+                        self.detection_queue.put(detections)
+
+                        # 通知订阅者（历史存储等），frame 为共享槽位视图，订阅者需要保留时自行复制
+                        self._notify_listeners({
+                            'timestamp': current_time,
+                            'imgsz': used_imgsz,
+                            'keyframe': regions is None,
+                            **pipeline.tags,
+                            'detections': detections,
+                            'frame': frame
+                        })
                     
-                    self.last_detect_time = current_time
+                    pipeline.frames_detected += 1
+                    pipeline.last_detect_time = current_time
                     
                 except Exception as e:
-                    print(f"处理错误: {str(e)}")
+                    print(f"处理错误 (来源 {pipeline.name}): {str(e)}")
                     break
             
-            self.processing = False
-            self.processing_complete.set()
+            pipeline.processing_complete.set()
+            if all(p.processing_complete.is_set() for p in self.pipelines):
+                self.processing = False
+
+    def _detect_zones(self, pipeline, current_time):
+        """检测到期的监控区域（同一帧中到期的区域裁剪合并为一批推理）
+
+        Returns:
+            False 表示没有新帧
+        """
+        lease = pipeline.frame_bus.lease_latest('detect')
+        if lease is None:
+            return False
+
+        with lease:
+            frame = lease.frame
+            due = zone_manager.due(pipeline.name, pipeline.monitor, frame.shape, current_time)
+            if not due:
+                return True
+            crops = [frame[y1:y2, x1:x2] for _, (x1, y1, x2, y2) in due]
+            model_info = self.models.current(pipeline.model_key)
+            used_imgsz = (model_info.effective_imgsz(zone_manager.imgsz)
+                          if model_info is not None else zone_manager.imgsz)
+            inference_start = time.perf_counter()
+            results, names = self.inference.run(
+                pipeline.model_key, PRIORITY_MONITOR, lambda model: (model.predict(crops, used_imgsz), model.names))
+            pipeline.record_inference((time.perf_counter() - inference_start) * 1000)
+            pipeline.last_imgsz = used_imgsz
+
+            # 按区域的类别和置信度过滤，坐标平移回帧坐标
+            detections = []
+            for (zone, (x1, y1, _, _)), (xyxy, confs, classes) in zip(due, results):
+                zone.runs += 1
+                for (bx1, by1, bx2, by2), conf, cls in zip(xyxy, confs, classes):
+                    cls_name = names[int(cls)]
+                    conf = float(conf)
+                    if not zone.accepts(cls_name, conf):
+                        continue
+                    zone.detections += 1
+                    detections.append({
+                        'class': cls_name,
+                        'confidence': conf,
+                        'x': int(bx1 + x1),
+                        'y': int(by1 + y1),
+                        'width': int(bx2 - bx1),
+                        'height': int(by2 - by1),
+                        'imgsz': used_imgsz,
+                        'zone': zone.name,
+                        **pipeline.tags
+                    })
+
+            pipeline.last_detections = detections
+            if self.detection_queue.full():
+                self.detection_queue.get()
+            self.detection_queue.put(detections)
+            self._notify_listeners({
+                'timestamp': current_time,
+                'imgsz': used_imgsz,
+                'zones': [zone.zone_id for zone, _ in due],
+                **pipeline.tags,
+                'detections': detections,
+                'frame': frame
+            })
+
+        pipeline.frames_detected += 1
+        pipeline.last_detect_time = current_time
+        return True
 
-    def generate_frames(self):
-        """生成器函数，用于SSE流"""
+    def get_pipeline(self, monitor=None):
+        """按显示器编号（或 tab:<任务ID>）获取流水线，未指定时返回第一个显示器"""
+        for pipeline in self.pipelines + list(self.tab_pipelines.values()):
+            if monitor is None or pipeline.name == monitor:
+                return pipeline
+        return None
+
+    def pipeline_stats(self) -> list:
+        """各显示器及标签页流水线统计"""
+        return [pipeline.stats() for pipeline in self.pipelines + list(self.tab_pipelines.values())]
+
+    def generate_frames(self, monitor=None, fmt='json'):
+        """生成器函数，用于SSE流
+
+        Args:
+            monitor: 视频帧来源的显示器编号或 tab:<任务ID>，默认第一个显示器；检测结果为所有来源的汇总
+            fmt: 检测结果的编码格式（json 或 packed，见 encoding 模块）
+        """
+        consumer = f"stream:{threading.get_ident()}:{time.perf_counter_ns()}"  # 每个SSE连接独立的读取位置
+        pipeline = None
+        stream_buffer = None  # 绘制边界框用的帧副本，按连接复用
+        # 推流运行在服务器的请求线程上，连接结束时恢复原有的CPU绑定
+        borrowed = execution_layout.borrow_stage('encode')
         try:
             while True:
-                if not self.monitoring:
+                pipeline = self.get_pipeline(monitor)
+                if pipeline is None or not pipeline.active:
                     break
                     
                 current_time = time.time()
@@ -191,14 +620,23 @@ class YOLODetection:
 
                 # 发送检测结果（如果有）
                 if not self.detection_queue.empty():
-                    detections = self.detection_queue.get()
+                    detections = encoding.dumps(self.detection_queue.get(), fmt)
                     yield f"event: detections\ndata: {detections}\n\n"
                 
-                # 发送视频帧
-                if not self.frame_queue.empty():
-                    frame = self.frame_queue.get()
-                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                    frame_base64 = base64.b64encode(buffer).decode('utf-8')
+                # 发送视频帧：没有检测结果时直接从帧总线槽位编码，否则复制到连接自己的缓冲区再绘制边界框
+                lease = pipeline.frame_bus.lease_latest(consumer)
+                if lease is not None:
+                    with lease, execution_layout.measure('encode'):
+                        frame = lease.frame
+                        detections = pipeline.last_detections
+                        if detections:
+                            if stream_buffer is None or stream_buffer.shape != frame.shape:
+                                stream_buffer = np.empty_like(frame)
+                            np.copyto(stream_buffer, frame)
+                            draw_detections(stream_buffer, detections)
+                            frame = stream_buffer
+                        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                        frame_base64 = base64.b64encode(buffer).decode('utf-8')
                     yield f"data: {frame_base64}\n\n"
                     self.last_frame_time = current_time
                 else:
@@ -209,16 +647,62 @@ class YOLODetection:
             print("SSE connection closed")
         except Exception as e:
             print(f"SSE error: {str(e)}")
+        finally:
+            execution_layout.restore_stage(borrowed)
+            if pipeline is not None:
+                pipeline.frame_bus.drop_consumer(consumer)
 
-    def detect_image(self, image_data):
+    def _observed(self, imgsz, fn):
+        """执行单图推理（在调度器工作线程中），纯模型耗时交给分辨率控制器"""
+        started = time.perf_counter()
+        result = fn()
+        self.resolution.observe((time.perf_counter() - started) * 1000, imgsz)
+        return result
+
+    def _detect_single(self, img, variant=None):
+        """交互式单图检测，按当前负载选择分辨率
+
+        Returns:
+            (检测结果列表, 实际输入尺寸)
+        """
+        imgsz = self.resolution.choose()
+
+        def predict(model):
+            used = model.effective_imgsz(imgsz)
+            boxes = self._observed(used, lambda: model.predict([img], used)[0])
+            return _to_detections(boxes, model.names), used
+
+        return self.inference.run(self.resolve_variant(variant), PRIORITY_INTERACTIVE, predict)
+
+    def submit_batch(self, images, priority=PRIORITY_BULK, variant=None):
+        """提交一批已解码图像的推理（一次前向处理整批）
+
+        Args:
+            images: BGR 图像数组列表
+            priority: 推理调度优先级，默认 bulk
+            variant: 模型变体名称，默认使用默认模型
+
+        Returns:
+            Future，结果为 (与 images 顺序一致的检测结果列表, 实际输入尺寸)
+        """
+        imgsz = self.resolution.choose()
+
+        def predict(model):
+            used = model.effective_imgsz(imgsz)
+            return [_to_detections(boxes, model.names) for boxes in model.predict(images, used)], used
+
+        return self.inference.submit(self.resolve_variant(variant), priority, predict)
+
+    def detect_image(self, image_data, variant=None):
         """通用检测方法，用于向后兼容"""
-        return self.web_detect_image(image_data)
+        return self.web_detect_image(image_data, variant)
 
-    def web_detect_image(self, image_data):
+    def web_detect_image(self, image_data, variant=None):
         """网页应用使用的检测方法
         
         Args:
             image_data: 图像文件的二进制数据
+            variant: 模型变体名称，默认使用默认模型
             
         Returns:
             tuple: (success, result)
@@ -233,26 +717,7 @@ class YOLODetection:
                 return False, "无法解码图像数据"
 
             # 进行检测
-            results = self.model(img)
-            
-            # 处理检测结果
-            detections = []
-            for r in results:
-                boxes = r.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    conf = float(box.conf[0].cpu().numpy())
-                    cls = int(box.cls[0].cpu().numpy())
-                    name = self.model.names[cls]
-                    
-                    detections.append({
-                        'class': name,
-                        'confidence': conf,
-                        'x': int(x1),
-                        'y': int(y1),
-                        'width': int(x2 - x1),
-                        'height': int(y2 - y1)
-                    })
+            detections, imgsz = self._detect_single(img, variant)
 
             # 在图像上绘制检测结果
             annotated_img = img.copy()
@@ -269,18 +734,20 @@ class YOLODetection:
 
             return True, {
                 'image': img_base64,
-                'detections': detections
+                'detections': detections,
+                'imgsz': imgsz
             }
 
         except Exception as e:
             print(f"检测过程出错: {str(e)}")
             return False, str(e)
 
-    def extension_detect_image(self, image_data):
+    def extension_detect_image(self, image_data, variant=None):
         """浏览器插件使用的检测方法
         
         Args:
             image_data: base64编码的图像数据
+            variant: 模型变体名称，默认使用默认模型
             
         Returns:
             tuple: (success, result)
@@ -303,26 +770,7 @@ class YOLODetection:
                 return False, "无法解码图像数据"
 
             # 进行检测
-            results = self.model(img)
-            
-            # 处理检测结果
-            detections = []
-            for r in results:
-                boxes = r.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    conf = float(box.conf[0].cpu().numpy())
-                    cls = int(box.cls[0].cpu().numpy())
-                    name = self.model.names[cls]
-                    
-                    detections.append({
-                        'class': name,
-                        'confidence': conf,
-                        'x': int(x1),
-                        'y': int(y1),
-                        'width': int(x2 - x1),
-                        'height': int(y2 - y1)
-                    })
+            detections, imgsz = self._detect_single(img, variant)
 
             # 在图像上绘制检测结果
             annotated_img = img.copy()
@@ -339,7 +787,8 @@ class YOLODetection:
 
             return True, {
                 'image': img_base64,
-                'detections': detections
+                'detections': detections,
+                'imgsz': imgsz
             }
 
         except Exception as e:
@@ -354,16 +803,18 @@ class YOLODetection:
         try:
             self.monitoring = False
             self.processing = False
+            self.rate_controller.stop()
             
-            # 等待处理完成
-            if self.processing_complete:
-                self.processing_complete.wait(timeout=2.0)
-            
-            # 清空队列
-            while not self.frame_queue.empty():
-                self.frame_queue.get()
+            # 等待处理完成并释放帧缓冲区
+            for pipeline in self.pipelines:
+                pipeline.active = False
+            for pipeline in self.pipelines:
+                self._stop_pipeline(pipeline)
+            self.pipelines = []
             while not self.detection_queue.empty():
                 self.detection_queue.get()
+            if self.history:
+                self.history.close()
             
             return True, "监控已停止"
         except Exception as e:
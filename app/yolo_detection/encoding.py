@@ -0,0 +1,166 @@
+"""
+检测结果的紧凑编码
+默认的 JSON 对象列表每条检测都重复一遍键名。高帧率看板和结果很多的批量检测可以通过内容协商改用紧凑格式：
+类别名称表 + 小端定长数组（int16 框坐标、类别索引、uint8 置信度），所有检测取值相同的附加字段只保留一份。
+
+- json：原始对象列表（默认）
+- packed：JSON 信封，数组为 base64 字符串，不需要额外依赖，也可用于 SSE 文本通道
+- msgpack：同样的信封以 msgpack 编码，数组为原始字节（需要安装 msgpack）
+
+紧凑信封：
+    {'format': 'packed', 'count': N, 'classes': [类别名称表],
+     'boxes': int16[N, 4]（x, y, width, height），
+     'cls': uint8[N]（类别表超过 256 项时为 uint16），
+     'conf': uint8[N]（置信度 * 255 四舍五入），
+     'tags': {所有检测取值相同的附加字段}, 'columns': {取值不同的附加字段: [逐条取值]}}
+"""
+
+import base64
+import json
+
+import numpy as np
+from flask import Response, jsonify
+
+MIMETYPES = {
+    'json': 'application/json',
+    'packed': 'application/vnd.yolo-detections+json',
+    'msgpack': 'application/msgpack'
+}
+
+_CORE_FIELDS = ('class', 'confidence', 'x', 'y', 'width', 'height')
+
+
+def _msgpack():
+    """msgpack 为可选依赖，未安装时返回 None"""
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        return None
+
+
+def available_formats() -> list:
+    formats = ['json', 'packed']
+    if _msgpack() is not None:
+        formats.append('msgpack')
+    return formats
+
+
+def negotiate(req, allowed=None):
+    """按 format 查询参数或 Accept 头选择编码格式
+
+    EventSource 等无法设置请求头的客户端使用 ?format=packed。
+
+    Returns:
+        格式名称；显式请求了不支持的格式时返回 None（调用方返回 406）
+    """
+    formats = [fmt for fmt in available_formats() if allowed is None or fmt in allowed]
+    requested = req.args.get('format')
+    if requested:
+        return requested if requested in formats else None
+    best = req.accept_mimetypes.best_match([MIMETYPES[fmt] for fmt in formats])
+    for fmt in formats:
+        if MIMETYPES[fmt] == best:
+            return fmt
+    return 'json'
+
+
+def pack_detections(detections: list, binary: bool = False) -> dict:
+    """把检测结果列表编码为紧凑信封
+
+    Args:
+        detections: 检测结果字典列表（class/confidence/x/y/width/height 及附加字段）
+        binary: 数组为原始字节（msgpack），否则为 base64 字符串
+    """
+    count = len(detections)
+    classes, class_index = [], {}
+    extra = {}
+    for i, det in enumerate(detections):
+        if det['class'] not in class_index:
+            class_index[det['class']] = len(classes)
+            classes.append(det['class'])
+        for key, value in det.items():
+            if key not in _CORE_FIELDS:
+                extra.setdefault(key, [None] * count)[i] = value
+
+    boxes = np.array([[det['x'], det['y'], det['width'], det['height']] for det in detections],
+                     dtype=np.int64).reshape(-1, 4)
+    boxes = np.clip(boxes, -32768, 32767).astype('<i2')
+    cls = np.array([class_index[det['class']] for det in detections],
+                   dtype=np.uint8 if len(classes) <= 256 else '<u2')
+    conf = np.array([det['confidence'] for det in detections], dtype=np.float32)
+    conf = np.clip(np.rint(conf * 255), 0, 255).astype(np.uint8)
+
+    tags, columns = {}, {}
+    for key, values in extra.items():
+        if all(value == values[0] for value in values):
+            tags[key] = values[0]
+        else:
+            columns[key] = values
+
+    def encode(array):
+        data = array.tobytes()
+        return data if binary else base64.b64encode(data).decode('ascii')
+
+    return {
+        'format': 'msgpack' if binary else 'packed',
+        'count': count,
+        'classes': classes,
+        'boxes': encode(boxes),
+        'cls': encode(cls),
+        'conf': encode(conf),
+        'tags': tags,
+        'columns': columns
+    }
+
+
+def unpack_detections(payload: dict) -> list:
+    """把紧凑信封还原为检测结果列表（置信度精度为 1/255）"""
+    count = payload['count']
+    classes = payload['classes']
+
+    def decode(value, dtype):
+        data = value if isinstance(value, bytes) else base64.b64decode(value)
+        return np.frombuffer(data, dtype=dtype)
+
+    boxes = decode(payload['boxes'], '<i2').reshape(count, 4)
+    cls = decode(payload['cls'], np.uint8 if len(classes) <= 256 else '<u2')
+    conf = decode(payload['conf'], np.uint8)
+    detections = []
+    for i in range(count):
+        x, y, w, h = (int(v) for v in boxes[i])
+        det = {'class': classes[cls[i]], 'confidence': round(conf[i] / 255, 3),
+               'x': x, 'y': y, 'width': w, 'height': h, **payload['tags']}
+        for key, values in payload['columns'].items():
+            if values[i] is not None:
+                det[key] = values[i]
+        detections.append(det)
+    return detections
+
+
+def compact(obj, fmt: str):
+    """把检测结果列表，或结果字典中的 detections 字段，编码为指定格式的信封"""
+    if fmt == 'json':
+        return obj
+    if isinstance(obj, list):
+        return pack_detections(obj, binary=fmt == 'msgpack')
+    if isinstance(obj, dict) and isinstance(obj.get('detections'), list):
+        return {**obj, 'detections': pack_detections(obj['detections'], binary=fmt == 'msgpack')}
+    return obj
+
+
+def dumps(obj, fmt: str):
+    """序列化为 str（json/packed）或 bytes（msgpack）"""
+    if fmt == 'msgpack':
+        return _msgpack().packb(compact(obj, fmt), use_bin_type=True)
+    return json.dumps(compact(obj, fmt), ensure_ascii=False)
+
+
+def make_response(obj, fmt: str):
+    """按协商的格式生成响应，json 格式与 jsonify 完全一致"""
+    if fmt == 'json':
+        response = jsonify(obj)
+    else:
+        response = Response(dumps(obj, fmt), mimetype=MIMETYPES[fmt])
+    response.vary.add('Accept')
+    return response
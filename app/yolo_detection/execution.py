@@ -0,0 +1,154 @@
+"""
+执行布局
+配置推理线程数，并将 捕获 / 推理 / 编码 各阶段线程绑定到指定的CPU集合，
+同时统计各阶段消耗的线程CPU时间，避免各阶段与 Torch 内部线程争抢同一批核心
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+import cv2
+
+STAGES = ('capture', 'inference', 'encode')
+
+
+class StageStats:
+    """单个阶段的耗时统计"""
+
+    def __init__(self):
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.calls = 0
+        self.threads = set()
+
+    def to_dict(self) -> dict:
+        return {
+            'cpu_seconds': round(self.cpu_seconds, 3),
+            'wall_seconds': round(self.wall_seconds, 3),
+            'calls': self.calls,
+            'cpu_ms_per_call': round(self.cpu_seconds * 1000 / self.calls, 3) if self.calls else 0.0,
+            'threads': len(self.threads)
+        }
+
+
+class ExecutionLayout:
+    """流水线各阶段的线程数和CPU亲和性配置"""
+
+    def __init__(self):
+        self.inference_threads = None   # Torch 算子内并行线程数
+        self.interop_threads = None     # Torch 算子间并行线程数
+        self.opencv_threads = None      # OpenCV 内部线程数
+        self.affinity = {}              # 阶段 -> CPU编号列表
+        self.lock = threading.Lock()
+        self.stats = {stage: StageStats() for stage in STAGES}
+        self.applied = {}
+
+    def configure(self, config):
+        """从应用配置加载执行布局"""
+        layout = config.get('EXECUTION_LAYOUT', {}) or {}
+        self.inference_threads = layout.get('inference_threads')
+        self.interop_threads = layout.get('interop_threads')
+        self.opencv_threads = layout.get('opencv_threads')
+        available = self.available_cpus()
+        self.affinity = {}
+        for stage, cpus in (layout.get('affinity') or {}).items():
+            if stage not in STAGES:
+                raise ValueError(f'未知的流水线阶段: {stage}')
+            valid = sorted(set(cpus) & available) if available else sorted(set(cpus))
+            if valid:
+                self.affinity[stage] = valid
+
+    @staticmethod
+    def available_cpus() -> set:
+        if hasattr(os, 'sched_getaffinity'):
+            return set(os.sched_getaffinity(0))
+        return set(range(os.cpu_count() or 1))
+
+    def apply_global(self):
+        """设置进程级线程数（需在模型首次推理前调用）"""
+        if self.inference_threads or self.interop_threads:
+            try:
+                import torch
+                if self.inference_threads:
+                    torch.set_num_threads(int(self.inference_threads))
+                if self.interop_threads:
+                    # 只能在首次并行计算前设置一次
+                    torch.set_num_interop_threads(int(self.interop_threads))
+                self.applied['torch_threads'] = torch.get_num_threads()
+            except (ImportError, RuntimeError) as e:
+                print(f"设置推理线程数失败: {str(e)}")
+        if self.opencv_threads is not None:
+            cv2.setNumThreads(int(self.opencv_threads))
+            self.applied['opencv_threads'] = cv2.getNumThreads()
+
+    def enter_stage(self, stage: str):
+        """将当前线程绑定到阶段对应的CPU集合（仅 Linux 支持线程级亲和性）"""
+        self.stats[stage].threads.add(threading.get_ident())
+        cpus = self.affinity.get(stage)
+        if not cpus or not hasattr(os, 'sched_setaffinity'):
+            return
+        try:
+            # pid 为 0 时作用于调用线程
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"绑定CPU失败 ({stage} -> {cpus}): {str(e)}")
+
+    def borrow_stage(self, stage: str):
+        """临时绑定不属于本模块的线程（如推流请求线程），返回交给 restore_stage 的恢复信息
+
+        请求线程在连接结束后还会处理其他请求，不能一直保持阶段绑定
+        """
+        previous = None
+        if self.affinity.get(stage) and hasattr(os, 'sched_getaffinity'):
+            previous = os.sched_getaffinity(0)
+        self.enter_stage(stage)
+        return stage, threading.get_ident(), threading.get_native_id(), previous
+
+    def restore_stage(self, borrowed):
+        """恢复 borrow_stage 之前的CPU亲和性（按系统线程号恢复，生成器在其他线程关闭时也作用于原线程）"""
+        stage, ident, native_id, previous = borrowed
+        self.stats[stage].threads.discard(ident)
+        if previous is None:
+            return
+        try:
+            os.sched_setaffinity(native_id, previous)
+        except OSError as e:
+            print(f"恢复CPU绑定失败 ({stage}): {str(e)}")
+
+    @contextmanager
+    def measure(self, stage: str):
+        """统计一段代码在当前线程上消耗的CPU时间和墙钟时间"""
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cpu = time.thread_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+            stats = self.stats[stage]
+            with self.lock:
+                stats.cpu_seconds += cpu
+                stats.wall_seconds += wall
+                stats.calls += 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {stage: StageStats() for stage in STAGES}
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            stage_stats = {stage: stats.to_dict() for stage, stats in self.stats.items()}
+        return {
+            'inference_threads': self.inference_threads,
+            'interop_threads': self.interop_threads,
+            'opencv_threads': self.opencv_threads,
+            'affinity': self.affinity,
+            'available_cpus': sorted(self.available_cpus()),
+            'applied': self.applied,
+            'stages': stage_stats
+        }
+
+
+# 全局执行布局实例
+execution_layout = ExecutionLayout()
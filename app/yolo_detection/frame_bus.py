@@ -0,0 +1,297 @@
+"""
+共享内存帧总线
+按内存预算在一块共享内存中预分配固定数量的帧槽位，捕获线程直接把帧写进槽位，
+每次写入分配递增的序号。检测、推流、快照等消费者按序号租用槽位直接读取（零拷贝），
+租用期间写入方跳过该槽位。头部记录槽位布局和最新序号，便于按名称定位和排查。
+
+共享内存布局：
+    [头部 int64 x HEADER_FIELDS][每个槽位的序号 int64 x capacity][对齐][槽位0][槽位1]...
+槽位序号为 0 表示正在写入或尚未写入
+"""
+
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+
+MAGIC = 0x46524D42555331      # 'FRMBUS1'
+HEADER_FIELDS = 8
+H_MAGIC, H_CLOSED, H_CAPACITY, H_HEIGHT, H_WIDTH, H_CHANNELS, H_LATEST_SEQ, H_LATEST_SLOT = range(HEADER_FIELDS)
+DATA_ALIGN = 64
+
+
+def _layout(capacity: int, frame_nbytes: int):
+    """计算头部大小（对齐后）和总大小"""
+    header_bytes = (HEADER_FIELDS + capacity) * 8
+    data_offset = (header_bytes + DATA_ALIGN - 1) // DATA_ALIGN * DATA_ALIGN
+    return data_offset, data_offset + capacity * frame_nbytes
+
+
+class FrameLease:
+    """一次槽位租用，frame 只在释放前有效"""
+
+    __slots__ = ('bus', 'generation', 'slot', 'seq', 'frame')
+
+    def __init__(self, bus, generation: int, slot: int, seq: int, frame: np.ndarray):
+        self.bus = bus
+        self.generation = generation
+        self.slot = slot
+        self.seq = seq
+        self.frame = frame
+
+    def release(self):
+        if self.bus is not None:
+            self.bus._release_lease(self)
+            self.bus = None
+            self.frame = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class SharedFrameBus:
+    """共享内存帧环（写入方所在进程）
+
+    槽位数量由内存预算和首帧尺寸决定：capacity = budget // frame_nbytes（至少 2 个，
+    保证有消费者租用时写入方仍有空闲槽位）。帧尺寸变化时重新分配共享内存。
+    """
+
+    def __init__(self, budget_mb: float = 128):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.shm = None
+        self.header = None
+        self.slot_seqs = None
+        self.slots = []
+        self.capacity = 0
+        self.frame_shape = None
+        self.generation = 0
+        self.seq = 0                 # 最新已发布的序号
+        self.latest_slot = -1
+        self.next_slot = 0
+        self.writing_slot = -1       # 已预留、尚未发布的槽位
+        self.leases = []             # 每个槽位的租用计数
+        self.cursors = {}            # 消费者名称 -> 最后读取的序号
+        self.retired = []            # 暂未关闭的旧共享内存 [共享内存, 代数, 未归还的租约数]
+        self.lock = threading.Lock()
+
+        # 统计信息
+        self.total_writes = 0
+        self.total_leases = 0
+        self.dropped = 0             # 所有槽位都被租用而丢弃的帧
+        self.allocations = 0
+
+    @property
+    def name(self):
+        """共享内存名称"""
+        return self.shm.name if self.shm is not None else None
+
+    def _allocate(self, shape):
+        """按帧尺寸分配共享内存（仅在首帧或分辨率变化时调用，调用方持有锁）"""
+        if len(shape) != 3:
+            raise ValueError(f'帧总线只支持 HxWxC 的帧: {shape}')
+        frame_nbytes = int(np.prod(shape))
+        capacity = max(2, self.budget_bytes // frame_nbytes)
+        if frame_nbytes * 2 > self.budget_bytes:
+            print(f"警告: 单帧大小 {frame_nbytes / 1024 / 1024:.1f}MB 超过缓冲预算的一半，仅保留2个槽位")
+
+        self._close_shm()
+        data_offset, total = _layout(capacity, frame_nbytes)
+        self.shm = shared_memory.SharedMemory(create=True, size=total)
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        self.slot_seqs = np.ndarray((capacity,), dtype=np.int64, buffer=self.shm.buf, offset=HEADER_FIELDS * 8)
+        data = np.ndarray((capacity,) + tuple(shape), dtype=np.uint8, buffer=self.shm.buf, offset=data_offset)
+        self.slots = list(data)
+        self.header[:] = (MAGIC, 0, capacity, shape[0], shape[1], shape[2], 0, -1)
+        self.slot_seqs[:] = 0
+
+        self.capacity = capacity
+        self.frame_shape = tuple(shape)
+        self.generation += 1
+        self.latest_slot = -1
+        self.next_slot = 0
+        self.writing_slot = -1
+        self.leases = [0] * capacity
+        self.allocations += 1
+
+    def _close_shm(self):
+        """标记旧共享内存已关闭并释放（调用方持有锁）"""
+        if self.shm is None:
+            return
+        self.header[H_CLOSED] = 1
+        old = self.shm
+        self.shm = None
+        self.header = None
+        self.slot_seqs = None
+        self.slots = []
+        old.unlink()
+        self.retired.append([old, self.generation, sum(self.leases)])
+        self._close_retired()
+
+    def _close_retired(self):
+        """关闭租约已全部归还的旧共享内存（调用方持有锁）
+
+        numpy 视图不会阻止 SharedMemory.close 解除映射，必须等租约全部归还后才能关闭，
+        否则持有租约的消费者会读到已解除映射的内存
+        """
+        remaining = []
+        for entry in self.retired:
+            shm, _, outstanding = entry
+            if outstanding > 0:
+                remaining.append(entry)
+                continue
+            try:
+                shm.close()
+            except BufferError:
+                # 缓冲区仍被导出，下次写入或归还租约时再试
+                remaining.append(entry)
+        self.retired = remaining
+
+    def _find_free_slot(self, skip_latest: bool = False) -> int:
+        """按环形顺序找到下一个未被租用的槽位，全部被租用时返回 -1（调用方持有锁）
+
+        Args:
+            skip_latest: 不在锁内写入时跳过最新槽位，避免消费者租到写了一半的帧
+        """
+        for offset in range(self.capacity):
+            slot = (self.next_slot + offset) % self.capacity
+            if self.leases[slot] == 0 and not (skip_latest and slot == self.latest_slot):
+                return slot
+        return -1
+
+    def reserve(self):
+        """预留一个可写槽位，返回其视图供捕获线程直接写入；尚未确定帧尺寸或无空闲槽位时返回 None"""
+        with self.lock:
+            if self.frame_shape is None:
+                return None
+            slot = self._find_free_slot(skip_latest=True)
+            if slot < 0:
+                self.dropped += 1
+                return None
+            self.slot_seqs[slot] = 0
+            self.writing_slot = slot
+            return self.slots[slot]
+
+    def commit(self, frame: np.ndarray):
+        """发布一帧：frame 是 reserve 返回的槽位视图时直接发布，否则复制到空闲槽位"""
+        with self.lock:
+            if self.retired:
+                self._close_retired()
+            slot = self.writing_slot
+            self.writing_slot = -1
+            if slot >= 0 and frame is self.slots[slot]:
+                self._publish(slot)
+                return True
+
+            if frame.dtype != np.uint8:
+                raise ValueError(f'帧总线只支持 uint8 帧: {frame.dtype}')
+            if self.frame_shape != frame.shape:
+                if any(self.leases):
+                    # 旧尺寸的槽位仍被租用，等消费者释放后再重新分配
+                    self.dropped += 1
+                    return False
+                self._allocate(frame.shape)
+            slot = self._find_free_slot()
+            if slot < 0:
+                self.dropped += 1
+                return False
+            self.slot_seqs[slot] = 0
+            np.copyto(self.slots[slot], frame)
+            self._publish(slot)
+            return True
+
+    def _publish(self, slot: int):
+        """分配序号并更新最新槽位（调用方持有锁）"""
+        self.seq += 1
+        self.slot_seqs[slot] = self.seq
+        self.header[H_LATEST_SLOT] = slot
+        self.header[H_LATEST_SEQ] = self.seq
+        self.latest_slot = slot
+        self.next_slot = (slot + 1) % self.capacity
+        self.total_writes += 1
+
+    def lease_latest(self, consumer: str = None, after_seq: int = None):
+        """租用最新一帧
+
+        Args:
+            consumer: 消费者名称，指定时只返回该消费者尚未读取过的帧并记录读取位置
+            after_seq: 只返回序号大于该值的帧（默认取消费者的读取位置）
+
+        Returns:
+            FrameLease；没有更新的帧时返回 None
+        """
+        with self.lock:
+            if after_seq is None:
+                after_seq = self.cursors.get(consumer, 0) if consumer else 0
+            if self.latest_slot < 0 or self.seq <= after_seq:
+                return None
+            slot = self.latest_slot
+            self.leases[slot] += 1
+            self.total_leases += 1
+            if consumer:
+                self.cursors[consumer] = self.seq
+            return FrameLease(self, self.generation, slot, self.seq, self.slots[slot])
+
+    def _release_lease(self, lease: FrameLease):
+        with self.lock:
+            if lease.generation == self.generation:
+                self.leases[lease.slot] -= 1
+                return
+            # 旧代的租约：最后一个归还后关闭对应的旧共享内存
+            for entry in self.retired:
+                if entry[1] == lease.generation:
+                    entry[2] -= 1
+            self._close_retired()
+
+    def drop_consumer(self, consumer: str):
+        """移除消费者的读取位置（连接断开时调用）"""
+        with self.lock:
+            self.cursors.pop(consumer, None)
+
+    def clear(self):
+        """重置所有消费者的读取位置，保留已分配的槽位"""
+        with self.lock:
+            self.cursors = {}
+            self.latest_slot = -1
+            if self.header is not None:
+                self.header[H_LATEST_SLOT] = -1
+
+    def release(self):
+        """释放共享内存"""
+        with self.lock:
+            self._close_shm()
+            self.capacity = 0
+            self.frame_shape = None
+            # 使未归还的租约失效，之后的 _release_lease 不再访问已清空的计数表
+            self.generation += 1
+            self.latest_slot = -1
+            self.writing_slot = -1
+            self.leases = []
+            self.cursors = {}
+
+    def stats(self) -> dict:
+        """获取总线占用统计，occupancy 为最慢消费者落后的帧数"""
+        with self.lock:
+            slot_bytes = self.slots[0].nbytes if self.slots else 0
+            lags = {name: self.seq - cursor for name, cursor in self.cursors.items()}
+            occupancy = min(max(lags.values(), default=0), self.capacity)
+            return {
+                'name': self.name,
+                'budget_mb': round(self.budget_bytes / 1024 / 1024, 2),
+                'allocated_mb': round(slot_bytes * self.capacity / 1024 / 1024, 2),
+                'slot_bytes': slot_bytes,
+                'capacity': self.capacity,
+                'occupancy': occupancy,
+                'occupancy_ratio': round(occupancy / self.capacity, 3) if self.capacity else 0.0,
+                'frame_shape': list(self.frame_shape) if self.frame_shape else None,
+                'latest_seq': self.seq,
+                'active_leases': sum(self.leases),
+                'consumers': lags,
+                'total_writes': self.total_writes,
+                'total_leases': self.total_leases,
+                'dropped': self.dropped,
+                'allocations': self.allocations,
+                'retired_segments': len(self.retired)
+            }
+
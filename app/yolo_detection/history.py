@@ -0,0 +1,376 @@
+"""
+检测历史存储
+以只追加的列式分段（内存映射 .npy 文件）保存实时监控的检测结果，
+按时间戳和类别建立分段索引，支持时间范围查询和按类别的时间分桶统计
+"""
+
+import json
+import os
+import threading
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class HistorySegment:
+    """单个列式分段
+
+    每列一个内存映射文件：ts(float64)、cls(int16)、conf(float32)、box(int32 x4)。
+    多条流水线并发写入时时间戳可能略有乱序：保存真实时间戳，分段内有序时范围查询直接二分查找，
+    出现乱序后（meta['sorted'] 为 False）改为按掩码筛选。
+    只有可写分段常驻映射，已封存的分段在查询时临时只读映射，查询结束即释放。
+    """
+
+    COLUMNS = {
+        'ts': (np.float64, ()),
+        'cls': (np.int16, ()),
+        'conf': (np.float32, ()),
+        'box': (np.int32, (4,)),
+    }
+
+    def __init__(self, path: str, capacity: int, meta: dict = None):
+        self.path = path
+        self.capacity = capacity
+        self.meta = meta or {
+            'name': os.path.basename(path),
+            'count': 0,
+            'min_ts': None,
+            'max_ts': None,
+            'class_counts': {},
+            'sorted': True,
+            'sealed': False
+        }
+        self.meta.setdefault('sorted', True)
+        self.columns = {}
+
+    @classmethod
+    def create(cls, path: str, capacity: int) -> 'HistorySegment':
+        """创建新的可写分段"""
+        os.makedirs(path, exist_ok=True)
+        segment = cls(path, capacity)
+        for name, (dtype, shape) in cls.COLUMNS.items():
+            segment.columns[name] = open_memmap(
+                os.path.join(path, f'{name}.npy'), mode='w+',
+                dtype=dtype, shape=(capacity,) + shape
+            )
+        return segment
+
+    def open(self, writable: bool = False):
+        """打开已有分段的内存映射"""
+        if self.columns:
+            return
+        mode = 'r+' if writable else 'r'
+        for name in self.COLUMNS:
+            self.columns[name] = open_memmap(os.path.join(self.path, f'{name}.npy'), mode=mode)
+        self.capacity = len(self.columns['ts'])
+
+    @property
+    def count(self) -> int:
+        return self.meta['count']
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def has_class(self, cls_index: int) -> bool:
+        return self.meta['class_counts'].get(str(cls_index), 0) > 0
+
+    def overlaps(self, start_ts: float, end_ts: float) -> bool:
+        if self.count == 0:
+            return False
+        return self.meta['min_ts'] <= end_ts and self.meta['max_ts'] >= start_ts
+
+    def append(self, ts: float, cls_indices, confs, boxes) -> int:
+        """追加一帧的检测结果，返回实际写入的行数"""
+        n = min(len(cls_indices), self.capacity - self.count)
+        if n <= 0:
+            return 0
+        start = self.count
+        end = start + n
+        if start > 0 and ts < self.columns['ts'][start - 1]:
+            self.meta['sorted'] = False
+        self.columns['ts'][start:end] = ts
+        self.columns['cls'][start:end] = cls_indices[:n]
+        self.columns['conf'][start:end] = confs[:n]
+        self.columns['box'][start:end] = boxes[:n]
+
+        meta = self.meta
+        meta['count'] = end
+        meta['min_ts'] = ts if meta['min_ts'] is None else min(meta['min_ts'], ts)
+        meta['max_ts'] = ts if meta['max_ts'] is None else max(meta['max_ts'], ts)
+        counts = meta['class_counts']
+        for idx in cls_indices[:n]:
+            key = str(int(idx))
+            counts[key] = counts.get(key, 0) + 1
+        return n
+
+    def snapshot(self) -> tuple:
+        """当前可见的 (行数, 是否有序, 已打开的列)（调用方持有锁）
+
+        之后的追加只写入行数之外的位置，快照范围内的行可以在锁外读取
+        """
+        return self.count, self.meta['sorted'], dict(self.columns)
+
+    def read_columns(self) -> dict:
+        """以只读方式临时映射各列（不缓存，释放引用即解除映射）"""
+        return {name: open_memmap(os.path.join(self.path, f'{name}.npy'), mode='r') for name in self.COLUMNS}
+
+    @staticmethod
+    def range_rows(ts: np.ndarray, is_sorted: bool, start_ts: float, end_ts: float) -> np.ndarray:
+        """时间范围内的行号（按时间排序）"""
+        if is_sorted:
+            lo = int(np.searchsorted(ts, start_ts, side='left'))
+            hi = int(np.searchsorted(ts, end_ts, side='right'))
+            return np.arange(lo, hi)
+        rows = np.nonzero((ts >= start_ts) & (ts <= end_ts))[0]
+        return rows[np.argsort(ts[rows], kind='stable')]
+
+    def flush(self):
+        for column in self.columns.values():
+            if hasattr(column, 'flush'):
+                column.flush()
+
+    def close(self):
+        self.flush()
+        self.columns = {}
+
+
+class DetectionHistory:
+    """只追加的检测历史存储"""
+
+    def __init__(self, root_dir: str, segment_rows: int = 65536, meta_flush_interval: float = 5.0):
+        self.root_dir = root_dir
+        self.segment_rows = segment_rows
+        self.meta_flush_interval = meta_flush_interval
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # 串行化 index.json 的写入
+        self.segments = []          # 按时间顺序排列的分段
+        self.active = None          # 当前可写分段
+        self.class_table = {}       # 类别名 -> 索引
+        self.class_names = []       # 索引 -> 类别名
+        self.last_ts = 0.0
+        self.loaded = False
+        self.dirty = False
+        self.stop_event = threading.Event()
+        self.flush_thread = None  # 后台定期刷新数据和索引，不占用检测线程
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root_dir, 'index.json')
+
+    def _load(self):
+        """加载分段索引（首次访问时调用）"""
+        if self.loaded:
+            return
+        os.makedirs(self.root_dir, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.class_names = index.get('classes', [])
+            self.class_table = {name: i for i, name in enumerate(self.class_names)}
+            for meta in index.get('segments', []):
+                path = os.path.join(self.root_dir, meta['name'])
+                if os.path.isdir(path):
+                    self.segments.append(HistorySegment(path, self.segment_rows, meta))
+            if self.segments:
+                self.last_ts = self.segments[-1].meta['max_ts'] or 0.0
+                # 未封存的最后一个分段继续写入
+                last = self.segments[-1]
+                if not last.meta['sealed'] and not last.full:
+                    last.open(writable=True)
+                    self.active = last
+        self.loaded = True
+
+    def _index_snapshot(self) -> str:
+        """序列化当前索引（调用方持有锁）"""
+        return json.dumps({
+            'classes': self.class_names,
+            'segments': [segment.meta for segment in self.segments]
+        })
+
+    def _write_index(self, index: str):
+        with self.write_lock:
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(index)
+            os.replace(tmp_path, self.index_path)
+
+    def _flush_loop(self, stop_event: threading.Event):
+        while not stop_event.wait(self.meta_flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"检测历史刷新失败: {str(e)}")
+
+    def flush(self):
+        """刷新可写分段并保存索引（只在有新写入时）"""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            active = self.active
+            index = self._index_snapshot()
+        if active is not None:
+            active.flush()
+        self._write_index(index)
+
+    def _class_index(self, name: str) -> int:
+        idx = self.class_table.get(name)
+        if idx is None:
+            idx = len(self.class_names)
+            self.class_names.append(name)
+            self.class_table[name] = idx
+        return idx
+
+    def _new_segment(self):
+        if self.active:
+            self.active.meta['sealed'] = True
+            self.active.close()
+        name = f'seg_{len(self.segments):06d}'
+        self.active = HistorySegment.create(os.path.join(self.root_dir, name), self.segment_rows)
+        self.segments.append(self.active)
+        self.dirty = True
+
+    def append(self, timestamp: float, detections: list):
+        """追加一帧的检测结果
+
+        Args:
+            timestamp: 帧时间戳（Unix 秒）
+            detections: 检测结果列表（class/confidence/x/y/width/height）
+        """
+        if not detections:
+            return
+        with self.lock:
+            self._load()
+            ts = float(timestamp)
+            self.last_ts = max(ts, self.last_ts)
+            if self.flush_thread is None:
+                self.stop_event = threading.Event()
+                self.flush_thread = threading.Thread(target=self._flush_loop, args=(self.stop_event,), daemon=True)
+                self.flush_thread.start()
+
+            cls_indices = np.array([self._class_index(d['class']) for d in detections], dtype=np.int16)
+            confs = np.array([d['confidence'] for d in detections], dtype=np.float32)
+            boxes = np.array([[d['x'], d['y'], d['width'], d['height']] for d in detections], dtype=np.int32)
+
+            offset = 0
+            while offset < len(cls_indices):
+                if self.active is None or self.active.full:
+                    self._new_segment()
+                offset += self.active.append(ts, cls_indices[offset:], confs[offset:], boxes[offset:])
+            self.dirty = True
+
+    def _scan_plan(self, start_ts: float, end_ts: float, cls_index: int = None) -> list:
+        """按分段元数据（时间范围、类别计数）筛选需要扫描的分段，记录各自的快照（调用方持有锁）
+
+        Returns:
+            [(分段, 行数, 是否有序, 已打开的列)]，扫描在锁外进行，不阻塞检测线程的追加
+        """
+        plan = []
+        for segment in self.segments:
+            if not segment.overlaps(start_ts, end_ts):
+                continue
+            if cls_index is not None and not segment.has_class(cls_index):
+                continue
+            plan.append((segment,) + segment.snapshot())
+        return plan
+
+    @staticmethod
+    def _scan(plan: list, start_ts: float, end_ts: float):
+        """依次产出各分段的 (列, 时间范围内的行号)，封存分段的临时映射在处理下一个分段前释放"""
+        for segment, count, is_sorted, columns in plan:
+            columns = columns or segment.read_columns()
+            yield columns, HistorySegment.range_rows(columns['ts'][:count], is_sorted, start_ts, end_ts)
+            del columns
+
+    def query(self, start_ts: float, end_ts: float, class_name: str = None, limit: int = 1000) -> list:
+        """查询时间范围内的检测记录"""
+        with self.lock:
+            self._load()
+            cls_index = None
+            if class_name is not None:
+                cls_index = self.class_table.get(class_name)
+                if cls_index is None:
+                    return []
+            class_names = list(self.class_names)
+            plan = self._scan_plan(start_ts, end_ts, cls_index)
+
+        records = []
+        for columns, rows in self._scan(plan, start_ts, end_ts):
+            selected = rows[columns['cls'][rows] == cls_index] if cls_index is not None else rows
+            if len(selected) == 0:
+                continue
+            selected = selected[:limit - len(records)]
+            ts_col = columns['ts'][selected]
+            conf_col = columns['conf'][selected]
+            box_col = columns['box'][selected]
+            cls_sel = columns['cls'][selected]
+            for i in range(len(selected)):
+                x, y, w, h = (int(v) for v in box_col[i])
+                records.append({
+                    'timestamp': float(ts_col[i]),
+                    'class': class_names[int(cls_sel[i])],
+                    'confidence': float(conf_col[i]),
+                    'x': x,
+                    'y': y,
+                    'width': w,
+                    'height': h
+                })
+            if len(records) >= limit:
+                break
+        return records
+
+    def counts(self, start_ts: float, end_ts: float, bucket_seconds: float = 60, class_name: str = None) -> dict:
+        """按时间分桶统计各类别的检测数量"""
+        bucket_seconds = max(float(bucket_seconds), 1e-3)
+        num_buckets = max(1, int(np.ceil((end_ts - start_ts) / bucket_seconds)))
+        with self.lock:
+            self._load()
+            cls_index = None
+            if class_name is not None:
+                cls_index = self.class_table.get(class_name)
+                if cls_index is None:
+                    return {'bucket_seconds': bucket_seconds, 'start': start_ts, 'counts': {}}
+            class_names = list(self.class_names)
+            plan = self._scan_plan(start_ts, end_ts, cls_index)
+
+        num_classes = len(class_names)
+        totals = np.zeros((num_classes, num_buckets), dtype=np.int64)
+        for columns, rows in self._scan(plan, start_ts, end_ts):
+            ts_col = columns['ts'][rows]
+            cls_col = columns['cls'][rows].astype(np.int64)
+            if cls_index is not None:
+                mask = cls_col == cls_index
+                ts_col, cls_col = ts_col[mask], cls_col[mask]
+            buckets = np.minimum(((ts_col - start_ts) // bucket_seconds).astype(np.int64), num_buckets - 1)
+            np.add.at(totals, (cls_col, buckets), 1)
+
+        counts = {
+            class_names[i]: totals[i].tolist()
+            for i in range(num_classes) if totals[i].any()
+        }
+        return {'bucket_seconds': bucket_seconds, 'start': start_ts, 'counts': counts}
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._load()
+            return {
+                'segments': len(self.segments),
+                'rows': sum(segment.count for segment in self.segments),
+                'classes': list(self.class_names),
+                'first_ts': self.segments[0].meta['min_ts'] if self.segments else None,
+                'last_ts': self.last_ts or None
+            }
+
+    def close(self):
+        """停止后台刷新，刷新数据并保存索引"""
+        with self.lock:
+            self.stop_event.set()
+            self.flush_thread = None
+            if not self.loaded:
+                return
+            active = self.active
+            index = self._index_snapshot()
+            self.dirty = False
+        if active is not None:
+            active.flush()
+        self._write_index(index)
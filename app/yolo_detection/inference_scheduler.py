@@ -0,0 +1,207 @@
+"""
+推理调度器
+统一持有模型管理器，所有推理（接口请求、实时监控、批量任务）都提交到这里：
+- 优先级：interactive（接口）> monitor（实时监控）> bulk（批量任务）
+- 公平性：按权重轮转，繁忙时低优先级类别也能按比例获得执行机会，不会饿死
+- 每个类别有并发上限，总并发由工作线程数限制；monitor 类别默认按实时监控流水线数量放开
+- 同一个模型实例上的推理串行执行（Ultralytics 模型对象不是线程安全的），
+  排在前面的请求所用模型繁忙时，同类别中使用空闲模型的后续请求可以先执行
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict
+from .execution import execution_layout
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_MONITOR = 'monitor'
+PRIORITY_BULK = 'bulk'
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_MONITOR, PRIORITY_BULK)
+
+
+class _InferenceRequest:
+    """排队中的推理请求"""
+
+    __slots__ = ('model_name', 'fn', 'future', 'enqueued_at')
+
+    def __init__(self, model_name: str, fn: Callable, future: Future):
+        self.model_name = model_name
+        self.fn = fn
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class _ClassStats:
+    """单个优先级类别的统计"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_ms_total = 0.0
+        self.run_ms_total = 0.0
+
+    def to_dict(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_wait_ms': round(self.wait_ms_total / done, 2) if done else 0.0,
+            'avg_run_ms': round(self.run_ms_total / done, 2) if done else 0.0
+        }
+
+
+class InferenceScheduler:
+    """按优先级和公平权重调度推理请求"""
+
+    def __init__(self, models):
+        self.models = models
+        self.num_workers = 2
+        self.limits = {PRIORITY_INTERACTIVE: 2, PRIORITY_MONITOR: None, PRIORITY_BULK: 1}  # None 表示按流水线数量
+        self.monitor_sources = 1        # 运行中的实时监控流水线数量
+        self.weights = {PRIORITY_INTERACTIVE: 4, PRIORITY_MONITOR: 2, PRIORITY_BULK: 1}
+        self.serialize_models = True    # 同一模型实例上的推理是否串行
+
+        self.cond = threading.Condition()
+        self.queues: Dict[str, deque] = {name: deque() for name in PRIORITY_CLASSES}
+        self.running: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.credits: Dict[str, int] = dict(self.weights)
+        self.busy_models = set()
+        self.workers = []
+        self.stats_by_class = {name: _ClassStats() for name in PRIORITY_CLASSES}
+
+    def configure(self, config):
+        """从应用配置加载参数"""
+        self.num_workers = config.get('INFERENCE_WORKERS', self.num_workers)
+        self.limits.update(config.get('INFERENCE_CLASS_LIMITS', {}))
+        self.weights.update(config.get('INFERENCE_CLASS_WEIGHTS', {}))
+        self.serialize_models = not config.get('INFERENCE_BACKEND_THREAD_SAFE', False)
+        self.credits = dict(self.weights)
+
+    def _ensure_workers(self):
+        """按需启动工作线程"""
+        self.workers = [w for w in self.workers if w.is_alive()]
+        while len(self.workers) < self.num_workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, model_name: str, priority: str, fn: Callable) -> Future:
+        """提交推理请求
+
+        Args:
+            model_name: 模型管理器中的模型名称
+            priority: 优先级类别（interactive / monitor / bulk）
+            fn: 推理函数，参数为模型对象，返回值作为 Future 的结果
+        """
+        if priority not in self.queues:
+            raise ValueError(f'未知的优先级类别: {priority}')
+        future = Future()
+        with self.cond:
+            self._ensure_workers()
+            self.queues[priority].append(_InferenceRequest(model_name, fn, future))
+            self.stats_by_class[priority].submitted += 1
+            self.cond.notify()
+        return future
+
+    def run(self, model_name: str, priority: str, fn: Callable, timeout: float = None):
+        """提交推理请求并等待结果"""
+        return self.submit(model_name, priority, fn).result(timeout=timeout)
+
+    def set_monitor_sources(self, count: int):
+        """更新运行中的实时监控流水线数量（monitor 类别未配置固定上限时作为并发上限）"""
+        with self.cond:
+            self.monitor_sources = max(1, int(count))
+            self.cond.notify_all()
+
+    def _limit(self, priority: str) -> int:
+        limit = self.limits.get(priority, 1)
+        return self.monitor_sources if limit is None else limit
+
+    def _runnable_index(self, priority: str):
+        """类别中第一个可执行请求的位置（跳过模型繁忙的请求），没有时返回 None"""
+        queue = self.queues[priority]
+        if not queue or self.running[priority] >= self._limit(priority):
+            return None
+        if not self.serialize_models:
+            return 0
+        for index, request in enumerate(queue):
+            if request.model_name not in self.busy_models:
+                return index
+        return None
+
+    def _pick(self):
+        """按优先级选择类别，消耗该类别的轮转权重；所有可运行类别权重耗尽时重新补充（调用方持有锁）"""
+        runnable = {name: self._runnable_index(name) for name in PRIORITY_CLASSES}
+        eligible = [name for name in PRIORITY_CLASSES if runnable[name] is not None]
+        if not eligible:
+            return None, None
+        with_credit = [name for name in eligible if self.credits.get(name, 0) > 0]
+        if not with_credit:
+            self.credits = dict(self.weights)
+            with_credit = eligible
+        priority = with_credit[0]
+        self.credits[priority] -= 1
+        queue = self.queues[priority]
+        request = queue[runnable[priority]]
+        del queue[runnable[priority]]
+        return priority, request
+
+    def _worker_loop(self):
+        execution_layout.enter_stage('inference')
+        while True:
+            with self.cond:
+                priority, request = self._pick()
+                while request is None:
+                    self.cond.wait()
+                    priority, request = self._pick()
+                self.running[priority] += 1
+                if self.serialize_models:
+                    self.busy_models.add(request.model_name)
+
+            self._execute(priority, request)
+
+            with self.cond:
+                self.running[priority] -= 1
+                self.busy_models.discard(request.model_name)
+                # 释放的并发名额和模型可能让其他类别变为可运行
+                self.cond.notify_all()
+
+    def _execute(self, priority: str, request: _InferenceRequest):
+        stats = self.stats_by_class[priority]
+        if not request.future.set_running_or_notify_cancel():
+            return
+        start = time.perf_counter()
+        stats.wait_ms_total += (start - request.enqueued_at) * 1000
+        try:
+            with execution_layout.measure('inference'):
+                with self.models.acquire(request.model_name) as model:
+                    result = request.fn(model)
+            request.future.set_result(result)
+            stats.completed += 1
+        except Exception as e:
+            request.future.set_exception(e)
+            stats.failed += 1
+        finally:
+            stats.run_ms_total += (time.perf_counter() - start) * 1000
+
+    def queued(self) -> dict:
+        """各优先级类别当前的排队数"""
+        with self.cond:
+            return {name: len(queue) for name, queue in self.queues.items()}
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                'workers': self.num_workers,
+                'limits': {name: self._limit(name) for name in PRIORITY_CLASSES},
+                'weights': dict(self.weights),
+                'serialize_models': self.serialize_models,
+                'queued': {name: len(queue) for name, queue in self.queues.items()},
+                'running': dict(self.running),
+                'busy_models': sorted(self.busy_models),
+                'classes': {name: stats.to_dict() for name, stats in self.stats_by_class.items()}
+            }
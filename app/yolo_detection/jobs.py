@@ -0,0 +1,377 @@
+"""
+异步检测任务
+长时间的检测工作（大量图像、服务器本地目录、视频）以任务形式提交，立即返回任务ID，
+由独立的有界工作线程池按 bulk 优先级执行，不占用接口请求线程，也不会饿死插件的交互请求。
+每个任务一个目录：job.json 保存状态，results.ndjson.gz 保存逐图结果（紧凑 JSON + gzip），
+过期任务按 TTL 清理
+"""
+
+import base64
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+import cv2
+from .batch import detect_batches, IMAGE_EXTENSIONS
+from .detection import detection
+from .inference_scheduler import PRIORITY_BULK
+
+JOB_KINDS = ('images', 'paths', 'video')
+TERMINAL_STATES = ('done', 'failed', 'cancelled')
+
+
+class DetectionJob:
+    """单个检测任务的状态"""
+
+    def __init__(self, kind: str, options: dict = None, job_id: str = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.options = options or {}
+        self.state = 'queued'
+        self.total = None
+        self.processed = 0
+        self.failed = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.inputs = None          # 内联图像（仅内存中，不写入 job.json）
+        self.cond = threading.Condition()
+
+    def update(self, **fields):
+        """更新字段并唤醒等待进度的订阅者"""
+        with self.cond:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.cond.notify_all()
+
+    def wait_change(self, processed: int, state: str, timeout: float):
+        """等待进度或状态变化"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.processed != processed or self.state != state, timeout=timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'options': self.options,
+            'state': self.state,
+            'total': self.total,
+            'processed': self.processed,
+            'failed': self.failed,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        job = cls(data['kind'], data.get('options'), data['job_id'])
+        for key in ('state', 'total', 'processed', 'failed', 'error', 'created_at', 'started_at', 'finished_at'):
+            setattr(job, key, data.get(key))
+        if not job.finished:
+            # 进程重启时未完成的任务无法继续
+            job.state = 'failed'
+            job.error = '服务重启，任务中断'
+        return job
+
+
+class JobManager:
+    """检测任务管理器"""
+
+    def __init__(self):
+        self.directory = None
+        self.num_workers = 1
+        self.batch_size = 8
+        self.ttl_seconds = 24 * 3600
+        self.allowed_roots = []     # 允许读取的服务器本地目录，为空时禁用路径和本地视频输入
+        self.video_stride = 5       # 视频每隔多少帧检测一次
+        self.job_queue = queue.Queue(maxsize=16)
+        self.workers = []
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def configure(self, config):
+        """从应用配置加载参数，并载入磁盘上未过期的任务"""
+        self.directory = config.get('JOB_DIR')
+        self.num_workers = config.get('JOB_WORKERS', self.num_workers)
+        self.batch_size = config.get('BATCH_SIZE', self.batch_size)
+        self.ttl_seconds = config.get('JOB_TTL_HOURS', 24) * 3600
+        self.allowed_roots = [os.path.realpath(root) for root in config.get('JOB_ALLOWED_ROOTS', [])]
+        self.video_stride = config.get('JOB_VIDEO_STRIDE', self.video_stride)
+        self.job_queue = queue.Queue(maxsize=config.get('JOB_QUEUE_SIZE', 16))
+        self._load()
+        self.cleanup()
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def _results_path(self, job_id: str) -> str:
+        return os.path.join(self._job_dir(job_id), 'results.ndjson.gz')
+
+    def _save(self, job: DetectionJob):
+        """原子写入任务状态"""
+        path = os.path.join(self._job_dir(job.job_id), 'job.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _load(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            path = os.path.join(entry.path, 'job.json')
+            if not entry.is_dir() or not os.path.exists(path):
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    job = DetectionJob.from_dict(json.load(f))
+                self.jobs[job.job_id] = job
+            except (OSError, ValueError, KeyError) as e:
+                print(f"载入检测任务失败 ({entry.name}): {str(e)}")
+
+    def _ensure_workers(self):
+        self.workers = [w for w in self.workers if w.is_alive()]
+        while len(self.workers) < self.num_workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def check_path(self, path: str) -> str:
+        """校验服务器本地路径在允许的目录内，返回规范化路径"""
+        if not self.allowed_roots:
+            raise PermissionError('未配置 JOB_ALLOWED_ROOTS，不允许读取服务器本地路径')
+        real = os.path.realpath(path)
+        if not any(os.path.commonpath([real, root]) == root for root in self.allowed_roots):
+            raise PermissionError(f'路径不在允许的目录内: {path}')
+        if not os.path.exists(real):
+            raise FileNotFoundError(f'路径不存在: {path}')
+        return real
+
+    def submit(self, kind: str, options: dict = None, inputs=None, upload=None) -> DetectionJob:
+        """提交任务
+
+        Args:
+            kind: images（内联图像）/ paths（服务器本地文件或目录）/ video（本地或上传的视频）
+            options: 任务参数（paths: paths；video: path、stride；均可带 variant 指定模型变体）
+            inputs: 内联图像列表 [(名称, 图像字节)]
+            upload: 上传的视频文件对象（有 save 方法）
+
+        Raises:
+            ValueError: 参数错误
+            PermissionError: 本地路径不被允许
+            queue.Full: 任务队列已满
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f'未知的任务类型: {kind}')
+        options = dict(options or {})
+        if options.get('variant'):
+            detection.resolve_variant(options['variant'])
+        if kind == 'images' and not inputs:
+            raise ValueError('没有提供图像')
+        if kind == 'paths':
+            paths = options.get('paths') or []
+            if not paths:
+                raise ValueError('没有提供路径')
+            options['paths'] = [self.check_path(p) for p in paths]
+        if kind == 'video' and upload is None:
+            options['path'] = self.check_path(options.get('path') or '')
+
+        job = DetectionJob(kind, options)
+        job.inputs = inputs
+        os.makedirs(self._job_dir(job.job_id))
+        if upload is not None:
+            video_path = os.path.join(self._job_dir(job.job_id), 'input' + os.path.splitext(upload.filename or '')[1])
+            upload.save(video_path)
+            job.options['path'] = video_path
+        if kind == 'images':
+            job.total = len(inputs)
+
+        self._save(job)
+        with self.lock:
+            self.jobs[job.job_id] = job
+        self._ensure_workers()
+        try:
+            self.job_queue.put_nowait(job)
+        except queue.Full:
+            self._remove(job.job_id)
+            raise
+        self.cleanup()
+        return job
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> list:
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [job.to_dict() for job in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队或运行中的任务；已结束的任务删除其结果"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job.finished:
+            self._remove(job_id)
+        else:
+            job.update(cancel_requested=True)
+        return True
+
+    def _remove(self, job_id: str):
+        with self.lock:
+            self.jobs.pop(job_id, None)
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    def _items(self, job: DetectionJob):
+        """按任务类型产出 (名称, 图像字节或数组)"""
+        if job.kind == 'images':
+            yield from job.inputs
+        elif job.kind == 'paths':
+            for path in job.options['paths']:
+                if os.path.isdir(path):
+                    for root, _, files in os.walk(path):
+                        for name in sorted(files):
+                            if name.lower().endswith(IMAGE_EXTENSIONS):
+                                yield from self._read_file(os.path.join(root, name))
+                else:
+                    yield from self._read_file(path)
+        else:
+            yield from self._video_frames(job)
+
+    @staticmethod
+    def _read_file(path: str):
+        with open(path, 'rb') as f:
+            yield path, f.read()
+
+    def _video_frames(self, job: DetectionJob):
+        """按步长抽取视频帧，名称为帧号，附带时间戳（毫秒）"""
+        stride = max(1, int(job.options.get('stride') or self.video_stride))
+        capture = cv2.VideoCapture(job.options['path'])
+        if not capture.isOpened():
+            raise ValueError('无法打开视频')
+        try:
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            if frame_count > 0:
+                job.update(total=(frame_count + stride - 1) // stride)
+            index = 0
+            while True:
+                # grab 只解复用不解码，跳过的帧开销很小
+                if not capture.grab():
+                    break
+                if index % stride == 0:
+                    ok, frame = capture.retrieve()
+                    if ok:
+                        yield f'frame_{index}@{int(capture.get(cv2.CAP_PROP_POS_MSEC))}ms', frame
+                index += 1
+        finally:
+            capture.release()
+
+    def _worker_loop(self):
+        while True:
+            job = self.job_queue.get()
+            try:
+                self._run(job)
+            finally:
+                job.inputs = None
+                self.job_queue.task_done()
+            self.cleanup()
+
+    def _run(self, job: DetectionJob):
+        if job.cancel_requested:
+            job.update(state='cancelled', finished_at=time.time())
+            self._save(job)
+            return
+        job.update(state='running', started_at=time.time())
+        self._save(job)
+        try:
+            with gzip.open(self._results_path(job.job_id), 'wt', encoding='utf-8') as f:
+                for item in detect_batches(self._items(job), self.batch_size, PRIORITY_BULK,
+                                               job.options.get('variant')):
+                    f.write(json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    job.update(processed=job.processed + 1, failed=job.failed + (0 if item['success'] else 1))
+                    if job.processed % self.batch_size == 0:
+                        # 同步刷新，任务运行中也能读取已完成的结果
+                        f.flush()
+                    if job.cancel_requested:
+                        job.update(state='cancelled')
+                        break
+            if job.state == 'running':
+                job.update(state='done', total=job.processed)
+        except Exception as e:
+            print(f"检测任务失败 ({job.job_id}): {str(e)}")
+            job.update(state='failed', error=str(e))
+        job.update(finished_at=time.time())
+        self._save(job)
+
+    def iter_results(self, job_id: str, offset: int = 0, limit: int = None):
+        """逐行读取任务结果（运行中的任务返回已刷新到磁盘的部分）"""
+        path = self._results_path(job_id)
+        if not os.path.exists(path):
+            return
+        count = 0
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for index, line in enumerate(f):
+                    if index < offset:
+                        continue
+                    if limit is not None and count >= limit:
+                        break
+                    if not line.endswith('\n'):
+                        break
+                    count += 1
+                    yield line
+            except EOFError:
+                # 运行中的任务文件尚未写完 gzip 尾部
+                pass
+
+    def cleanup(self):
+        """删除超过保留时长的已结束任务"""
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            expired = [job.job_id for job in self.jobs.values()
+                       if job.finished and (job.finished_at or job.created_at) < cutoff]
+        for job_id in expired:
+            self._remove(job_id)
+
+    def stats(self) -> dict:
+        with self.lock:
+            states = {}
+            for job in self.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+        return {
+            'workers': self.num_workers,
+            'queued': self.job_queue.qsize(),
+            'queue_size': self.job_queue.maxsize,
+            'jobs': states,
+            'ttl_hours': self.ttl_seconds / 3600
+        }
+
+
+def decode_inline_images(images: list) -> list:
+    """解析内联图像列表，元素为 base64 字符串（可带 data URL 前缀）或 {"name", "data"}"""
+    inputs = []
+    for index, image in enumerate(images):
+        name, data = (image.get('name', str(index)), image.get('data')) if isinstance(image, dict) else (str(index), image)
+        if not isinstance(data, str):
+            raise ValueError(f'第 {index} 张图像缺少 data')
+        if ',' in data:
+            data = data.split(',', 1)[1]
+        inputs.append((name, base64.b64decode(data)))
+    return inputs
+
+
+# 全局任务管理器实例
+job_manager = JobManager()
@@ -0,0 +1,217 @@
+"""
+预编译模型缓存
+冷启动时 YOLO(权重) 需要构建网络、融合 Conv+BN，首次推理还要走一遍追踪/图优化，
+进程管理器每次重启 worker 都要付出这几秒。这里把准备好的模型（已融合的 TorchScript、
+onnxruntime 优化后的图）连同预热时的输入尺寸保存到磁盘，缓存键由权重内容哈希、
+相关库版本、格式和输入尺寸组成，任一变化都会自然失效，之后的启动直接加载缓存。
+
+ultralytics 后端在缓存未命中时照常加载，并在后台线程中导出缓存，不延长本次启动；
+多个 worker 同时启动时通过锁文件保证只有一个进程导出。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from importlib import metadata
+
+# 影响导出结果的库，版本变化时缓存失效
+CACHE_LIBRARIES = {
+    'torchscript': ('ultralytics', 'torch'),
+    'ort': ('onnxruntime',)
+}
+LOCK_STALE_SECONDS = 600
+
+
+def _library_versions(fmt: str) -> dict:
+    versions = {}
+    for name in CACHE_LIBRARIES.get(fmt, ()):
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+class ModelCache:
+    """磁盘上的预编译模型缓存"""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.lock = threading.Lock()
+        self.hashes = {}        # (路径, 大小, 修改时间) -> 内容哈希，避免重载时重复读取权重
+        self.building = set()   # 本进程中正在导出的缓存键
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.errors = 0
+
+    def configure(self, config):
+        """从应用配置加载参数"""
+        self.enabled = config.get('MODEL_CACHE_ENABLED', False)
+        self.directory = config.get('MODEL_CACHE_DIR')
+
+    def _hash_file(self, path: str) -> str:
+        stat = os.stat(path)
+        memo_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self.hashes.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            self.hashes[memo_key] = digest
+        return digest
+
+    def key(self, model_path: str, fmt: str, imgsz: int) -> dict:
+        """计算缓存键及其组成部分"""
+        parts = {
+            'weights_sha256': self._hash_file(model_path),
+            'format': fmt,
+            'imgsz': imgsz,
+            'libraries': _library_versions(fmt)
+        }
+        parts['key'] = hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+        return parts
+
+    def _paths(self, model_path: str, parts: dict, suffix: str):
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+        base = os.path.join(self.directory, f"{stem}-{parts['format']}-{parts['key']}")
+        return base + suffix, base + '.json'
+
+    def lookup(self, model_path: str, fmt: str, imgsz: int, suffix: str):
+        """查找缓存
+
+        Returns:
+            (缓存键信息, 缓存文件路径, 元数据)，未启用或权重不存在时缓存键信息为 None，未命中时路径为 None
+        """
+        if not self.enabled or not self.directory or not os.path.isfile(model_path):
+            return None, None, None
+        parts = self.key(model_path, fmt, imgsz)
+        path, meta_path = self._paths(model_path, parts, suffix)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('key') == parts['key'] and os.path.isfile(path):
+                self.hits += 1
+                return parts, path, meta
+        except (OSError, ValueError):
+            pass
+        self.misses += 1
+        return parts, None, None
+
+    def commit(self, model_path: str, parts: dict, suffix: str, built_path: str, extra: dict = None) -> str:
+        """把生成的模型文件移入缓存并写入元数据（元数据最后写入，作为缓存有效的标志）"""
+        path, meta_path = self._paths(model_path, parts, suffix)
+        shutil.move(built_path, path)
+        meta = dict(parts, source=os.path.abspath(model_path), created_at=time.time(), **(extra or {}))
+        tmp_meta = meta_path + '.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_meta, meta_path)
+        self.builds += 1
+        self._prune(model_path, parts, meta_path)
+        return path
+
+    def _prune(self, model_path: str, parts: dict, keep_meta: str):
+        """删除同名权重已失效的缓存：权重内容已变化，或同一输入尺寸的旧键（库版本变化）；
+        同一权重其他输入尺寸的缓存保留"""
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+        prefix = f"{stem}-{parts['format']}-"
+        stale = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith(prefix) or not entry.name.endswith('.json') or entry.path == keep_meta:
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = {}
+            if meta.get('weights_sha256') == parts['weights_sha256'] and meta.get('imgsz') != parts['imgsz']:
+                continue
+            stale.append(entry.name[:-len('.json')] + '.')
+        for entry in os.scandir(self.directory):
+            if any(entry.name.startswith(base) for base in stale) and not entry.name.endswith('.lock'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def build_async(self, model_path: str, parts: dict, suffix: str, builder, extra: dict = None) -> bool:
+        """在后台线程中生成缓存
+
+        Args:
+            builder: 生成函数，参数为 (工作目录, 权重副本路径)，返回生成的模型文件路径
+
+        Returns:
+            False 表示已有进程在生成同一缓存
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        lock_path = os.path.join(self.directory, f"{parts['key']}.lock")
+        with self.lock:
+            if parts['key'] in self.building or not self._acquire_lock(lock_path):
+                return False
+            self.building.add(parts['key'])
+
+        def run():
+            work_dir = os.path.join(self.directory, f"build-{parts['key']}-{os.getpid()}")
+            try:
+                # 在权重副本上导出，导出文件不会写到权重所在目录
+                os.makedirs(work_dir, exist_ok=True)
+                weights_copy = os.path.join(work_dir, os.path.basename(model_path))
+                shutil.copy2(model_path, weights_copy)
+                built_path = builder(work_dir, weights_copy)
+                path = self.commit(model_path, parts, suffix, built_path, extra)
+                print(f"模型缓存已生成: {path}")
+            except Exception as e:
+                self.errors += 1
+                print(f"模型缓存生成失败: {str(e)}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+                with self.lock:
+                    self.building.discard(parts['key'])
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def _acquire_lock(self, lock_path: str) -> bool:
+        """跨进程的导出锁，持有者异常退出留下的过期锁会被清除"""
+        try:
+            if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_SECONDS:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def stats(self) -> dict:
+        entries = []
+        if self.directory and os.path.isdir(self.directory):
+            entries = sorted(entry.name[:-5] for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'entries': entries,
+            'building': len(self.building),
+            'hits': self.hits,
+            'misses': self.misses,
+            'builds': self.builds,
+            'errors': self.errors
+        }
+
+
+# 全局模型缓存实例
+model_cache = ModelCache()
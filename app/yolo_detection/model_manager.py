@@ -0,0 +1,147 @@
+"""
+模型管理器
+按名称管理已加载的模型，支持后台加载预热新权重后原子替换：
+进行中的推理继续使用旧模型，旧模型在最后一次推理结束后释放
+"""
+
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class ModelSlot:
+    """一个已加载的模型版本及其进行中的推理计数"""
+
+    def __init__(self, name: str, path: str, model, version: int):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.version = version
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self.retired = False
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'path': self.path,
+            'backend': getattr(self.model, 'name', None),
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'in_flight': self.in_flight,
+            'retired': self.retired
+        }
+
+
+class ModelManager:
+    """模型管理器"""
+
+    def __init__(self, loader: Callable[[str], object]):
+        """
+        Args:
+            loader: 模型加载函数，参数为权重路径，返回已预热的模型
+        """
+        self.loader = loader
+        self.slots: Dict[str, ModelSlot] = {}
+        self.retired = []           # 已被替换但仍有推理进行中的旧版本
+        self.lock = threading.Lock()
+        self.version = 0
+        self.reload_thread = None
+        self.reload_status = {'state': 'idle'}
+
+    def has(self, name: str) -> bool:
+        return name in self.slots
+
+    def get_path(self, name: str) -> Optional[str]:
+        slot = self.slots.get(name)
+        return slot.path if slot else None
+
+    def current(self, name: str):
+        """当前模型对象（仅用于读取元数据，推理请使用 acquire）"""
+        slot = self.slots.get(name)
+        return slot.model if slot else None
+
+    def load(self, name: str, path: str):
+        """同步加载模型并安装到指定名称"""
+        model = self.loader(path)
+        self._install(name, path, model)
+        return model
+
+    def _install(self, name: str, path: str, model):
+        """原子替换模型，旧版本空闲时立即释放，否则等待进行中的推理结束"""
+        with self.lock:
+            self.version += 1
+            old = self.slots.get(name)
+            self.slots[name] = ModelSlot(name, path, model, self.version)
+            if old is not None:
+                old.retired = True
+                if old.in_flight == 0:
+                    self._release(old)
+                else:
+                    self.retired.append(old)
+
+    @contextmanager
+    def acquire(self, name: str):
+        """获取模型用于一次推理，期间即使发生替换也保证模型不会被释放"""
+        with self.lock:
+            slot = self.slots.get(name)
+            if slot is None:
+                raise RuntimeError(f'模型未加载: {name}')
+            slot.in_flight += 1
+        try:
+            yield slot.model
+        finally:
+            with self.lock:
+                slot.in_flight -= 1
+                if slot.retired and slot.in_flight == 0 and slot in self.retired:
+                    self.retired.remove(slot)
+                    self._release(slot)
+
+    def _release(self, slot: ModelSlot):
+        """释放旧模型占用的内存（调用方持有锁）"""
+        slot.model = None
+        gc.collect()
+        print(f"已释放旧模型: {slot.name} v{slot.version} ({slot.path})")
+
+    def reload_async(self, path: str, names, on_success: Callable[[str], None] = None) -> bool:
+        """后台加载并预热新权重，完成后替换指定名称的模型
+
+        Args:
+            path: 新权重路径
+            names: 需要替换的模型名称列表
+            on_success: 全部替换完成后调用（参数为新权重路径），加载失败时不调用
+
+        Returns:
+            False 表示已有重载任务在进行
+        """
+        if self.reload_thread and self.reload_thread.is_alive():
+            return False
+        self.reload_status = {'state': 'loading', 'path': path, 'targets': list(names),
+                              'started_at': time.time()}
+        self.reload_thread = threading.Thread(target=self._reload, args=(path, list(names), on_success),
+                                              daemon=True)
+        self.reload_thread.start()
+        return True
+
+    def _reload(self, path: str, names, on_success=None):
+        try:
+            # 每个名称独立加载一个实例（模型对象不在线程间共享）
+            loaded = {name: self.loader(path) for name in names}
+            for name, model in loaded.items():
+                self._install(name, path, model)
+            if on_success is not None:
+                on_success(path)
+            self.reload_status.update({'state': 'ready', 'finished_at': time.time()})
+        except Exception as e:
+            print(f"模型重载失败: {str(e)}")
+            self.reload_status.update({'state': 'failed', 'error': str(e), 'finished_at': time.time()})
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'models': [slot.to_dict() for slot in self.slots.values()],
+                'retired': [slot.to_dict() for slot in self.retired],
+                'reload': dict(self.reload_status)
+            }
@@ -0,0 +1,193 @@
+"""
+多显示器监控流水线
+每个显示器一条独立的 捕获 + 检测 流水线，拥有各自的帧缓冲区、检测帧率和模型配置，
+检测结果带显示器标签汇总到同一个输出流
+"""
+
+import threading
+import numpy as np
+import cv2
+from PIL import ImageGrab
+from .frame_bus import SharedFrameBus
+from .preprocess import LetterboxPreprocessor
+
+try:
+    import mss
+except ImportError:  # mss 为可选依赖，缺失时退化为整个桌面一条流水线
+    mss = None
+
+
+def list_monitors() -> list:
+    """枚举显示器
+
+    Returns:
+        显示器列表，每项包含 index/left/top/width/height；
+        未安装 mss 时返回代表整个虚拟桌面的单个条目（index 为 0）
+    """
+    if mss is None:
+        width, height = ImageGrab.grab().size
+        return [{'index': 0, 'left': 0, 'top': 0, 'width': width, 'height': height}]
+
+    with mss.mss() as sct:
+        # monitors[0] 为所有显示器的并集，其余为各个物理显示器
+        return [
+            {'index': i, 'left': m['left'], 'top': m['top'], 'width': m['width'], 'height': m['height']}
+            for i, m in enumerate(sct.monitors) if i > 0
+        ]
+
+
+class ScreenGrabber:
+    """单个显示器的截屏器（需在捕获线程内创建，mss 句柄不能跨线程使用）"""
+
+    def __init__(self, monitor: dict):
+        self.monitor = monitor
+        self.sct = mss.mss() if mss is not None and monitor['index'] > 0 else None
+        self.region = {k: monitor[k] for k in ('left', 'top', 'width', 'height')}
+
+    def grab(self, dst: np.ndarray = None) -> np.ndarray:
+        """截取显示器画面，转换为 BGR 并写入 dst（尺寸匹配时复用）"""
+        if self.sct is not None:
+            shot = np.asarray(self.sct.grab(self.region))
+            return cv2.cvtColor(shot, cv2.COLOR_BGRA2BGR, dst=dst)
+
+        screen = np.array(ImageGrab.grab())
+        return cv2.cvtColor(screen, cv2.COLOR_RGB2BGR, dst=dst)
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+
+
+class TabGrabber:
+    """秒杀浏览器标签页的截屏器（通过 CDP captureScreenshot）"""
+
+    def __init__(self, task_id: str, max_width: int = None, quality: int = 70):
+        from app.seckill.core.browser_manager import browser_manager
+        self.browser_manager = browser_manager
+        self.task_id = task_id
+        self.max_width = max_width
+        self.quality = quality
+        self.failures = 0
+
+    def grab(self, dst: np.ndarray = None):
+        """截取标签页画面并解码为 BGR 写入 dst（尺寸匹配时复用），浏览器忙或不存在时返回 None"""
+        success, message, data = self.browser_manager.capture_screenshot(
+            self.task_id, self.max_width, self.quality)
+        if not success:
+            self.failures += 1
+            return None
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None or dst is None or dst.shape != frame.shape:
+            return frame
+        # cv2.imdecode 不支持输出参数，解码后复制进预留槽位，使帧总线走直接发布路径
+        np.copyto(dst, frame)
+        return dst
+
+    def close(self):
+        pass
+
+
+class MonitorPipeline:
+    """单个显示器的 捕获 + 检测 流水线状态"""
+
+    def __init__(self, monitor: dict, detect_fps: float, model_path: str, buffer_mb: float,
+                 fixed_fps: bool = False):
+        self.monitor = monitor
+        self.name = monitor['index']
+        self.detect_fps = detect_fps
+        self.detect_interval = 1.0 / detect_fps
+        self.fixed_fps = fixed_fps  # 显式配置了帧率的流水线不受自适应控制
+        self.capture_interval = 0.1
+        self.model_path = model_path
+        self.model_key = f"monitor:{self.name}"  # 模型管理器中的名称
+        self.tags = {'monitor': self.name}   # 附加到每条检测结果和检测事件上的标签
+        self.active = False
+        self.frame_bus = SharedFrameBus(buffer_mb)  # 捕获写入一次，各消费者租用同一槽位读取
+        self.capture_thread = None
+        self.processing_thread = None
+        self.recorder_thread = None
+        self.preprocessor = None    # 预分配缓冲区的 letterbox 预处理器（默认输入尺寸）
+        self.preprocessors = {}     # 自适应分辨率下其他输入尺寸的预处理器
+        self.roi_tracker = None     # 跟踪引导的局部推理（关键帧之间只推理目标周围区域）
+        self.last_detect_time = 0
+        self.processing_complete = threading.Event()
+
+        # 统计信息
+        self.frames_detected = 0
+        self.last_inference_ms = 0.0
+        self.inference_ms_ewma = 0.0
+        self.last_imgsz = None
+        self.last_detections = []   # 最近一次检测结果，视频流据此在帧副本上绘制边界框
+
+    def create_grabber(self):
+        """创建截屏器（在捕获线程内调用）"""
+        return ScreenGrabber(self.monitor)
+
+    def record_inference(self, elapsed_ms: float, alpha: float = 0.2):
+        """记录一次推理耗时（指数滑动平均）"""
+        self.last_inference_ms = elapsed_ms
+        if self.inference_ms_ewma == 0:
+            self.inference_ms_ewma = elapsed_ms
+        else:
+            self.inference_ms_ewma += alpha * (elapsed_ms - self.inference_ms_ewma)
+
+    def get_preprocessor(self, imgsz: int = None):
+        """按输入尺寸获取预处理器，每个尺寸的缓冲区只分配一次；未启用预处理时返回 None"""
+        if self.preprocessor is None or not imgsz or imgsz == self.preprocessor.imgsz:
+            return self.preprocessor
+        if imgsz not in self.preprocessors:
+            self.preprocessors[imgsz] = LetterboxPreprocessor(imgsz, self.preprocessor.pad_value)
+        return self.preprocessors[imgsz]
+
+    def set_rates(self, detect_fps: float, stream_fps: float):
+        """更新检测帧率和捕获间隔（捕获频率跟随推流与检测中较高者）"""
+        if not self.fixed_fps:
+            self.detect_fps = detect_fps
+            self.detect_interval = 1.0 / detect_fps
+        self.capture_interval = 1.0 / max(stream_fps, self.detect_fps)
+
+    def release(self):
+        """释放帧总线和预处理缓冲区"""
+        self.frame_bus.release()
+        self.preprocessor = None
+        self.preprocessors = {}
+
+    def stats(self) -> dict:
+        return {
+            'monitor': self.monitor,
+            'active': self.active,
+            'detect_fps': self.detect_fps,
+            'model_path': self.model_path,
+            'frames_detected': self.frames_detected,
+            'last_inference_ms': round(self.last_inference_ms, 2),
+            'inference_ms_ewma': round(self.inference_ms_ewma, 2),
+            'last_imgsz': self.last_imgsz,
+            'capture_interval': round(self.capture_interval, 4),
+            'buffer': self.frame_bus.stats(),
+            'roi': self.roi_tracker.stats() if self.roi_tracker is not None else None
+        }
+
+
+class TabPipeline(MonitorPipeline):
+    """秒杀任务标签页的 捕获 + 检测 流水线，以固定帧率和分辨率通过 CDP 截图"""
+
+    def __init__(self, task_id: str, fps: float, model_path: str, buffer_mb: float,
+                 max_width: int = 1280, quality: int = 70):
+        super().__init__({'index': f'tab:{task_id}', 'task_id': task_id}, fps, model_path,
+                         buffer_mb, fixed_fps=True)
+        self.task_id = task_id
+        self.max_width = max_width
+        self.quality = quality
+        self.capture_interval = 1.0 / fps
+        self.tags = {'task_id': task_id, 'source': 'tab'}
+
+    def create_grabber(self):
+        return TabGrabber(self.task_id, self.max_width, self.quality)
+
+    def set_rates(self, detect_fps: float, stream_fps: float):
+        """标签页截图按配置的固定帧率，不受自适应控制"""
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({'task_id': self.task_id, 'max_width': self.max_width, 'quality': self.quality})
+        return stats
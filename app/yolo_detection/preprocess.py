@@ -0,0 +1,70 @@
+"""
+实时监控帧预处理
+监控帧尺寸固定，因此 letterbox 缩放/填充缓冲区和模型输入张量只在尺寸变化时分配一次，
+之后每帧在预分配的内存中原地完成 缩放 -> 填充 -> BGR转RGB -> HWC转CHW -> 归一化，
+直接交给推理后端，绕过 Ultralytics 内部每帧新建数组的预处理
+"""
+
+import cv2
+import numpy as np
+
+
+class LetterboxPreprocessor:
+    """预分配缓冲区的 letterbox 预处理器（每条流水线一个实例，非线程安全）"""
+
+    def __init__(self, imgsz: int = 640, pad_value: int = 114):
+        self.imgsz = imgsz
+        self.pad_value = pad_value
+        self.frame_shape = None
+        self.ratio = 1.0
+        self.pad = (0, 0)             # (left, top)
+        self.resized_size = (0, 0)    # (width, height)
+        self.resized = None           # 缩放结果缓冲区
+        self.canvas = None            # 填充后的 imgsz x imgsz 画布
+        self.input_array = None       # 1x3xHxW float32 输入缓冲区
+        self.allocations = 0
+
+    def _allocate(self, frame_shape):
+        """按帧尺寸计算缩放参数并分配缓冲区"""
+        height, width = frame_shape[:2]
+        ratio = min(self.imgsz / height, self.imgsz / width)
+        new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+        left = (self.imgsz - new_w) // 2
+        top = (self.imgsz - new_h) // 2
+
+        self.frame_shape = frame_shape
+        self.ratio = ratio
+        self.pad = (left, top)
+        self.resized_size = (new_w, new_h)
+        self.resized = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        self.canvas = np.full((self.imgsz, self.imgsz, 3), self.pad_value, dtype=np.uint8)
+        self.input_array = np.empty((1, 3, self.imgsz, self.imgsz), dtype=np.float32)
+        self.allocations += 1
+
+    def prepare(self, frame: np.ndarray):
+        """原地预处理一帧，返回模型输入数组（内容在下一次调用时被覆盖）"""
+        if frame.shape != self.frame_shape:
+            self._allocate(frame.shape)
+
+        new_w, new_h = self.resized_size
+        left, top = self.pad
+        cv2.resize(frame, (new_w, new_h), dst=self.resized, interpolation=cv2.INTER_LINEAR)
+        # 填充区域保持 pad_value，只覆盖图像区域
+        self.canvas[top:top + new_h, left:left + new_w] = self.resized
+
+        # BGR -> RGB、HWC -> CHW、归一化到 0-1，全部写入预分配的输入缓冲区
+        scale = np.float32(1.0 / 255.0)
+        for channel in range(3):
+            np.multiply(self.canvas[:, :, 2 - channel], scale, out=self.input_array[0, channel])
+        return self.input_array
+
+    def scale_boxes(self, xyxy: np.ndarray) -> np.ndarray:
+        """将模型输入坐标系下的框映射回原始帧坐标"""
+        if len(xyxy) == 0:
+            return xyxy
+        left, top = self.pad
+        boxes = (xyxy - np.array([left, top, left, top], dtype=xyxy.dtype)) / self.ratio
+        height, width = self.frame_shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+        return boxes
@@ -0,0 +1,281 @@
+"""
+INT8 量化工具
+把配置的 YOLO 权重导出为 ONNX，用本地文件夹中的少量图像做校准，生成 INT8 量化模型，
+并在同一批评估图像上对比 FP32 与 INT8 的 CPU 延迟和检测结果一致性。
+
+量化后的模型通过 MODEL_VARIANTS 配置与默认模型并行服务（onnx 后端），
+接口请求带 variant 参数即可选择，便于线上对比。
+
+用法：
+    python -m app.yolo_detection.quantize --calib data/calib --output models/yolo-int8.onnx
+    python -m app.yolo_detection.quantize --compare models/yolo.onnx models/yolo-int8.onnx --eval data/eval
+
+依赖 onnx、onnxruntime（导出还需要 ultralytics）
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import cv2
+import numpy as np
+from .backends import OnnxBackend
+from .batch import IMAGE_EXTENSIONS
+from .preprocess import LetterboxPreprocessor
+
+
+def list_images(folder: str, limit: int = None, seed: int = 0) -> list:
+    """列出文件夹（含子目录）中的图像，超过 limit 时按固定种子随机抽样"""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    paths.sort()
+    if limit and len(paths) > limit:
+        paths = sorted(random.Random(seed).sample(paths, limit))
+    return paths
+
+
+def export_onnx(model_path: str, imgsz: int) -> str:
+    """用 Ultralytics 导出 FP32 ONNX（已是 .onnx 时直接返回）"""
+    if model_path.endswith('.onnx'):
+        return model_path
+    from ultralytics import YOLO
+    return YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=False, simplify=True)
+
+
+class LetterboxCalibrationReader:
+    """校准数据读取器：与线上推理相同的 letterbox 预处理，逐张提供输入"""
+
+    def __init__(self, paths: list, input_name: str, imgsz: int):
+        self.paths = iter(paths)
+        self.input_name = input_name
+        self.preprocessor = LetterboxPreprocessor(imgsz)
+
+    def get_next(self):
+        for path in self.paths:
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+            if img is not None:
+                # 预处理缓冲区会被复用，校准器可能缓存输入，这里复制一份
+                return {self.input_name: self.preprocessor.prepare(img).copy()}
+        return None
+
+
+def head_nodes(model) -> list:
+    """检测头（最后一个 model.N 模块）中的节点名称
+
+    检测头的框回归和 DFL 对量化误差最敏感，保持 FP32 可以用很小的延迟代价换回大部分精度
+    """
+    prefixes = {}
+    for node in model.graph.node:
+        parts = node.name.strip('/').split('/')
+        if len(parts) > 1 and parts[0] == 'model' and parts[1].startswith('model.'):
+            index = parts[1].split('.', 1)[1]
+            if index.isdigit():
+                prefixes.setdefault(int(index), []).append(node.name)
+    return prefixes[max(prefixes)] if prefixes else []
+
+
+def quantize(fp32_path: str, output_path: str, calib_paths: list, mode: str = 'static',
+             exclude_head: bool = True, per_channel: bool = True):
+    """生成 INT8 模型
+
+    static：权重和激活都量化为 INT8（QDQ 格式），需要校准图像，CPU 上加速明显；
+    dynamic：只量化权重，激活在运行时动态量化，不需要校准图像
+    """
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    model = onnx.load(fp32_path)
+    excluded = head_nodes(model) if exclude_head else []
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    if mode == 'dynamic':
+        quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QInt8,
+                         per_channel=per_channel, nodes_to_exclude=excluded)
+    else:
+        if not calib_paths:
+            raise ValueError('静态量化需要校准图像')
+        # 量化前先做形状推断和图优化，校准结果更稳定
+        prepared_path = os.path.join(output_dir, os.path.basename(output_path) + '.prep.onnx')
+        try:
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            quant_pre_process(fp32_path, prepared_path)
+        except Exception as e:
+            print(f"量化预处理跳过: {str(e)}")
+            prepared_path = fp32_path
+
+        session = ort.InferenceSession(prepared_path, providers=['CPUExecutionProvider'])
+        model_input = session.get_inputs()[0]
+        reader = LetterboxCalibrationReader(calib_paths, model_input.name, model_input.shape[2])
+        try:
+            quantize_static(prepared_path, output_path, reader,
+                            quant_format=QuantFormat.QDQ,
+                            activation_type=QuantType.QUInt8,
+                            weight_type=QuantType.QInt8,
+                            per_channel=per_channel,
+                            calibrate_method=CalibrationMethod.MinMax,
+                            nodes_to_exclude=excluded)
+        finally:
+            if prepared_path != fp32_path and os.path.exists(prepared_path):
+                os.remove(prepared_path)
+
+    # 保留类别名称等元数据，onnx 后端加载时读取
+    quantized = onnx.load(output_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(model.metadata_props)
+    onnx.save(quantized, output_path)
+    return {'excluded_nodes': len(excluded), 'calibration_images': len(calib_paths), 'mode': mode}
+
+
+def _iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def _match(reference, candidate, iou_threshold: float) -> int:
+    """按置信度贪心匹配同类别且 IoU 达到阈值的框，返回匹配数"""
+    ref_xyxy, _, ref_cls = reference
+    xyxy, conf, cls = candidate
+    used = np.zeros(len(ref_xyxy), dtype=bool)
+    matched = 0
+    for i in np.argsort(-conf):
+        candidates = (~used) & (ref_cls == cls[i])
+        if not candidates.any():
+            continue
+        ious = np.where(candidates, _iou(xyxy[i], ref_xyxy), 0.0)
+        best = int(ious.argmax())
+        if ious[best] >= iou_threshold:
+            used[best] = True
+            matched += 1
+    return matched
+
+
+def _latency(samples: list) -> dict:
+    values = np.array(samples) * 1000
+    return {
+        'mean_ms': round(float(values.mean()), 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2)
+    }
+
+
+def compare(fp32_path: str, int8_path: str, eval_paths: list, threads: int = None,
+            warmup: int = 3, iou_threshold: float = 0.5) -> dict:
+    """在同一批图像上对比 FP32 和 INT8 模型
+
+    没有标注时以 FP32 的检测结果为参照：precision/recall 表示 INT8 结果与 FP32 的一致程度，
+    延迟只统计模型前向和后处理（预处理相同，不计入）
+    """
+    models = {}
+    for label, path in (('fp32', fp32_path), ('int8', int8_path)):
+        backend = OnnxBackend(path, threads=threads)
+        backend.load()
+        models[label] = backend
+
+    latencies = {label: [] for label in models}
+    matched = ref_total = int8_total = 0
+    for index, path in enumerate(eval_paths):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        results = {}
+        for label, backend in models.items():
+            inputs = backend.preprocessor.prepare(img)
+            started = time.perf_counter()
+            results[label] = backend.predict_prepared(inputs)
+            if index >= warmup or len(eval_paths) <= warmup:
+                latencies[label].append(time.perf_counter() - started)
+        matched += _match(results['fp32'], results['int8'], iou_threshold)
+        ref_total += len(results['fp32'][0])
+        int8_total += len(results['int8'][0])
+
+    report = {
+        'images': len(eval_paths),
+        'threads': threads,
+        'models': {label: {'path': models[label].model_path,
+                           'size_mb': round(os.path.getsize(models[label].model_path) / 1024 / 1024, 2),
+                           **_latency(latencies[label])}
+                   for label in models if latencies[label]},
+        'agreement': {
+            'iou_threshold': iou_threshold,
+            'fp32_boxes': ref_total,
+            'int8_boxes': int8_total,
+            'precision': round(matched / int8_total, 4) if int8_total else 1.0,
+            'recall': round(matched / ref_total, 4) if ref_total else 1.0
+        }
+    }
+    if len(report['models']) == 2:
+        report['speedup'] = round(report['models']['fp32']['mean_ms'] / report['models']['int8']['mean_ms'], 2)
+    return report
+
+
+def print_report(report: dict):
+    print(f"评估图像: {report['images']}")
+    print(f"{'模型':<6}{'大小MB':>10}{'平均ms':>10}{'P50ms':>10}{'P95ms':>10}")
+    for label, stats in report['models'].items():
+        print(f"{label:<6}{stats['size_mb']:>10}{stats['mean_ms']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
+    if 'speedup' in report:
+        print(f"INT8 加速比: {report['speedup']}x")
+    agreement = report['agreement']
+    print(f"与 FP32 一致性 (IoU>={agreement['iou_threshold']}): "
+          f"precision={agreement['precision']} recall={agreement['recall']} "
+          f"(FP32 {agreement['fp32_boxes']} 框 / INT8 {agreement['int8_boxes']} 框)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成 INT8 量化模型并对比 FP32/INT8 的延迟和精度')
+    parser.add_argument('--model', help='FP32 权重（.pt 或 .onnx），默认使用配置的 YOLO_MODEL_PATH')
+    parser.add_argument('--calib', help='校准图像文件夹')
+    parser.add_argument('--calib-size', type=int, default=100, help='校准图像数量上限')
+    parser.add_argument('--output', help='INT8 模型输出路径，默认在 FP32 模型旁生成 *-int8.onnx')
+    parser.add_argument('--imgsz', type=int, default=640, help='导出 ONNX 的输入尺寸')
+    parser.add_argument('--mode', choices=('static', 'dynamic'), default='static', help='量化方式')
+    parser.add_argument('--quantize-head', action='store_true', help='检测头也量化（默认保持 FP32）')
+    parser.add_argument('--per-tensor', action='store_true', help='按张量而不是按通道量化权重')
+    parser.add_argument('--eval', help='评估图像文件夹，默认使用校准文件夹')
+    parser.add_argument('--eval-size', type=int, default=50, help='评估图像数量上限')
+    parser.add_argument('--threads', type=int, help='评估时 onnxruntime 的线程数')
+    parser.add_argument('--report', help='对比报告 JSON 输出路径，默认在 INT8 模型旁生成 *.report.json')
+    parser.add_argument('--compare', nargs=2, metavar=('FP32_ONNX', 'INT8_ONNX'), help='只对比已有的两个模型')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        fp32_path, int8_path = args.compare
+    else:
+        model_path = args.model
+        if model_path is None:
+            from config import Config
+            model_path = Config.YOLO_MODEL_PATH
+        fp32_path = export_onnx(model_path, args.imgsz)
+        int8_path = args.output or os.path.splitext(fp32_path)[0] + '-int8.onnx'
+        calib_paths = list_images(args.calib, args.calib_size) if args.calib else []
+        print(f"量化 {fp32_path} -> {int8_path}（{args.mode}，校准图像 {len(calib_paths)} 张）")
+        info = quantize(fp32_path, int8_path, calib_paths, args.mode,
+                        exclude_head=not args.quantize_head, per_channel=not args.per_tensor)
+        print(f"量化完成，保持 FP32 的检测头节点 {info['excluded_nodes']} 个")
+
+    eval_folder = args.eval or args.calib
+    if not eval_folder:
+        print("未指定评估图像文件夹，跳过对比")
+        return 0
+    report = compare(fp32_path, int8_path, list_images(eval_folder, args.eval_size, seed=1), args.threads)
+    print_report(report)
+    report_path = args.report or os.path.splitext(int8_path)[0] + '.report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"对比报告已保存: {report_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+"""
+自适应检测帧率控制器
+周期性测量推理延迟、推理排队积压和进程CPU占用，在配置的上下限内调整检测帧率和推流帧率：
+负载高时按比例下调，空闲时逐步上调（AIMD）
+"""
+
+import os
+import threading
+import time
+from .inference_scheduler import PRIORITY_MONITOR
+
+
+class RateController:
+    """检测/推流帧率控制器"""
+
+    def __init__(self, detection):
+        self.detection = detection
+        self.enabled = True
+        self.interval = 1.0            # 调整周期（秒）
+        self.detect_min = 2.0
+        self.detect_max = 30.0
+        self.stream_min = 5.0
+        self.stream_max = 30.0
+        self.cpu_high = 85.0           # 进程CPU占用（占全部核心的百分比）上限
+        self.cpu_low = 60.0
+        self.backlog_high = 0.8        # 积压比例上限（推理排队的流水线占比、帧总线占用率）
+        self.latency_headroom = 0.8    # 推理耗时最多占用帧间隔的比例
+        self.decrease_factor = 0.75
+        self.increase_step = 1.0
+
+        self.detect_fps = None
+        self.stream_fps = None
+        self.running = False
+        self.thread = None
+        self.last_wall = None
+        self.last_cpu = None
+
+        # 最近一次测量值
+        self.cpu_percent = 0.0
+        self.latency_ms = 0.0
+        self.frame_backlog = 0.0
+        self.inference_backlog = 0.0   # 正在等待推理工作线程的监控流水线占比
+        self.last_reason = None
+        self.adjustments = 0
+
+    def configure(self, config):
+        """从应用配置加载参数"""
+        self.enabled = config.get('ADAPTIVE_RATE_ENABLED', self.enabled)
+        self.interval = config.get('ADAPTIVE_RATE_INTERVAL', self.interval)
+        self.detect_min = config.get('DETECT_FPS_MIN', self.detect_min)
+        self.detect_max = config.get('DETECT_FPS_MAX', self.detect_max)
+        self.stream_min = config.get('STREAM_FPS_MIN', self.stream_min)
+        self.stream_max = config.get('STREAM_FPS_MAX', self.stream_max)
+        self.cpu_high = config.get('ADAPTIVE_CPU_HIGH', self.cpu_high)
+        self.cpu_low = config.get('ADAPTIVE_CPU_LOW', self.cpu_low)
+        self.detect_fps = self._clamp(config.get('DETECTION_FPS', 15), self.detect_min, self.detect_max)
+        self.stream_fps = self._clamp(config.get('DETECTION_FPS', 15), self.stream_min, self.stream_max)
+
+    @staticmethod
+    def _clamp(value, low, high):
+        return max(low, min(high, float(value)))
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        self.running = True
+        self.last_wall = time.monotonic()
+        self.last_cpu = time.process_time()
+        self.thread = threading.Thread(target=self._control_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.interval * 2)
+            self.thread = None
+
+    def _measure_cpu(self) -> float:
+        """进程CPU占用，按全部核心归一化到 0-100"""
+        now_wall = time.monotonic()
+        now_cpu = time.process_time()
+        elapsed = now_wall - self.last_wall
+        percent = 0.0
+        if elapsed > 0:
+            percent = (now_cpu - self.last_cpu) / elapsed / (os.cpu_count() or 1) * 100
+        self.last_wall = now_wall
+        self.last_cpu = now_cpu
+        return percent
+
+    def _measure(self):
+        pipelines = list(self.detection.pipelines)
+        self.cpu_percent = self._measure_cpu()
+        self.latency_ms = max((p.inference_ms_ewma for p in pipelines), default=0.0)
+        self.frame_backlog = max((p.frame_bus.stats()['occupancy_ratio'] for p in pipelines), default=0.0)
+        # 检测结果队列只由推流连接消费，无人观看时总是满的，不能反映推理负载；
+        # 这里看调度器中排队的 monitor 请求（每条流水线同时最多一个）占运行中流水线的比例
+        sources = sum(1 for p in pipelines + list(self.detection.tab_pipelines.values()) if p.active)
+        queued = self.detection.inference.queued().get(PRIORITY_MONITOR, 0)
+        self.inference_backlog = min(1.0, queued / sources) if sources else 0.0
+
+    def adjust(self):
+        """执行一次测量和调整"""
+        self._measure()
+
+        # 检测帧率：CPU或推理排队积压过高时按比例下调，空闲时逐步上调，且不超过推理能力
+        detect_fps = self.detect_fps
+        if self.cpu_percent > self.cpu_high or self.inference_backlog > self.backlog_high:
+            detect_fps *= self.decrease_factor
+            self.last_reason = 'overload'
+        elif self.cpu_percent < self.cpu_low:
+            detect_fps += self.increase_step
+            self.last_reason = 'headroom'
+        else:
+            self.last_reason = 'steady'
+        if self.latency_ms > 0:
+            detect_fps = min(detect_fps, 1000.0 / self.latency_ms * self.latency_headroom)
+
+        # 推流帧率：CPU过高或推流消费跟不上（帧缓冲积压）时下调
+        stream_fps = self.stream_fps
+        if self.cpu_percent > self.cpu_high or self.frame_backlog > self.backlog_high:
+            stream_fps *= self.decrease_factor
+        elif self.cpu_percent < self.cpu_low:
+            stream_fps += self.increase_step
+
+        detect_fps = self._clamp(detect_fps, self.detect_min, self.detect_max)
+        stream_fps = self._clamp(stream_fps, self.stream_min, self.stream_max)
+        if detect_fps != self.detect_fps or stream_fps != self.stream_fps:
+            self.adjustments += 1
+        self.detect_fps = detect_fps
+        self.stream_fps = stream_fps
+        self.detection.apply_rates(detect_fps, stream_fps)
+
+    def _control_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.adjust()
+            except Exception as e:
+                print(f"帧率控制错误: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'detect_fps': round(self.detect_fps, 2) if self.detect_fps else None,
+            'stream_fps': round(self.stream_fps, 2) if self.stream_fps else None,
+            'bounds': {
+                'detect': [self.detect_min, self.detect_max],
+                'stream': [self.stream_min, self.stream_max]
+            },
+            'cpu_percent': round(self.cpu_percent, 1),
+            'latency_ms': round(self.latency_ms, 2),
+            'frame_backlog': round(self.frame_backlog, 3),
+            'inference_backlog': round(self.inference_backlog, 3),
+            'last_reason': self.last_reason,
+            'adjustments': self.adjustments
+        }
@@ -0,0 +1,284 @@
+"""
+事件片段录制
+录制阶段作为帧总线的独立消费者，按录制帧率把最新帧压缩为 JPEG 放入每个来源的滚动缓冲区
+（受时长和内存预算双重限制）。触发（接口调用或检测规则回调）时取出触发前 N 秒的帧，
+继续收集触发后 M 秒的帧，凑齐后交给后台编码线程写成 MJPEG/MP4 文件，编码不会阻塞捕获和推理
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import cv2
+import numpy as np
+from .execution import execution_layout
+
+CLIP_FORMATS = {'mjpeg': '.mjpeg', 'mp4': '.mp4'}
+
+
+class _ClipSource:
+    """单个来源的滚动缓冲区"""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = deque()       # (时间戳, JPEG 字节)
+        self.bytes = 0
+        self.frame_size = None      # (width, height)
+        self.clip = None            # 正在收集触发后帧的片段
+
+    def append(self, timestamp: float, data: bytes, max_age: float, max_bytes: int):
+        self.frames.append((timestamp, data))
+        self.bytes += len(data)
+        while self.frames and (self.frames[0][0] < timestamp - max_age or self.bytes > max_bytes):
+            _, old = self.frames.popleft()
+            self.bytes -= len(old)
+
+
+class _PendingClip:
+    """已触发、正在收集触发后帧的片段"""
+
+    def __init__(self, source, reason: str, trigger_time: float, end_time: float, frames: list):
+        self.source = source
+        self.reason = reason
+        self.trigger_time = trigger_time
+        self.end_time = end_time
+        self.frames = frames
+        self.frame_size = None
+
+
+class ClipRecorder:
+    """事件片段录制器"""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.fps = 10.0
+        self.jpeg_quality = 70
+        self.pre_seconds = 5.0
+        self.post_seconds = 5.0
+        self.buffer_bytes = 64 * 1024 * 1024   # 每个来源滚动缓冲区的内存上限
+        self.format = 'mp4'
+        self.max_files = 100
+        self.encode_queue = queue.Queue(maxsize=4)
+        self.encoder = None
+        self.sources = {}
+        self.lock = threading.Lock()
+
+        # 统计信息
+        self.triggered = 0
+        self.extended = 0
+        self.saved = 0
+        self.dropped = 0
+        self.errors = 0
+        self.removed = 0
+
+    def configure(self, config):
+        """从应用配置加载参数"""
+        self.enabled = config.get('CLIP_ENABLED', False)
+        self.directory = config.get('CLIP_DIR')
+        self.fps = float(config.get('CLIP_FPS', self.fps))
+        self.jpeg_quality = config.get('CLIP_JPEG_QUALITY', self.jpeg_quality)
+        self.pre_seconds = float(config.get('CLIP_PRE_SECONDS', self.pre_seconds))
+        self.post_seconds = float(config.get('CLIP_POST_SECONDS', self.post_seconds))
+        self.buffer_bytes = int(config.get('CLIP_BUFFER_MB', 64) * 1024 * 1024)
+        self.format = config.get('CLIP_FORMAT', self.format)
+        if self.format not in CLIP_FORMATS:
+            raise ValueError(f'不支持的片段格式: {self.format}')
+        self.max_files = config.get('CLIP_MAX_FILES', self.max_files)
+        self.encode_queue = queue.Queue(maxsize=config.get('CLIP_QUEUE_SIZE', 4))
+
+    def _ensure_encoder(self):
+        if self.encoder is None or not self.encoder.is_alive():
+            self.encoder = threading.Thread(target=self._encode_loop, daemon=True)
+            self.encoder.start()
+
+    def record(self, pipeline):
+        """录制阶段线程函数：作为帧总线消费者压缩最新帧，直到流水线停止"""
+        execution_layout.enter_stage('encode')
+        consumer = 'recorder'
+        interval = 1.0 / self.fps
+        with self.lock:
+            source = self.sources.setdefault(pipeline.name, _ClipSource(pipeline.name))
+        try:
+            while pipeline.active:
+                started = time.perf_counter()
+                lease = pipeline.frame_bus.lease_latest(consumer)
+                if lease is not None:
+                    with lease, execution_layout.measure('encode'):
+                        height, width = lease.frame.shape[:2]
+                        ok, buffer = cv2.imencode('.jpg', lease.frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    if ok:
+                        self._append(source, time.time(), buffer.tobytes(), (width, height))
+                time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+        except Exception as e:
+            print(f"片段录制错误 (来源 {pipeline.name}): {str(e)}")
+        finally:
+            pipeline.frame_bus.drop_consumer(consumer)
+            with self.lock:
+                # 流水线停止时提前结束未完成的片段
+                if source.clip is not None:
+                    self._finish(source)
+                self.sources.pop(pipeline.name, None)
+
+    def _append(self, source: _ClipSource, timestamp: float, data: bytes, frame_size):
+        with self.lock:
+            if source.frame_size != frame_size:
+                # 分辨率变化后旧帧无法写入同一个视频文件
+                source.frames.clear()
+                source.bytes = 0
+                source.frame_size = frame_size
+            source.append(timestamp, data, self.pre_seconds, self.buffer_bytes)
+            clip = source.clip
+            if clip is not None:
+                clip.frames.append((timestamp, data))
+                if timestamp >= clip.end_time:
+                    self._finish(source)
+
+    def trigger(self, source_name, reason: str = 'manual', pre_seconds: float = None,
+                post_seconds: float = None):
+        """触发一次片段录制，同一来源已有进行中的片段时延长其结束时间
+
+        Returns:
+            (是否成功, 消息)
+        """
+        pre = min(self.pre_seconds, self.pre_seconds if pre_seconds is None else float(pre_seconds))
+        post = self.post_seconds if post_seconds is None else max(0.0, float(post_seconds))
+        now = time.time()
+        with self.lock:
+            source = self.sources.get(source_name)
+            if source is None:
+                return False, f"来源未在录制: {source_name}"
+            if source.clip is not None:
+                source.clip.end_time = max(source.clip.end_time, now + post)
+                source.clip.reason += f'+{reason}'
+                self.extended += 1
+                return True, "已延长进行中的片段"
+            frames = [(ts, data) for ts, data in source.frames if ts >= now - pre]
+            source.clip = _PendingClip(source_name, reason, now, now + post, frames)
+            source.clip.frame_size = source.frame_size
+            self.triggered += 1
+            if post == 0:
+                self._finish(source)
+        return True, "片段录制已触发"
+
+    def on_rule(self, payload: dict):
+        """规则引擎回调（动作 {"type": "callback", "name": "record_clip"}）"""
+        if 'task_id' in payload:
+            source_name = f"tab:{payload['task_id']}"
+        else:
+            source_name = payload.get('monitor')
+        if source_name is None:
+            # 未带来源标签时录制第一个来源
+            source_name = next(iter(self.sources), None)
+        self.trigger(source_name, payload.get('rule_name') or 'rule')
+
+    def _finish(self, source: _ClipSource):
+        """把收集完成的片段交给编码线程（调用方持有锁）"""
+        clip = source.clip
+        source.clip = None
+        if not clip.frames:
+            return
+        self._ensure_encoder()
+        try:
+            self.encode_queue.put_nowait(clip)
+        except queue.Full:
+            self.dropped += 1
+
+    def _filename(self, clip: _PendingClip) -> str:
+        stamp = datetime.fromtimestamp(clip.trigger_time).strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        source = ''.join(c if c.isalnum() or c in '-_' else '-' for c in str(clip.source))
+        reason = ''.join(c if c.isalnum() or c in '-_' else '-' for c in clip.reason)[:48]
+        return f'{stamp}_{source}_{reason}{CLIP_FORMATS[self.format]}'
+
+    def _encode_loop(self):
+        """编码线程：写入片段文件，并按数量上限清理旧文件"""
+        while True:
+            clip = self.encode_queue.get()
+            try:
+                self._write(clip, self._filename(clip))
+                self.saved += 1
+                self.cleanup()
+            except Exception as e:
+                self.errors += 1
+                print(f"片段写入失败: {str(e)}")
+            finally:
+                self.encode_queue.task_done()
+
+    def _write(self, clip: _PendingClip, filename: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        stem, ext = os.path.splitext(path)
+        tmp_path = f'{stem}.tmp{ext}'
+        if self.format == 'mjpeg':
+            # 直接拼接已压缩的 JPEG，无需重新编码
+            with open(tmp_path, 'wb') as f:
+                for _, data in clip.frames:
+                    f.write(data)
+        else:
+            duration = clip.frames[-1][0] - clip.frames[0][0]
+            fps = (len(clip.frames) - 1) / duration if duration > 0 else self.fps
+            writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, clip.frame_size)
+            if not writer.isOpened():
+                raise RuntimeError('无法创建视频文件')
+            try:
+                for _, data in clip.frames:
+                    writer.write(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+            finally:
+                writer.release()
+        os.replace(tmp_path, path)
+
+    def list_clips(self) -> list:
+        """按时间倒序列出片段文件"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        entries = []
+        extensions = tuple(CLIP_FORMATS.values())
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(extensions) and '.tmp.' not in entry.name:
+                stat = entry.stat()
+                entries.append({'filename': entry.name, 'size': stat.st_size, 'mtime': stat.st_mtime})
+        entries.sort(key=lambda e: e['mtime'], reverse=True)
+        return entries
+
+    def cleanup(self):
+        """超过最大文件数时删除最旧的片段"""
+        for entry in self.list_clips()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, entry['filename']))
+                self.removed += 1
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            sources = {
+                str(name): {
+                    'buffered_frames': len(source.frames),
+                    'buffered_mb': round(source.bytes / 1024 / 1024, 2),
+                    'buffered_seconds': round(source.frames[-1][0] - source.frames[0][0], 2) if source.frames else 0.0,
+                    'recording': source.clip is not None
+                }
+                for name, source in self.sources.items()
+            }
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'format': self.format,
+            'fps': self.fps,
+            'pre_seconds': self.pre_seconds,
+            'post_seconds': self.post_seconds,
+            'sources': sources,
+            'triggered': self.triggered,
+            'extended': self.extended,
+            'saved': self.saved,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'removed': self.removed,
+            'pending': self.encode_queue.qsize()
+        }
+
+
+# 全局片段录制器实例
+clip_recorder = ClipRecorder()
@@ -0,0 +1,117 @@
+"""
+自适应推理分辨率
+推理耗时大致与输入面积成正比。控制器把每次推理的纯模型耗时按面积折算为全分辨率耗时的估计，
+选择预计耗时不超过延迟目标（SLO）的最大 imgsz；推理调度器积压超过阈值时再降一级。
+降级立即生效，升级需要等待保持时间并逐级进行，避免来回抖动。
+实时监控每 N 帧强制以全分辨率推理一次，保证小目标不会长期漏检，同时校准耗时估计。
+"""
+
+import threading
+import time
+
+
+class ResolutionController:
+    """按负载在若干 imgsz 之间切换"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.enabled = False
+        self.sizes = [320, 480, 640]   # 从小到大
+        self.slo_ms = 100.0            # 单次推理的延迟目标
+        self.queue_high = 4            # 推理调度器排队数上限
+        self.full_every = 10           # 每 N 帧强制全分辨率（0 表示不强制）
+        self.hold_seconds = 3.0        # 两次升级之间的最短间隔
+        self.alpha = 0.2
+        self.lock = threading.Lock()
+
+        self.level = len(self.sizes) - 1
+        self.full_ms_ewma = 0.0        # 折算到全分辨率的推理耗时
+        self.last_change = 0.0
+        self.last_reason = None
+        self.switches = 0
+        self.counts = {}               # imgsz -> 推理次数
+
+    def configure(self, config):
+        """从应用配置加载参数"""
+        self.enabled = config.get('ADAPTIVE_IMGSZ_ENABLED', self.enabled)
+        self.sizes = sorted(int(size) for size in config.get('ADAPTIVE_IMGSZ_SIZES', self.sizes))
+        self.slo_ms = float(config.get('ADAPTIVE_IMGSZ_SLO_MS', self.slo_ms))
+        self.queue_high = config.get('ADAPTIVE_IMGSZ_QUEUE_HIGH', self.queue_high)
+        self.full_every = config.get('ADAPTIVE_IMGSZ_FULL_EVERY', self.full_every)
+        self.hold_seconds = float(config.get('ADAPTIVE_IMGSZ_HOLD_SECONDS', self.hold_seconds))
+        self.level = len(self.sizes) - 1
+
+    @property
+    def full_size(self) -> int:
+        return self.sizes[-1]
+
+    def choose(self, frame_index: int = None):
+        """当前应使用的 imgsz，未启用时返回 None（使用后端默认尺寸）
+
+        Args:
+            frame_index: 实时监控的帧序号，每 full_every 帧返回全分辨率
+        """
+        if not self.enabled:
+            return None
+        if frame_index is not None and self.full_every and frame_index % self.full_every == 0:
+            return self.full_size
+        return self.sizes[self.level]
+
+    def observe(self, elapsed_ms: float, imgsz):
+        """记录一次推理的纯模型耗时并调整级别"""
+        if not self.enabled or not imgsz:
+            return
+        estimate = elapsed_ms * (self.full_size / imgsz) ** 2
+        with self.lock:
+            self.counts[imgsz] = self.counts.get(imgsz, 0) + 1
+            if self.full_ms_ewma == 0:
+                self.full_ms_ewma = estimate
+            else:
+                self.full_ms_ewma += self.alpha * (estimate - self.full_ms_ewma)
+            self._adjust()
+
+    def _target_level(self) -> int:
+        """预计耗时不超过 SLO 的最大级别"""
+        for level in range(len(self.sizes) - 1, 0, -1):
+            if self.full_ms_ewma * (self.sizes[level] / self.full_size) ** 2 <= self.slo_ms:
+                return level
+        return 0
+
+    def _adjust(self):
+        """调用方持有锁"""
+        target = self._target_level()
+        reason = 'latency'
+        queued = sum(self.scheduler.queued().values())
+        if queued >= self.queue_high and self.level > 0:
+            target = min(target, self.level - 1)
+            reason = 'queue'
+
+        now = time.monotonic()
+        if target < self.level:
+            # 降级：积压时每个保持周期最多降一级，延迟超标时直接降到目标级别
+            if reason == 'queue' and now - self.last_change < self.hold_seconds / 2:
+                return
+            self._switch(target, reason, now)
+        elif target > self.level and now - self.last_change >= self.hold_seconds:
+            self._switch(self.level + 1, 'recovered', now)
+
+    def _switch(self, level: int, reason: str, now: float):
+        self.level = level
+        self.last_change = now
+        self.last_reason = reason
+        self.switches += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'sizes': list(self.sizes),
+                'current': self.sizes[self.level],
+                'slo_ms': self.slo_ms,
+                'queue_high': self.queue_high,
+                'full_every': self.full_every,
+                'full_ms_ewma': round(self.full_ms_ewma, 2),
+                'last_reason': self.last_reason,
+                'switches': self.switches,
+                'counts': {str(size): count for size, count in sorted(self.counts.items())}
+            }
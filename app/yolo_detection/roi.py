@@ -0,0 +1,202 @@
+"""
+跟踪引导的局部推理
+实时监控的相邻帧里通常是同样几个目标停在差不多的位置。关键帧做全帧推理，
+两个关键帧之间只在跟踪目标周围的扩展区域（按上一帧位移外推）裁剪小图，
+所有裁剪区域合并成一批推理，结果平移回原图坐标后做一次跨区域 NMS。
+每帧开销随目标数量而不是屏幕面积增长；新出现的目标在下一个关键帧被发现。
+
+以下情况退回全帧推理：到达关键帧间隔、没有跟踪目标、裁剪区域过多或总面积过大。
+"""
+
+import cv2
+import numpy as np
+
+
+class _Track:
+    """跟踪中的目标"""
+
+    __slots__ = ('box', 'conf', 'cls', 'velocity', 'misses')
+
+    def __init__(self, box, conf, cls):
+        self.box = np.asarray(box, dtype=np.float32)
+        self.conf = float(conf)
+        self.cls = int(cls)
+        self.velocity = np.zeros(2, dtype=np.float32)  # 中心点每帧位移
+        self.misses = 0
+
+    def predicted_box(self):
+        return self.box + np.tile(self.velocity, 2)
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _overlaps(a, b) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class RoiTracker:
+    """单条流水线的关键帧/局部推理规划与目标跟踪（只在该流水线的检测线程中使用）"""
+
+    def __init__(self, config):
+        self.keyframe_interval = config.get('ROI_KEYFRAME_INTERVAL', 10)
+        self.padding = config.get('ROI_PADDING', 0.5)          # 每侧按目标尺寸扩展的比例
+        self.min_crop = config.get('ROI_MIN_CROP', 96)          # 裁剪区域最小边长（像素）
+        self.imgsz = config.get('ROI_IMGSZ', 320)               # 裁剪小图的推理尺寸
+        self.max_crops = config.get('ROI_MAX_CROPS', 8)
+        self.max_area_ratio = config.get('ROI_MAX_AREA_RATIO', 0.5)
+        self.max_misses = config.get('ROI_MAX_MISSES', 2)       # 连续未检出多少帧后丢弃目标
+        self.match_iou = config.get('ROI_MATCH_IOU', 0.3)
+        self.nms_iou = 0.5
+        self.tracks = []
+        self.since_keyframe = 0
+
+        # 统计信息
+        self.keyframes = 0
+        self.roi_frames = 0
+        self.crops_total = 0
+        self.area_ratio_total = 0.0
+
+    def plan(self, frame_shape):
+        """规划本帧的推理区域
+
+        Returns:
+            None 表示做全帧推理（关键帧），否则为裁剪区域列表 [(x1, y1, x2, y2)]
+        """
+        if not self.tracks or self.since_keyframe + 1 >= self.keyframe_interval:
+            return None
+        height, width = frame_shape[:2]
+        regions = [self._pad(track.predicted_box(), width, height) for track in self.tracks]
+        regions = self._merge(regions)
+        area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+        if len(regions) > self.max_crops or area > self.max_area_ratio * width * height:
+            return None
+        self.area_ratio_total += area / (width * height)
+        return regions
+
+    def _pad(self, box, width: int, height: int):
+        x1, y1, x2, y2 = box
+        pad_w = max((x2 - x1) * (1 + 2 * self.padding), self.min_crop) / 2
+        pad_h = max((y2 - y1) * (1 + 2 * self.padding), self.min_crop) / 2
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        return (int(max(0, cx - pad_w)), int(max(0, cy - pad_h)),
+                int(min(width, cx + pad_w)), int(min(height, cy + pad_h)))
+
+    @staticmethod
+    def _merge(regions: list) -> list:
+        """合并相互重叠的区域，避免同一目标在多个裁剪中重复推理"""
+        merged = True
+        while merged:
+            merged = False
+            result = []
+            for region in regions:
+                for i, other in enumerate(result):
+                    if _overlaps(region, other):
+                        result[i] = (min(region[0], other[0]), min(region[1], other[1]),
+                                     max(region[2], other[2]), max(region[3], other[3]))
+                        merged = True
+                        break
+                else:
+                    result.append(region)
+            regions = result
+        return regions
+
+    @staticmethod
+    def crop(frame: np.ndarray, regions: list) -> list:
+        """裁剪区域（帧视图上的切片，不复制）"""
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+
+    def merge_results(self, regions: list, results: list, frame_shape):
+        """把各裁剪区域的检测结果平移回原图坐标并去重
+
+        紧贴裁剪边界（且该边界不是画面边界）的框多半是被截断的目标，丢弃
+        """
+        height, width = frame_shape[:2]
+        boxes, confs, classes = [], [], []
+        for (x1, y1, x2, y2), (xyxy, conf, cls) in zip(regions, results):
+            if len(xyxy) == 0:
+                continue
+            margin = 2
+            keep = np.ones(len(xyxy), dtype=bool)
+            if x1 > 0:
+                keep &= xyxy[:, 0] > margin
+            if y1 > 0:
+                keep &= xyxy[:, 1] > margin
+            if x2 < width:
+                keep &= xyxy[:, 2] < (x2 - x1) - margin
+            if y2 < height:
+                keep &= xyxy[:, 3] < (y2 - y1) - margin
+            boxes.append(xyxy[keep] + np.array([x1, y1, x1, y1], dtype=np.float32))
+            confs.append(conf[keep])
+            classes.append(cls[keep])
+        if not boxes:
+            return (np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                    np.zeros(0, dtype=np.float32))
+        xyxy = np.concatenate(boxes).astype(np.float32)
+        conf = np.concatenate(confs).astype(np.float32)
+        cls = np.concatenate(classes).astype(np.float32)
+        if len(regions) > 1 and len(xyxy) > 1:
+            # 按类别偏移后统一 NMS
+            offset = cls[:, None] * (max(width, height) * 2)
+            nms_boxes = np.hstack([xyxy[:, :2] + offset, xyxy[:, 2:] - xyxy[:, :2]])
+            indices = np.asarray(cv2.dnn.NMSBoxes(nms_boxes.tolist(), conf.tolist(), 0.0, self.nms_iou),
+                                 dtype=np.int64).reshape(-1)
+            xyxy, conf, cls = xyxy[indices], conf[indices], cls[indices]
+        return xyxy, conf, cls
+
+    def update(self, xyxy, confs, classes, keyframe: bool, regions: list = None):
+        """用本帧检测结果更新跟踪目标"""
+        if keyframe:
+            self.keyframes += 1
+            self.since_keyframe = 0
+        else:
+            self.roi_frames += 1
+            self.since_keyframe += 1
+            self.crops_total += len(regions or [])
+
+        previous = self.tracks
+        tracks = [_Track(box, conf, cls) for box, conf, cls in zip(xyxy, confs, classes)]
+        matched = set()
+        if previous and tracks:
+            # 全局贪心匹配：按 IoU 从高到低，同类别且双方都未匹配时配对
+            ious = _iou_matrix(np.asarray(xyxy, dtype=np.float32),
+                               np.stack([track.predicted_box() for track in previous]))
+            assigned = set()
+            for flat in np.argsort(-ious, axis=None):
+                i, j = np.unravel_index(flat, ious.shape)
+                if ious[i, j] < self.match_iou:
+                    break
+                if i in assigned or j in matched or previous[j].cls != tracks[i].cls:
+                    continue
+                assigned.add(i)
+                matched.add(j)
+                old_center = (previous[j].box[:2] + previous[j].box[2:]) / 2
+                new_center = (tracks[i].box[:2] + tracks[i].box[2:]) / 2
+                tracks[i].velocity = new_center - old_center
+
+        if not keyframe:
+            # 局部推理时暂未检出的目标保留几帧（可能被遮挡或置信度短暂下降）
+            for j, track in enumerate(previous):
+                if j not in matched and track.misses < self.max_misses:
+                    track.misses += 1
+                    track.velocity = np.zeros(2, dtype=np.float32)
+                    tracks.append(track)
+        self.tracks = tracks
+
+    def stats(self) -> dict:
+        return {
+            'tracks': len(self.tracks),
+            'keyframe_interval': self.keyframe_interval,
+            'keyframes': self.keyframes,
+            'roi_frames': self.roi_frames,
+            'avg_crops': round(self.crops_total / self.roi_frames, 2) if self.roi_frames else 0.0,
+            'avg_area_ratio': round(self.area_ratio_total / self.roi_frames, 4) if self.roi_frames else 0.0
+        }
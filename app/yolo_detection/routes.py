@@ -1,6 +1,14 @@
-from flask import Blueprint, render_template, request, jsonify, Response
+from flask import Blueprint, render_template, request, jsonify, Response, send_from_directory, abort
 from .detection import detection
+from .rules import rule_engine, create_rule
+from .zones import zone_manager, create_zone
+from .snapshot import snapshot_writer
+from .recorder import clip_recorder
+from .execution import execution_layout
+from .model_cache import model_cache
+from . import encoding
 from flask import current_app
+from datetime import datetime
 import time
 
 bp = Blueprint('yolo_detection', __name__,
@@ -23,13 +31,22 @@ def stop_monitoring():
 
 @bp.route('/video-feed')
 def video_feed():
-    """视频流路由"""
-    return Response(detection.generate_frames(),
+    """视频流路由（?format=packed 以紧凑格式推送检测结果）"""
+    monitor = request.args.get('monitor')
+    if monitor is not None and monitor.isdigit():
+        monitor = int(monitor)
+    fmt = encoding.negotiate(request, allowed=('json', 'packed'))
+    if fmt is None:
+        return jsonify({'success': False, 'error': 'Unsupported format'}), 406
+    return Response(detection.generate_frames(monitor, fmt),
                    mimetype='text/event-stream')
 
 @bp.route('/detect', methods=['POST'])
 def detect():
     """网页应用的检测路由"""
+    fmt = encoding.negotiate(request)
+    if fmt is None:
+        return jsonify({'success': False, 'error': 'Unsupported format'}), 406
     if 'image' not in request.files:
         return jsonify({'success': False, 'error': 'No image file provided'})
     
@@ -39,6 +56,235 @@ def detect():
     
     success, result = detection.web_detect_image(file.read())
     if success:
-        return jsonify(result)
+        return encoding.make_response(result, fmt)
     else:
-        return jsonify({'success': False, 'error': result}) 
\ No newline at end of file
+        return jsonify({'success': False, 'error': result}) 
+
+@bp.route('/buffer-stats')
+def buffer_stats():
+    """各显示器帧总线占用统计（含共享内存名称，供其他进程挂载）"""
+    return jsonify({str(p.name): p.frame_bus.stats() for p in detection.pipelines})
+
+@bp.route('/monitors')
+def monitors():
+    """显示器列表及各流水线运行统计"""
+    from .monitors import list_monitors
+    try:
+        return jsonify({'success': True, 'monitors': list_monitors(),
+                        'pipelines': detection.pipeline_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def _parse_time_arg(value, default):
+    """解析时间参数，支持Unix时间戳或ISO格式（本地时间）"""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@bp.route('/history/detections')
+def history_detections():
+    """查询时间范围内的历史检测记录"""
+    if detection.history is None:
+        return jsonify({'success': False, 'error': 'History store disabled'}), 404
+    try:
+        end = _parse_time_arg(request.args.get('end'), time.time())
+        start = _parse_time_arg(request.args.get('start'), end - 3600)
+        limit = request.args.get('limit', 1000, type=int)
+        records = detection.history.query(start, end, request.args.get('class'), limit)
+        return jsonify({'success': True, 'start': start, 'end': end, 'detections': records})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@bp.route('/history/counts')
+def history_counts():
+    """按时间分桶统计历史检测数量"""
+    if detection.history is None:
+        return jsonify({'success': False, 'error': 'History store disabled'}), 404
+    try:
+        end = _parse_time_arg(request.args.get('end'), time.time())
+        start = _parse_time_arg(request.args.get('start'), end - 3600)
+        bucket = request.args.get('bucket', 60, type=float)
+        result = detection.history.counts(start, end, bucket, request.args.get('class'))
+        return jsonify({'success': True, 'end': end, **result})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@bp.route('/history/stats')
+def history_stats():
+    """检测历史存储统计"""
+    if detection.history is None:
+        return jsonify({'success': False, 'error': 'History store disabled'}), 404
+    return jsonify({'success': True, 'data': detection.history.stats()})
+
+@bp.route('/rules', methods=['GET'])
+def list_rules():
+    """获取所有检测规则"""
+    return jsonify({'success': True, 'data': rule_engine.get_rules(), 'stats': rule_engine.stats()})
+
+@bp.route('/rules', methods=['POST'])
+def add_rule():
+    """添加检测规则"""
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'No rule provided'}), 400
+    try:
+        rule = rule_engine.add_rule(create_rule(data))
+        return jsonify({'success': True, 'data': rule.to_dict()})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@bp.route('/rules/<rule_id>', methods=['DELETE'])
+def delete_rule(rule_id):
+    """删除检测规则"""
+    if rule_engine.remove_rule(rule_id):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'error': 'Rule not found'}), 404
+
+@bp.route('/zones', methods=['GET'])
+def list_zones():
+    """获取所有监控区域"""
+    return jsonify({'success': True, 'data': zone_manager.get_zones()})
+
+@bp.route('/zones', methods=['POST'])
+def add_zone():
+    """添加监控区域"""
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'No zone provided'}), 400
+    try:
+        zone = zone_manager.add_zone(create_zone(data))
+        return jsonify({'success': True, 'data': zone.to_dict()})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@bp.route('/zones/<zone_id>', methods=['PUT'])
+def update_zone(zone_id):
+    """修改监控区域（只需提供要修改的字段）"""
+    data = request.get_json()
+    if not data:
+        return jsonify({'success': False, 'error': 'No zone provided'}), 400
+    try:
+        zone = zone_manager.update_zone(zone_id, data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if zone is None:
+        return jsonify({'success': False, 'error': 'Zone not found'}), 404
+    return jsonify({'success': True, 'data': zone.to_dict()})
+
+@bp.route('/zones/<zone_id>', methods=['DELETE'])
+def delete_zone(zone_id):
+    """删除监控区域"""
+    if zone_manager.remove_zone(zone_id):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'error': 'Zone not found'}), 404
+
+@bp.route('/snapshots')
+def list_snapshots():
+    """列出自动快照及写入统计"""
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({'success': True, 'data': snapshot_writer.list_snapshots()[:limit],
+                    'stats': snapshot_writer.stats()})
+
+@bp.route('/snapshots/<path:filename>')
+def get_snapshot(filename):
+    """获取快照图片"""
+    if not snapshot_writer.directory:
+        abort(404)
+    return send_from_directory(snapshot_writer.directory, filename)
+
+@bp.route('/clips', methods=['GET'])
+def list_clips():
+    """列出事件片段及录制统计"""
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({'success': True, 'data': clip_recorder.list_clips()[:limit],
+                    'stats': clip_recorder.stats()})
+
+@bp.route('/clips', methods=['POST'])
+def trigger_clip():
+    """触发片段录制：保存触发前 pre_seconds 秒和触发后 post_seconds 秒的画面"""
+    data = request.get_json() or {}
+    monitor = data.get('monitor')
+    if monitor is None:
+        monitor = next(iter(clip_recorder.sources), None)
+    try:
+        success, message = clip_recorder.trigger(monitor, data.get('reason', 'manual'),
+                                                 data.get('pre_seconds'), data.get('post_seconds'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': success, 'message': message}), (202 if success else 404)
+
+@bp.route('/clips/<path:filename>')
+def get_clip(filename):
+    """下载事件片段"""
+    if not clip_recorder.directory:
+        abort(404)
+    return send_from_directory(clip_recorder.directory, filename)
+
+@bp.route('/rate')
+def rate_status():
+    """自适应帧率控制器当前目标和测量值"""
+    return jsonify({'success': True, 'data': detection.rate_controller.stats()})
+
+@bp.route('/resolution')
+def resolution_status():
+    """自适应推理分辨率的当前尺寸、耗时估计和各尺寸推理次数"""
+    return jsonify({'success': True, 'data': detection.resolution.stats()})
+
+@bp.route('/execution')
+def execution_status():
+    """执行布局（线程数、CPU绑定）及各阶段CPU耗时"""
+    return jsonify({'success': True, 'data': execution_layout.to_dict()})
+
+@bp.route('/admin/models')
+def model_status():
+    """已加载模型、重载状态及模型缓存"""
+    data = detection.models.stats()
+    data['cache'] = model_cache.stats()
+    return jsonify({'success': True, 'data': data})
+
+@bp.route('/admin/reload-model', methods=['POST'])
+def reload_model():
+    """后台加载并预热新权重，完成后原子替换，无需重启应用"""
+    data = request.get_json() or {}
+    model_path = data.get('model_path')
+    if not model_path:
+        return jsonify({'success': False, 'error': 'No model_path provided'}), 400
+    try:
+        success, message = detection.reload_model(model_path)
+    except (PermissionError, FileNotFoundError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': success, 'message': message}), (202 if success else 409)
+
+@bp.route('/inference/stats')
+def inference_stats():
+    """推理调度器队列、并发和各优先级类别统计"""
+    return jsonify({'success': True, 'data': detection.inference.stats()})
+
+@bp.route('/tab-sources', methods=['GET'])
+def list_tab_sources():
+    """正在运行的秒杀标签页检测来源"""
+    return jsonify({'success': True, 'data': [p.stats() for p in detection.tab_pipelines.values()]})
+
+@bp.route('/tab-sources', methods=['POST'])
+def start_tab_source():
+    """以秒杀任务的浏览器标签页作为检测来源"""
+    data = request.get_json() or {}
+    if 'task_id' not in data:
+        return jsonify({'success': False, 'error': 'No task_id provided'}), 400
+    success, message = detection.start_tab_source(
+        data['task_id'],
+        fps=data.get('fps', 2.0),
+        max_width=data.get('max_width', 1280),
+        quality=data.get('quality', 70)
+    )
+    return jsonify({'success': success, 'message': message}), (200 if success else 400)
+
+@bp.route('/tab-sources/<task_id>', methods=['DELETE'])
+def stop_tab_source(task_id):
+    """停止标签页检测来源"""
+    success, message = detection.stop_tab_source(task_id)
+    return jsonify({'success': success, 'message': message}), (200 if success else 404)
@@ -0,0 +1,345 @@
+"""
+检测规则引擎
+订阅实时监控的检测结果，增量评估规则（每条规则对每个检测来源只保存常量大小的状态），
+命中后将动作（本地 Webhook / 内部回调）放入后台队列异步执行，不阻塞检测循环
+
+各显示器和标签页流水线在各自的检测线程中并发投递事件，规则的边沿/连续帧状态和冷却时间
+按事件的来源（monitor 或 task_id）分开保存，互不干扰。
+"""
+
+import queue
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+import requests
+
+
+def event_source(event: dict):
+    """检测事件的来源键：标签页流水线为 task_id，显示器流水线为 monitor"""
+    if 'task_id' in event:
+        return ('task_id', event['task_id'])
+    return ('monitor', event.get('monitor'))
+
+
+class DetectionRule:
+    """检测规则基类
+
+    子类实现 _evaluate(detections, state) 返回命中详情（dict）或 None，
+    state 为该来源的增量状态字典（初始值由 initial_state() 给出）。
+    规则只在条件由不满足变为满足时触发一次（边沿触发）。
+    """
+
+    rule_type = 'base'
+
+    def __init__(self, name: str = None, actions: List[dict] = None,
+                 cooldown: float = 0, rule_id: str = None, enabled: bool = True, **kwargs):
+        self.rule_id = rule_id or str(uuid.uuid4())
+        self.name = name or self.rule_type
+        self.actions = actions or []
+        self.cooldown = float(cooldown)
+        self.enabled = enabled
+        self.last_fired = 0.0
+        self.fire_count = 0
+        self.states = {}   # 来源 -> 增量状态
+        self.state_lock = threading.Lock()
+
+    def evaluate(self, detections: list, timestamp: float, source=None) -> Optional[dict]:
+        """评估某个来源的一帧检测结果，命中且该来源不在冷却期内时返回命中详情"""
+        if not self.enabled:
+            return None
+        with self.state_lock:
+            state = self.states.get(source)
+            if state is None:
+                state = self.states[source] = {'last_fired': 0.0, **self.initial_state()}
+            match = self._evaluate(detections, state)
+            if match is None:
+                return None
+            if timestamp - state['last_fired'] < self.cooldown:
+                return None
+            state['last_fired'] = timestamp
+            self.last_fired = max(self.last_fired, timestamp)
+            self.fire_count += 1
+        return match
+
+    def initial_state(self) -> dict:
+        return {}
+
+    def _evaluate(self, detections: list, state: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+    def reset(self):
+        """重置所有来源的增量状态"""
+        with self.state_lock:
+            self.states.clear()
+
+    def params(self) -> dict:
+        return {}
+
+    def to_dict(self) -> dict:
+        return {
+            'rule_id': self.rule_id,
+            'type': self.rule_type,
+            'name': self.name,
+            'actions': self.actions,
+            'cooldown': self.cooldown,
+            'enabled': self.enabled,
+            'fire_count': self.fire_count,
+            'last_fired': self.last_fired or None,
+            **self.params()
+        }
+
+
+def _matches_class(det: dict, class_name: str, min_confidence: float) -> bool:
+    return (class_name is None or det['class'] == class_name) and det['confidence'] >= min_confidence
+
+
+class PresenceRule(DetectionRule):
+    """类别连续出现 N 帧"""
+
+    rule_type = 'presence'
+
+    def __init__(self, class_name: str, frames: int = 1, min_confidence: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.class_name = class_name
+        self.frames = max(1, int(frames))
+        self.min_confidence = float(min_confidence)
+
+    def initial_state(self):
+        return {'streak': 0}
+
+    def _evaluate(self, detections, state):
+        present = any(_matches_class(d, self.class_name, self.min_confidence) for d in detections)
+        if not present:
+            state['streak'] = 0
+            return None
+        state['streak'] += 1
+        if state['streak'] == self.frames:
+            return {'class': self.class_name, 'frames': state['streak']}
+        return None
+
+    def params(self):
+        return {'class_name': self.class_name, 'frames': self.frames,
+                'min_confidence': self.min_confidence}
+
+
+class CountRule(DetectionRule):
+    """单帧内某类别（或全部）数量超过 K"""
+
+    rule_type = 'count'
+
+    def __init__(self, threshold: int, class_name: str = None, min_confidence: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = int(threshold)
+        self.class_name = class_name
+        self.min_confidence = float(min_confidence)
+
+    def initial_state(self):
+        return {'above': False}
+
+    def _evaluate(self, detections, state):
+        count = sum(1 for d in detections if _matches_class(d, self.class_name, self.min_confidence))
+        was_above = state['above']
+        state['above'] = count > self.threshold
+        if state['above'] and not was_above:
+            return {'class': self.class_name, 'count': count}
+        return None
+
+    def params(self):
+        return {'class_name': self.class_name, 'threshold': self.threshold,
+                'min_confidence': self.min_confidence}
+
+
+class ZoneEnterRule(DetectionRule):
+    """目标进入区域（以检测框中心点判断）"""
+
+    rule_type = 'zone_enter'
+
+    def __init__(self, zone: List[int], class_name: str = None, min_confidence: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        if len(zone) != 4:
+            raise ValueError('zone 必须为 [x, y, width, height]')
+        self.zone = [int(v) for v in zone]
+        self.class_name = class_name
+        self.min_confidence = float(min_confidence)
+
+    def _in_zone(self, det: dict) -> bool:
+        zx, zy, zw, zh = self.zone
+        cx = det['x'] + det['width'] / 2
+        cy = det['y'] + det['height'] / 2
+        return zx <= cx <= zx + zw and zy <= cy <= zy + zh
+
+    def initial_state(self):
+        return {'inside': False}
+
+    def _evaluate(self, detections, state):
+        entered = [d for d in detections
+                   if _matches_class(d, self.class_name, self.min_confidence) and self._in_zone(d)]
+        was_inside = state['inside']
+        state['inside'] = bool(entered)
+        if state['inside'] and not was_inside:
+            return {'class': self.class_name, 'zone': self.zone, 'objects': entered}
+        return None
+
+    def params(self):
+        return {'class_name': self.class_name, 'zone': self.zone,
+                'min_confidence': self.min_confidence}
+
+
+RULE_TYPES = {
+    PresenceRule.rule_type: PresenceRule,
+    CountRule.rule_type: CountRule,
+    ZoneEnterRule.rule_type: ZoneEnterRule,
+}
+
+
+def create_rule(data: dict) -> DetectionRule:
+    """根据字典配置创建规则"""
+    data = dict(data)
+    rule_type = data.pop('type', None)
+    rule_class = RULE_TYPES.get(rule_type)
+    if rule_class is None:
+        raise ValueError(f'未知的规则类型: {rule_type}')
+    # 忽略只读字段，便于直接回传 to_dict() 的结果
+    for field in ('fire_count', 'last_fired'):
+        data.pop(field, None)
+    return rule_class(**data)
+
+
+class RuleEngine:
+    """规则引擎"""
+
+    def __init__(self):
+        self.rules: Dict[str, DetectionRule] = {}
+        self.callbacks: Dict[str, Callable] = {}
+        self.lock = threading.Lock()
+        self.action_queue = queue.Queue(maxsize=100)
+        self.workers = []
+        self.num_workers = 2
+        self.webhook_timeout = 3.0
+        self.allowed_hosts = {'localhost', '127.0.0.1', '::1'}
+
+        # 统计信息
+        self.fired = 0
+        self.dropped = 0
+        self.action_errors = 0
+
+    def configure(self, config):
+        """从应用配置加载参数和初始规则"""
+        self.num_workers = config.get('RULE_ACTION_WORKERS', self.num_workers)
+        self.action_queue = queue.Queue(maxsize=config.get('RULE_ACTION_QUEUE_SIZE', 100))
+        self.webhook_timeout = config.get('RULE_WEBHOOK_TIMEOUT', self.webhook_timeout)
+        self.allowed_hosts = set(config.get('RULE_WEBHOOK_ALLOWED_HOSTS', self.allowed_hosts))
+        for data in config.get('DETECTION_RULES', []):
+            self.add_rule(create_rule(data))
+
+    def _ensure_workers(self):
+        """按需启动动作执行线程"""
+        self.workers = [w for w in self.workers if w.is_alive()]
+        while len(self.workers) < self.num_workers:
+            worker = threading.Thread(target=self._action_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def add_rule(self, rule: DetectionRule) -> DetectionRule:
+        for action in rule.actions:
+            self._validate_action(action)
+        with self.lock:
+            self.rules[rule.rule_id] = rule
+        return rule
+
+    def remove_rule(self, rule_id: str) -> bool:
+        with self.lock:
+            return self.rules.pop(rule_id, None) is not None
+
+    def get_rules(self) -> List[dict]:
+        with self.lock:
+            return [rule.to_dict() for rule in self.rules.values()]
+
+    def register_callback(self, name: str, callback: Callable):
+        """注册内部回调动作，回调参数为命中载荷字典"""
+        self.callbacks[name] = callback
+
+    def _validate_action(self, action: dict):
+        action_type = action.get('type')
+        if action_type == 'webhook':
+            host = urlparse(action.get('url', '')).hostname
+            if host not in self.allowed_hosts:
+                raise ValueError(f'Webhook 地址不在允许列表中: {host}')
+        elif action_type == 'callback':
+            if not action.get('name'):
+                raise ValueError('callback 动作缺少 name')
+        else:
+            raise ValueError(f'未知的动作类型: {action_type}')
+
+    def process(self, event: dict):
+        """检测订阅入口：增量评估所有规则，命中后异步派发动作"""
+        timestamp = event['timestamp']
+        detections = event['detections']
+        source = event_source(event)
+        with self.lock:
+            rules = list(self.rules.values())
+
+        for rule in rules:
+            match = rule.evaluate(detections, timestamp, source)
+            if match is None:
+                continue
+            with self.lock:
+                self.fired += 1
+            payload = {
+                'rule_id': rule.rule_id,
+                'rule_name': rule.name,
+                'rule_type': rule.rule_type,
+                'timestamp': timestamp,
+                'match': match
+            }
+            for key in ('monitor', 'source', 'task_id'):
+                if key in event:
+                    payload[key] = event[key]
+            self._ensure_workers()
+            for action in rule.actions:
+                try:
+                    self.action_queue.put_nowait((action, payload))
+                except queue.Full:
+                    self.dropped += 1
+
+    def _action_loop(self):
+        """动作执行线程"""
+        while True:
+            action, payload = self.action_queue.get()
+            try:
+                self._run_action(action, payload)
+            except Exception as e:
+                self.action_errors += 1
+                print(f"规则动作执行失败 ({payload['rule_name']}): {str(e)}")
+            finally:
+                self.action_queue.task_done()
+
+    def _run_action(self, action: dict, payload: dict):
+        if action['type'] == 'webhook':
+            requests.post(action['url'], json=payload, timeout=self.webhook_timeout)
+        elif action['type'] == 'callback':
+            callback = self.callbacks.get(action['name'])
+            if callback is None:
+                raise ValueError(f"未注册的回调: {action['name']}")
+            callback(payload)
+
+    def reset_state(self):
+        """重置所有规则的增量状态（监控重新开始时调用）"""
+        with self.lock:
+            for rule in self.rules.values():
+                rule.reset()
+
+    def stats(self) -> dict:
+        return {
+            'rules': len(self.rules),
+            'fired': self.fired,
+            'dropped': self.dropped,
+            'action_errors': self.action_errors,
+            'pending_actions': self.action_queue.qsize(),
+            'callbacks': list(self.callbacks.keys())
+        }
+
+
+# 全局规则引擎实例
+rule_engine = RuleEngine()
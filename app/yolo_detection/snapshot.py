@@ -0,0 +1,196 @@
+"""
+自动快照
+检测条件命中时保存带标注的快照。检测线程只负责评估条件和复制帧，
+JPEG 编码、写盘和 fsync 由有界的后台写入线程池完成，并按保留策略定期清理旧文件
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import cv2
+from .rules import create_rule, event_source
+
+
+def draw_detections(frame, detections: list):
+    """在帧上绘制边界框和标签（就地修改，调用方传入副本）"""
+    for det in detections:
+        x1, y1 = det['x'], det['y']
+        x2, y2 = x1 + det['width'], y1 + det['height']
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f"{det['class']} {det['confidence']:.2f}"
+        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+
+class SnapshotWriter:
+    """异步快照写入器"""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.conditions = []        # 触发条件（规则实例，不带动作）
+        self.min_interval = 2.0     # 两次快照的最小间隔（秒）
+        self.jpeg_quality = 90
+        self.retention_seconds = 24 * 3600
+        self.max_files = 500
+        self.cleanup_interval = 60
+        self.num_workers = 1
+        self.write_queue = queue.Queue(maxsize=8)
+        self.workers = []
+        self.lock = threading.Lock()
+        self.last_saved = {}        # 来源 -> 上次快照时间（频率限制按来源分别计算）
+        self.last_cleanup = 0.0
+
+        # 统计信息
+        self.triggered = 0
+        self.saved = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.removed = 0
+
+    def configure(self, config):
+        """从应用配置加载参数"""
+        self.enabled = config.get('SNAPSHOT_ENABLED', False)
+        self.directory = config.get('SNAPSHOT_DIR')
+        self.conditions = [create_rule(data) for data in config.get('SNAPSHOT_CONDITIONS', [])]
+        self.min_interval = config.get('SNAPSHOT_MIN_INTERVAL', self.min_interval)
+        self.jpeg_quality = config.get('SNAPSHOT_JPEG_QUALITY', self.jpeg_quality)
+        self.retention_seconds = config.get('SNAPSHOT_RETENTION_HOURS', 24) * 3600
+        self.max_files = config.get('SNAPSHOT_MAX_FILES', self.max_files)
+        self.num_workers = config.get('SNAPSHOT_WRITER_WORKERS', self.num_workers)
+        self.write_queue = queue.Queue(maxsize=config.get('SNAPSHOT_QUEUE_SIZE', 8))
+
+    def _ensure_workers(self):
+        """按需启动写入线程"""
+        self.workers = [w for w in self.workers if w.is_alive()]
+        while len(self.workers) < self.num_workers:
+            worker = threading.Thread(target=self._write_loop, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def on_detection(self, event: dict):
+        """检测订阅入口（运行在检测线程中，只做条件评估和帧复制）"""
+        if not self.enabled or not self.conditions:
+            return
+        source = event_source(event)
+        matched = [rule.name for rule in self.conditions
+                   if rule.evaluate(event['detections'], event['timestamp'], source) is not None]
+        if not matched:
+            return
+        with self.lock:
+            self.triggered += 1
+        self.submit(event['frame'], '_'.join(matched), event['timestamp'], event.get('monitor'),
+                    event['detections'], source)
+
+    def submit(self, frame, reason: str, timestamp: float = None, monitor=None, detections=None,
+               source=None) -> bool:
+        """提交一张快照，同一来源超过频率限制或队列已满时丢弃
+
+        Args:
+            detections: 需要标注到快照上的检测结果（在写入线程中绘制）
+            source: 频率限制的来源键，默认按 monitor 区分
+        """
+        timestamp = timestamp or time.time()
+        source = source if source is not None else ('monitor', monitor)
+        with self.lock:
+            last_saved = self.last_saved.get(source)
+            if last_saved is not None and timestamp - last_saved < self.min_interval:
+                self.rate_limited += 1
+                return False
+            self.last_saved[source] = timestamp
+
+        self._ensure_workers()
+        try:
+            # 帧总线槽位在租用结束后会被覆盖，这里必须复制
+            self.write_queue.put_nowait((frame.copy(), reason, timestamp, monitor, detections))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _filename(self, reason: str, timestamp: float, monitor) -> str:
+        stamp = datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        safe_reason = ''.join(c if c.isalnum() or c in '-_' else '-' for c in reason)[:48]
+        suffix = f'_m{monitor}' if monitor is not None else ''
+        return f'{stamp}{suffix}_{safe_reason}.jpg'
+
+    def _write_loop(self):
+        """写入线程：编码、写盘、fsync，并定期清理"""
+        while True:
+            frame, reason, timestamp, monitor, detections = self.write_queue.get()
+            try:
+                if detections:
+                    draw_detections(frame, detections)
+                self._write(frame, self._filename(reason, timestamp, monitor))
+                self.saved += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"快照写入失败: {str(e)}")
+            finally:
+                self.write_queue.task_done()
+
+            if time.time() - self.last_cleanup >= self.cleanup_interval:
+                self.cleanup()
+
+    def _write(self, frame, filename: str):
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError('JPEG 编码失败')
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def list_snapshots(self) -> list:
+        """按时间倒序列出快照文件"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                entries.append({'filename': entry.name, 'size': stat.st_size, 'mtime': stat.st_mtime})
+        entries.sort(key=lambda e: e['mtime'], reverse=True)
+        return entries
+
+    def cleanup(self):
+        """按保留时长和最大文件数删除旧快照"""
+        self.last_cleanup = time.time()
+        cutoff = self.last_cleanup - self.retention_seconds
+        for index, entry in enumerate(self.list_snapshots()):
+            if entry['mtime'] < cutoff or index >= self.max_files:
+                try:
+                    os.remove(os.path.join(self.directory, entry['filename']))
+                    self.removed += 1
+                except OSError:
+                    pass
+
+    def reset_state(self):
+        for rule in self.conditions:
+            rule.reset()
+        with self.lock:
+            self.last_saved.clear()
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'conditions': [rule.to_dict() for rule in self.conditions],
+            'triggered': self.triggered,
+            'saved': self.saved,
+            'dropped': self.dropped,
+            'rate_limited': self.rate_limited,
+            'errors': self.errors,
+            'removed': self.removed,
+            'pending': self.write_queue.qsize()
+        }
+
+
+# 全局快照写入器实例
+snapshot_writer = SnapshotWriter()
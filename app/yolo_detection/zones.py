@@ -0,0 +1,167 @@
+"""
+监控区域
+屏幕上大部分区域无关紧要时，可以只关注几个面板：每个区域是屏幕坐标中的矩形，
+拥有独立的检测帧率、类别过滤和置信度阈值。有区域覆盖的显示器流水线只在到期区域的裁剪上推理
+（同一帧中到期的区域合并为一批），不再做全帧检测；没有区域的显示器照常全帧检测。
+"""
+
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+
+class WatchZone:
+    """单个监控区域"""
+
+    def __init__(self, rect: List[int], name: str = None, fps: float = 2.0, classes: List[str] = None,
+                 min_confidence: float = 0.25, enabled: bool = True, zone_id: str = None, **kwargs):
+        if len(rect) != 4 or rect[2] <= 0 or rect[3] <= 0:
+            raise ValueError('rect 格式应为 [x, y, width, height]，且宽高大于 0')
+        if not 0 < float(fps) <= 60:
+            raise ValueError('fps 应在 (0, 60] 范围内')
+        if not 0 <= float(min_confidence) <= 1:
+            raise ValueError('min_confidence 应在 [0, 1] 范围内')
+        if classes is not None and not isinstance(classes, list):
+            raise ValueError('classes 应为类别名称列表')
+        self.zone_id = zone_id or str(uuid.uuid4())
+        self.name = name or self.zone_id[:8]
+        self.rect = [int(v) for v in rect]
+        self.fps = float(fps)
+        self.classes = set(classes) if classes else None
+        self.min_confidence = float(min_confidence)
+        self.enabled = enabled
+        self.last_run: Dict[object, float] = {}   # 流水线名称 -> 上次检测时间
+        self.runs = 0
+        self.detections = 0
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.fps
+
+    def frame_region(self, monitor: dict, frame_shape) -> Optional[tuple]:
+        """把屏幕坐标矩形转换为该显示器帧内的裁剪区域 (x1, y1, x2, y2)，不相交时返回 None"""
+        height, width = frame_shape[:2]
+        # 帧尺寸可能与显示器逻辑尺寸不同（缩放），按比例换算
+        scale_x = width / monitor['width'] if monitor.get('width') else 1.0
+        scale_y = height / monitor['height'] if monitor.get('height') else 1.0
+        x, y, w, h = self.rect
+        x1 = int(max(0, (x - monitor.get('left', 0)) * scale_x))
+        y1 = int(max(0, (y - monitor.get('top', 0)) * scale_y))
+        x2 = int(min(width, (x + w - monitor.get('left', 0)) * scale_x))
+        y2 = int(min(height, (y + h - monitor.get('top', 0)) * scale_y))
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+        return x1, y1, x2, y2
+
+    def accepts(self, cls_name: str, conf: float) -> bool:
+        return conf >= self.min_confidence and (self.classes is None or cls_name in self.classes)
+
+    def to_dict(self) -> dict:
+        return {
+            'zone_id': self.zone_id,
+            'name': self.name,
+            'rect': self.rect,
+            'fps': self.fps,
+            'classes': sorted(self.classes) if self.classes else None,
+            'min_confidence': self.min_confidence,
+            'enabled': self.enabled,
+            'runs': self.runs,
+            'detections': self.detections
+        }
+
+
+def create_zone(data: dict) -> WatchZone:
+    """根据字典配置创建区域"""
+    data = dict(data)
+    if 'rect' not in data:
+        raise ValueError('缺少 rect')
+    # 忽略只读字段，便于直接回传 to_dict() 的结果
+    for field in ('runs', 'detections'):
+        data.pop(field, None)
+    return WatchZone(**data)
+
+
+class ZoneManager:
+    """监控区域管理器（运行时可增删改）"""
+
+    def __init__(self):
+        self.zones: Dict[str, WatchZone] = {}
+        self.lock = threading.Lock()
+        self.imgsz = 640
+
+    def configure(self, config):
+        """从应用配置加载参数和初始区域"""
+        self.imgsz = config.get('WATCH_ZONE_IMGSZ', self.imgsz)
+        for data in config.get('WATCH_ZONES', []):
+            self.add_zone(create_zone(data))
+
+    def add_zone(self, zone: WatchZone) -> WatchZone:
+        with self.lock:
+            self.zones[zone.zone_id] = zone
+        return zone
+
+    def update_zone(self, zone_id: str, data: dict) -> Optional[WatchZone]:
+        """按字段更新区域（未提供的字段保持不变），区域不存在时返回 None"""
+        with self.lock:
+            old = self.zones.get(zone_id)
+            if old is None:
+                return None
+            merged = {**old.to_dict(), **data, 'zone_id': zone_id}
+            zone = create_zone(merged)
+            zone.last_run = old.last_run
+            zone.runs, zone.detections = old.runs, old.detections
+            self.zones[zone_id] = zone
+        return zone
+
+    def remove_zone(self, zone_id: str) -> bool:
+        with self.lock:
+            return self.zones.pop(zone_id, None) is not None
+
+    def get_zones(self) -> List[dict]:
+        with self.lock:
+            return [zone.to_dict() for zone in self.zones.values()]
+
+    def regions_for(self, monitor: dict, frame_shape) -> list:
+        """与显示器相交的已启用区域
+
+        Returns:
+            [(区域, 帧内裁剪区域)]
+        """
+        with self.lock:
+            zones = [zone for zone in self.zones.values() if zone.enabled]
+        regions = []
+        for zone in zones:
+            region = zone.frame_region(monitor, frame_shape)
+            if region is not None:
+                regions.append((zone, region))
+        return regions
+
+    def due(self, pipeline_name, monitor: dict, frame_shape, now: float = None) -> list:
+        """到期需要检测的区域，并记录本次检测时间
+
+        Returns:
+            [(区域, 帧内裁剪区域)]
+        """
+        now = time.time() if now is None else now
+        due = []
+        for zone, region in self.regions_for(monitor, frame_shape):
+            if now - zone.last_run.get(pipeline_name, 0.0) >= zone.interval:
+                zone.last_run[pipeline_name] = now
+                due.append((zone, region))
+        return due
+
+    def next_due_in(self, pipeline_name, monitor: dict) -> Optional[float]:
+        """距离下一个区域到期的秒数，没有区域覆盖该显示器时返回 None"""
+        # 帧尺寸未知时按显示器逻辑尺寸判断（整个桌面一条流水线时尺寸为 0，不做限制）
+        shape = (monitor.get('height') or 1 << 30, monitor.get('width') or 1 << 30)
+        regions = self.regions_for(monitor, shape)
+        if not regions:
+            return None
+        now = time.time()
+        return max(0.0, min(zone.last_run.get(pipeline_name, 0.0) + zone.interval - now
+                            for zone, _ in regions))
+
+
+# 全局监控区域管理器实例
+zone_manager = ZoneManager()
@@ -6,15 +6,134 @@ class Config:
     
     # YOLO检测配置
     DETECTION_FPS = 20  # 提高帧率以获得更流畅的视频流
-    FRAME_QUEUE_SIZE = 1000  # 增加队列大小以缓存更多帧
+    FRAME_BUFFER_MB = 128  # 共享内存帧总线内存预算（MB），槽位数按帧大小自动计算
     DETECTION_QUEUE_SIZE = 1000
     YOLO_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolo11n.pt')
 
+    # 多显示器配置（需要安装 mss，否则整个桌面作为一条流水线）
+    MULTI_MONITOR_ENABLED = True
+    # 按显示器编号（从1开始）覆盖检测帧率和模型，例如 {2: {'detect_fps': 5, 'model_path': '...'}}
+    MONITOR_PROFILES = {}
+    TAB_SOURCE_BUFFER_MB = 16  # 每个秒杀标签页检测来源的帧总线预算（MB）
+
+    # 执行布局：推理线程数和各阶段CPU绑定（阶段: capture/inference/encode，仅 Linux 支持绑定）
+    # 例如 {'inference_threads': 4, 'affinity': {'capture': [0], 'inference': [2, 3, 4, 5], 'encode': [1]}}
+    # 注意：Torch 内部线程池在首次推理时创建，绑定只作用于各阶段的调用线程
+    EXECUTION_LAYOUT = {}
+
+    # 监控帧预处理：复用预分配的 letterbox 缓冲区和输入张量
+    MONITOR_PREPROCESS_ENABLED = True
+    MONITOR_IMGSZ = 640  # 模型输入尺寸（需为32的倍数）
+
+    # 推理后端：ultralytics（真实模型，.onnx 权重自动使用 onnxruntime）或 fake（确定性的假检测框，不需要模型文件和 torch，用于压测）
+    INFERENCE_BACKEND = 'ultralytics'
+    INFERENCE_BACKEND_OPTIONS = {}  # 后端参数，例如 fake: {'latency_ms': 20, 'per_image_ms': 2, 'max_boxes': 3}；onnx: {'threads': 4}
+
+    # 与默认模型并行服务的模型变体（名称 -> 权重路径），接口通过 variant 参数选择
+    # INT8 模型由 python -m app.yolo_detection.quantize 生成，例如 {'int8': 'models/yolo11n-int8.onnx'}
+    MODEL_VARIANTS = {}
+
+    # 热重载允许加载的权重目录（权重会被反序列化，只应放可信文件），为空时使用默认权重所在目录
+    MODEL_RELOAD_ROOTS = []
+
+    # 预编译模型缓存：已融合的 TorchScript / 图优化后的 ONNX，按权重哈希和库版本失效，加快 worker 冷启动
+    MODEL_CACHE_ENABLED = True
+    MODEL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'model_cache')
+
+    # 推理调度配置：优先级 interactive（接口）> monitor（实时监控）> bulk（批量任务）
+    INFERENCE_WORKERS = 2  # 同时执行推理的线程数
+    INFERENCE_CLASS_LIMITS = {'interactive': 2, 'monitor': None, 'bulk': 1}  # 各类别并发上限（monitor 为 None 时等于运行中的流水线数）
+    INFERENCE_CLASS_WEIGHTS = {'interactive': 4, 'monitor': 2, 'bulk': 1}  # 繁忙时的轮转权重
+    INFERENCE_BACKEND_THREAD_SAFE = False  # 为 False 时同一模型实例上的推理串行执行
+
+    # 批量检测接口（POST /api/batch-detect）
+    BATCH_MAX_BYTES = 64 * 1024 * 1024  # 单次请求（及压缩包解压后）的大小上限
+    BATCH_MAX_IMAGES = 256  # 单次请求的图像数量上限
+    BATCH_SIZE = 8  # 每次推理的图像数
+
+    # 异步检测任务（/api/jobs）
+    JOB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs')
+    JOB_WORKERS = 1  # 任务执行线程数（推理仍经由调度器的 bulk 类别）
+    JOB_QUEUE_SIZE = 16  # 排队任务上限，满时拒绝提交
+    JOB_TTL_HOURS = 24  # 已结束任务及结果的保留时长
+    JOB_MAX_UPLOAD_BYTES = 512 * 1024 * 1024  # 提交请求（内联图像或上传视频）的大小上限
+    JOB_ALLOWED_ROOTS = []  # 允许任务读取的服务器本地目录，为空时禁用本地路径输入
+    JOB_VIDEO_STRIDE = 5  # 视频每隔多少帧检测一次
+
+    # 自适应帧率配置（DETECTION_FPS 作为初始目标）
+    ADAPTIVE_RATE_ENABLED = True
+    ADAPTIVE_RATE_INTERVAL = 1.0  # 调整周期（秒）
+    DETECT_FPS_MIN = 2
+    DETECT_FPS_MAX = 30
+    STREAM_FPS_MIN = 5
+    STREAM_FPS_MAX = 30
+    ADAPTIVE_CPU_HIGH = 85  # 进程CPU占用（全部核心百分比）高于此值时降帧
+    ADAPTIVE_CPU_LOW = 60  # 低于此值时逐步升帧
+
+    # 自适应推理分辨率：负载高时用较小的 imgsz，宁可降低分辨率也不让延迟累积
+    ADAPTIVE_IMGSZ_ENABLED = True
+    ADAPTIVE_IMGSZ_SIZES = [320, 480, 640]  # 可选输入尺寸，最大者为全分辨率
+    ADAPTIVE_IMGSZ_SLO_MS = 100  # 单次推理的延迟目标（毫秒）
+    ADAPTIVE_IMGSZ_QUEUE_HIGH = 4  # 推理调度器排队数达到此值时降一级
+    ADAPTIVE_IMGSZ_FULL_EVERY = 10  # 实时监控每 N 帧强制全分辨率推理一次（0 表示不强制）
+    ADAPTIVE_IMGSZ_HOLD_SECONDS = 3  # 两次升级之间的最短间隔
+
+    # 跟踪引导的局部推理：关键帧全帧推理，关键帧之间只推理跟踪目标周围的裁剪区域（合并为一批）
+    ROI_TRACKING_ENABLED = False
+    ROI_KEYFRAME_INTERVAL = 10  # 每 N 帧一个全帧关键帧
+    ROI_PADDING = 0.5  # 裁剪区域每侧按目标尺寸扩展的比例
+    ROI_MIN_CROP = 96  # 裁剪区域最小边长（像素）
+    ROI_IMGSZ = 320  # 裁剪小图的推理尺寸
+    ROI_MAX_CROPS = 8  # 裁剪区域超过此数量时改做全帧推理
+    ROI_MAX_AREA_RATIO = 0.5  # 裁剪区域总面积超过画面此比例时改做全帧推理
+    ROI_MAX_MISSES = 2  # 目标在局部推理中连续未检出多少帧后停止跟踪
+
+    # 监控区域配置（有区域覆盖的显示器只按各区域的帧率检测区域裁剪，不再做全帧检测）
+    # 例如 [{'name': 'minimap', 'rect': [1600, 800, 320, 280], 'fps': 5, 'classes': ['person'], 'min_confidence': 0.4}]
+    WATCH_ZONES = []
+    WATCH_ZONE_IMGSZ = 640  # 区域裁剪的推理尺寸
+
+    # 检测历史存储配置
+    HISTORY_ENABLED = True
+    HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history')
+    HISTORY_SEGMENT_ROWS = 65536  # 每个列式分段的行数
+
+    # 检测规则引擎配置
+    DETECTION_RULES = []  # 初始规则，格式同 POST /yolo-detection/rules
+    RULE_ACTION_WORKERS = 2  # 异步动作执行线程数
+    RULE_ACTION_QUEUE_SIZE = 100  # 待执行动作队列上限，满时丢弃
+    RULE_WEBHOOK_TIMEOUT = 3  # Webhook 请求超时（秒）
+    RULE_WEBHOOK_ALLOWED_HOSTS = ['localhost', '127.0.0.1', '::1']
+
+    # 自动快照配置
+    SNAPSHOT_ENABLED = True
+    SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'snapshots')
+    SNAPSHOT_CONDITIONS = []  # 触发条件，格式同检测规则（不需要 actions）
+    SNAPSHOT_MIN_INTERVAL = 2  # 两次快照的最小间隔（秒）
+    SNAPSHOT_JPEG_QUALITY = 90
+    SNAPSHOT_WRITER_WORKERS = 1  # 后台写入线程数
+    SNAPSHOT_QUEUE_SIZE = 8  # 待写入队列上限，满时丢弃
+    SNAPSHOT_RETENTION_HOURS = 24
+    SNAPSHOT_MAX_FILES = 500
+
+    # 事件片段录制：滚动缓冲区保存最近的压缩帧，触发时写出触发前后的画面
+    # 启用后每条流水线持续压缩帧到滚动缓冲区，配置了 record_clip 规则或需要手动触发时再打开
+    CLIP_ENABLED = False
+    CLIP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'clips')
+    CLIP_FORMAT = 'mp4'  # mp4（mp4v 编码）或 mjpeg（直接拼接 JPEG，不重新编码）
+    CLIP_FPS = 10  # 录制帧率
+    CLIP_JPEG_QUALITY = 70
+    CLIP_PRE_SECONDS = 5  # 触发前保留的秒数（滚动缓冲区时长）
+    CLIP_POST_SECONDS = 5  # 触发后继续录制的秒数
+    CLIP_BUFFER_MB = 64  # 每个来源滚动缓冲区的内存上限（MB）
+    CLIP_QUEUE_SIZE = 4  # 待编码片段队列上限，满时丢弃
+    CLIP_MAX_FILES = 100
+
 class DevelopmentConfig(Config):
     DEBUG = True
     # 开发环境特定配置
     DETECTION_FPS = 20
-    FRAME_QUEUE_SIZE = 1000
+    FRAME_BUFFER_MB = 128  # 开发机长时间监控也不会占满内存
     DETECTION_QUEUE_SIZE = 1000
 
 class ProductionConfig(Config):
@@ -24,7 +143,7 @@ class ProductionConfig(Config):
     
     # 生产环境性能优化
     DETECTION_FPS = 15  # 提高帧率但仍保持合理性能
-    FRAME_QUEUE_SIZE = 8  # 增加队列大小
+    FRAME_BUFFER_MB = 64  # 生产环境只保留少量最新帧
     DETECTION_QUEUE_SIZE = 8
 
 # 配置映射
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+测试 fake 推理后端驱动的检测路径（不需要 torch 和模型文件）
+"""
+
+import base64
+import io
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+from flask import Flask
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from app.yolo_detection.backends import FakeBackend, create_backend
+from app.yolo_detection.detection import detection
+from app.yolo_detection.monitors import MonitorPipeline
+from app.yolo_detection.preprocess import LetterboxPreprocessor
+
+
+class FakeConfig(Config):
+    TESTING = True
+    INFERENCE_BACKEND = 'fake'
+    INFERENCE_BACKEND_OPTIONS = {'latency_ms': 0}
+    HISTORY_ENABLED = False
+    SNAPSHOT_ENABLED = False
+    MODEL_CACHE_ENABLED = False
+
+
+def _image(seed=0, height=480, width=640):
+    return np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = Flask(__name__)
+    app.config.from_object(FakeConfig)
+    detection.initialize(app)
+    success, error = detection.initialize_model(app.config['YOLO_MODEL_PATH'])
+    assert success, error
+
+    from app.api.routes import bp as api_bp
+    from app.yolo_detection.routes import bp as yolo_bp
+    app.register_blueprint(api_bp)
+    app.register_blueprint(yolo_bp)
+    return app
+
+
+def test_create_backend_fake_is_deterministic():
+    """同一输入总是得到相同的检测框"""
+    backend = create_backend('fake', None, latency_ms=0)
+    assert isinstance(backend, FakeBackend)
+    image = _image(1)
+    (xyxy1, conf1, cls1), = backend.predict([image], 640)
+    (xyxy2, conf2, cls2), = backend.predict([image.copy()], 640)
+    assert np.array_equal(xyxy1, xyxy2) and np.array_equal(conf1, conf2) and np.array_equal(cls1, cls2)
+
+
+def test_web_detect_uses_fake_backend(app):
+    """/api/web-detect 经 fake 后端返回与后端一致的检测结果"""
+    image = _image(2)
+    _, buffer = cv2.imencode('.png', image)
+    client = app.test_client()
+    response = client.post('/api/web-detect', data={'image': (io.BytesIO(buffer.tobytes()), 'test.png')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    result = response.get_json()
+
+    xyxy, confs, _ = create_backend('fake', None, latency_ms=0).predict([image], result['imgsz'])[0]
+    assert len(result['detections']) == len(xyxy)
+    for det, (x1, y1, _, _), conf in zip(result['detections'], xyxy, confs):
+        assert (det['x'], det['y']) == (int(x1), int(y1))
+        assert det['confidence'] == pytest.approx(float(conf))
+
+
+def test_monitor_pipeline_detections_carry_imgsz_and_tags(app):
+    """显示器流水线的检测结果带输入尺寸和显示器标签，视频流帧上绘制了边界框"""
+    pipeline = MonitorPipeline({'index': 7, 'left': 0, 'top': 0, 'width': 640, 'height': 480},
+                               detect_fps=100, model_path=detection.model_path, buffer_mb=16)
+    # 与 _build_pipelines 相同，监控帧走预分配缓冲区的预处理 + predict_prepared
+    pipeline.preprocessor = LetterboxPreprocessor(app.config['MONITOR_IMGSZ'])
+    detection._ensure_pipeline_model(pipeline)
+
+    # 选一帧流水线实际路径上会给出检测框的画面
+    backend = create_backend('fake', None, latency_ms=0)
+    preprocessor = LetterboxPreprocessor(app.config['MONITOR_IMGSZ'])
+    seed = 0
+    while len(backend.predict_prepared(preprocessor.prepare(_image(seed)))[0]) == 0:
+        seed += 1
+    frame = _image(seed)
+    pipeline.frame_bus.commit(frame)
+
+    events = []
+    listener = lambda event: event.get('monitor') == 7 and events.append(event)
+    detection.add_detection_listener(listener)
+    detection.pipelines.append(pipeline)
+    pipeline.active = True
+    worker = threading.Thread(target=detection._process_frames, args=(pipeline,), daemon=True)
+    worker.start()
+    try:
+        deadline = time.time() + 5
+        while not events and time.time() < deadline:
+            time.sleep(0.01)
+        assert events, '流水线没有产生检测事件'
+        event = events[0]
+        assert event['monitor'] == 7 and event['imgsz']
+        assert event['detections']
+        for det in event['detections']:
+            assert det['monitor'] == 7
+            assert det['imgsz'] == event['imgsz']
+
+        # 同一帧经 predict 得到的检测框与流水线的预处理路径一致
+        xyxy, _, _ = backend.predict([frame], event['imgsz'])[0]
+        assert [(det['x'], det['y']) for det in event['detections']] == [(int(x1), int(y1)) for x1, y1, _, _ in xyxy]
+
+        # 视频流编码的是带边界框的副本，共享槽位保持原样
+        stream = detection.generate_frames(7)
+        detection.last_frame_time = 0
+        chunk = next(chunk for chunk in stream if chunk.startswith('data: ') and 'heartbeat' not in chunk)
+        stream.close()
+        encoded = np.frombuffer(base64.b64decode(chunk[len('data: '):].strip()), np.uint8)
+        streamed = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+        _, plain = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        assert not np.array_equal(streamed, cv2.imdecode(plain, cv2.IMREAD_COLOR))
+        with pipeline.frame_bus.lease_latest() as lease:
+            assert np.array_equal(lease.frame, frame)
+    finally:
+        pipeline.active = False
+        worker.join(timeout=2)
+        detection.pipelines.remove(pipeline)
+        detection.remove_detection_listener(listener)
+        pipeline.frame_bus.release()
+
+
+def test_reload_model_rejects_paths_outside_allowed_roots(app, tmp_path, monkeypatch):
+    """热重载只接受 MODEL_RELOAD_ROOTS 内的权重文件"""
+    allowed = tmp_path / 'models'
+    allowed.mkdir()
+    (allowed / 'next.pt').write_bytes(b'fake weights')
+    (tmp_path / 'evil.pt').write_bytes(b'not a model')
+    monkeypatch.setattr(detection, 'reload_roots', [str(allowed)])
+    monkeypatch.setattr(detection, 'model_path', detection.model_path)
+
+    client = app.test_client()
+    for path in (tmp_path / 'evil.pt', allowed / '..' / 'evil.pt', allowed / 'missing.pt'):
+        response = client.post('/yolo-detection/admin/reload-model', json={'model_path': str(path)})
+        assert response.status_code == 400
+
+    response = client.post('/yolo-detection/admin/reload-model', json={'model_path': str(allowed / 'next.pt')})
+    assert response.status_code == 202
+    detection.models.reload_thread.join(timeout=5)
+    assert detection.models.reload_status['state'] == 'ready'
+
+
+def test_video_job_upload_without_stride(app, tmp_path):
+    """上传视频不带 stride 时使用默认抽帧步长"""
+    from app.yolo_detection.jobs import job_manager
+    app.config['JOB_DIR'] = str(tmp_path / 'jobs')
+    job_manager.configure(app.config)
+
+    video_path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(10):
+        writer.write(_image(i, 48, 64))
+    writer.release()
+
+    client = app.test_client()
+    with open(video_path, 'rb') as f:
+        response = client.post('/api/jobs', data={'video': (f, 'clip.avi')}, content_type='multipart/form-data')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['state'] in ('done', 'failed', 'cancelled'):
+            break
+        time.sleep(0.05)
+    assert job['state'] == 'done', job
+    assert job['processed'] == (10 + job_manager.video_stride - 1) // job_manager.video_stride
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+测试检测规则在多个检测来源下的增量状态
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.yolo_detection.rules import RuleEngine, create_rule
+from app.yolo_detection.snapshot import SnapshotWriter
+
+
+def _det(cls='person', x=100, y=100):
+    return {'class': cls, 'confidence': 0.9, 'x': x, 'y': y, 'width': 20, 'height': 20}
+
+
+def _event(monitor, detections, timestamp):
+    return {'timestamp': timestamp, 'monitor': monitor, 'detections': detections}
+
+
+def _engine(rule_data):
+    fired = []
+    engine = RuleEngine()
+    engine.register_callback('collect', fired.append)
+    engine.add_rule(create_rule({**rule_data, 'actions': [{'type': 'callback', 'name': 'collect'}]}))
+    engine.action_queue.join()
+    return engine, fired
+
+
+def test_presence_streak_per_monitor():
+    """显示器 2 的空帧不会打断显示器 1 的连续帧计数"""
+    engine, fired = _engine({'type': 'presence', 'class_name': 'person', 'frames': 3})
+    for i in range(3):
+        engine.process(_event(1, [_det()], i))
+        engine.process(_event(2, [], i + 0.5))
+    engine.action_queue.join()
+    assert [payload['monitor'] for payload in fired] == [1]
+
+
+def test_count_and_zone_edges_per_monitor():
+    """两个显示器交替投递时，各自只在进入条件时触发一次"""
+    engine, fired = _engine({'type': 'count', 'threshold': 1})
+    zone_engine, zone_fired = _engine({'type': 'zone_enter', 'zone': [0, 0, 200, 200]})
+    for i in range(4):
+        for monitor, engine_, detections in ((1, engine, [_det(), _det()]), (2, engine, [_det()]),
+                                             (1, zone_engine, [_det()]), (2, zone_engine, [_det(x=500)])):
+            engine_.process(_event(monitor, detections, i))
+    engine.action_queue.join()
+    zone_engine.action_queue.join()
+    assert [payload['monitor'] for payload in fired] == [1]
+    assert [payload['monitor'] for payload in zone_fired] == [1]
+
+
+def test_tab_source_separate_from_monitor():
+    """标签页来源按 task_id 区分，不与显示器共享状态"""
+    engine, fired = _engine({'type': 'presence', 'class_name': 'person', 'frames': 2})
+    for i in range(2):
+        engine.process({'timestamp': i, 'task_id': 't1', 'source': 'tab', 'detections': [_det()]})
+        engine.process(_event(1, [], i))
+    engine.action_queue.join()
+    assert [payload.get('task_id') for payload in fired] == ['t1']
+
+
+def test_snapshot_rate_limit_per_monitor():
+    """一个显示器的快照频率限制不影响其他显示器"""
+    writer = SnapshotWriter()
+    writer.enabled = True
+    writer.conditions = [create_rule({'type': 'count', 'threshold': 0})]
+    submitted = []
+    writer.submit = lambda *args, **kwargs: submitted.append(args[3]) or True
+    frame = np.zeros((8, 8, 3), dtype=np.uint8)
+    for i in range(3):
+        writer.on_detection({**_event(1, [_det()] if i % 2 == 0 else [], i), 'frame': frame})
+        writer.on_detection({**_event(2, [_det()], i), 'frame': frame})
+    assert submitted == [1, 2, 1]
+
+    writer = SnapshotWriter()
+    writer.min_interval = 10
+    writer.write_queue.put_nowait = lambda item: None
+    assert writer.submit(frame, 'a', 1.0, monitor=1)
+    assert not writer.submit(frame, 'a', 2.0, monitor=1)
+    assert writer.submit(frame, 'a', 2.0, monitor=2)